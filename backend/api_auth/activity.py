@@ -0,0 +1,144 @@
+"""
+Coalesced last-login / last-seen tracking.
+
+Writing `auth_user.last_login` on every login (or `last_seen` on every
+request) turns hot accounts into row-lock hot spots and bloats the table.
+Instead each worker process keeps the newest timestamp per user in memory
+and writes them all periodically as one `UPDATE ... FROM (VALUES ...)` per
+column. Timestamps less than LAST_SEEN_GRANULARITY seconds newer than the
+stored value are not recorded at all.
+
+The buffer is flushed by a background thread every ACTIVITY_FLUSH_INTERVAL
+seconds or as soon as it holds ACTIVITY_BUFFER_MAX users (requests only wake
+the thread, they never write), at interpreter exit and from gunicorn's
+worker_exit hook, so a graceful shutdown loses nothing.
+"""
+import atexit
+import logging
+import os
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from backend.db_utils import bulk_update_from_values
+
+logger = logging.getLogger(__name__)
+
+TRACKED_FIELDS = ('last_login', 'last_seen')
+
+
+class ActivityBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {name: {} for name in TRACKED_FIELDS}  # field -> {user id: timestamp}
+        self._flusher_pid = None
+        self._wake = threading.Event()
+
+    def record(self, user, fields, at=None):
+        """Buffer `at` (default now) for `fields` of `user`, skipping values within the granularity"""
+        at = at or timezone.now()
+        granularity = timedelta(seconds=settings.LAST_SEEN_GRANULARITY)
+        fields = [
+            name for name in fields
+            if getattr(user, name) is None or at - getattr(user, name) >= granularity
+        ]
+        if not fields:
+            return False
+
+        with self._lock:
+            for name in fields:
+                pending = self._pending[name]
+                if user.pk not in pending or pending[user.pk] < at:
+                    pending[user.pk] = at
+            size = max(len(pending) for pending in self._pending.values())
+        # Keep the in-memory user consistent with what will be written
+        for name in fields:
+            setattr(user, name, at)
+
+        self._ensure_flusher()
+        if size >= settings.ACTIVITY_BUFFER_MAX:
+            # Written by the flusher thread, never by the request recording the activity
+            self._wake.set()
+        return True
+
+    def pending_count(self):
+        with self._lock:
+            return sum(len(pending) for pending in self._pending.values())
+
+    def flush(self):
+        """Write every buffered timestamp, one statement per column. Returns rows updated."""
+        with self._lock:
+            batches = {name: pending for name, pending in self._pending.items() if pending}
+            self._pending = {name: {} for name in TRACKED_FIELDS}
+        if not batches:
+            return 0
+
+        from .models import User
+
+        updated = 0
+        for name, pending in batches.items():
+            try:
+                updated += bulk_update_from_values(
+                    User, sorted(pending.items()), [name], only_if_newer=True,
+                )
+            except Exception:
+                logger.exception(f"Failed to flush {len(pending)} buffered {name} timestamps")
+                self._requeue(name, pending)
+        return updated
+
+    def discard(self):
+        """Drop everything buffered without writing it. Returns the number of entries dropped."""
+        with self._lock:
+            dropped = sum(len(pending) for pending in self._pending.values())
+            self._pending = {name: {} for name in TRACKED_FIELDS}
+        return dropped
+
+    def _requeue(self, name, pending):
+        with self._lock:
+            current = self._pending[name]
+            for user_id, at in pending.items():
+                if user_id not in current or current[user_id] < at:
+                    current[user_id] = at
+
+    def _ensure_flusher(self):
+        # Started lazily so each forked worker runs its own thread (threads don't survive fork)
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            self._wake = threading.Event()
+        threading.Thread(target=self._run_flusher, args=(self._wake,), name='activity-flusher', daemon=True).start()
+
+    def _run_flusher(self, wake):
+        while True:
+            # Every ACTIVITY_FLUSH_INTERVAL seconds, or as soon as the buffer reaches ACTIVITY_BUFFER_MAX
+            wake.wait(settings.ACTIVITY_FLUSH_INTERVAL)
+            wake.clear()
+            try:
+                self.flush()
+            finally:
+                # This thread's connection would otherwise stay open between flushes
+                connection.close()
+
+
+activity_buffer = ActivityBuffer()
+
+
+def record_login(user, at=None):
+    return activity_buffer.record(user, TRACKED_FIELDS, at)
+
+
+def record_seen(user, at=None):
+    return activity_buffer.record(user, ('last_seen',), at)
+
+
+def flush_activity():
+    return activity_buffer.flush()
+
+
+atexit.register(flush_activity)
@@ -0,0 +1,56 @@
+from django.contrib import admin
+
+from backend.admin_utils import LargeTableAdmin
+from .models import AuthAuditEvent, TestModel, User, Profile, EmailVerification
+
+
+@admin.register(User)
+class UserAdmin(LargeTableAdmin):
+    list_display = ('email', 'tier', 'register_method', 'is_email_verified', 'is_active', 'is_staff', 'date_joined')
+    list_filter = ('tier', 'register_method', 'is_email_verified', 'is_staff')
+    indexed_search_fields = ('email',)
+    ordering = ('-id',)
+    readonly_fields = ('password', 'last_login', 'last_seen', 'date_joined')
+    exclude = ('groups', 'user_permissions')
+
+
+@admin.register(Profile)
+class ProfileAdmin(LargeTableAdmin):
+    list_display = ('user', 'display_name', 'first_name', 'last_name', 'created')
+    list_select_related = ('user',)  # __str__ and the user column read user.email
+    indexed_search_fields = ('display_name', 'user__email')
+    raw_id_fields = ('user',)  # A <select> of every user would not render
+    ordering = ('-id',)
+    readonly_fields = ('version',)
+
+
+@admin.register(EmailVerification)
+class EmailVerificationAdmin(LargeTableAdmin):
+    list_display = ('user', 'created_at', 'expires_at', 'is_used')
+    list_filter = ('is_used',)
+    list_select_related = ('user',)
+    indexed_search_fields = ('user__email',)
+    raw_id_fields = ('user',)
+    ordering = ('-id',)
+
+
+@admin.register(AuthAuditEvent)
+class AuthAuditEventAdmin(LargeTableAdmin):
+    list_display = ('occurred_at', 'event_type', 'method', 'success', 'email', 'user_id', 'ip_address')
+    list_filter = ('event_type', 'method', 'success')
+    ordering = ('-occurred_at',)
+
+    # Append-only: written by api_auth.audit, removed a month at a time by rotate_audit_log
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TestModel)
+class TestModelAdmin(admin.ModelAdmin):
+    list_display = ('display_name', 'test_count', 'is_active')
@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class ApiAuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api_auth'
+
+    def ready(self):
+        from django.db.models.signals import post_save
+        from backend.caching import invalidate_on_change
+        from .models import Profile, User
+        from .utils import profile_cache_key, publish_tier_changes
+
+        invalidate_on_change(Profile, lambda profile: profile_cache_key(profile.user_id))
+
+        def user_saved(sender, instance, created, update_fields, using, **kwargs):
+            # Tier changes written with QuerySet.update() call publish_tier_changes() themselves
+            if not created and (update_fields is None or 'tier' in update_fields) and instance.tier_changed():
+                publish_tier_changes({instance.pk: instance.tier}, using=using)
+
+        post_save.connect(user_saved, sender=User, weak=False, dispatch_uid='api_auth.user_tier_events')
@@ -0,0 +1,319 @@
+"""
+Authentication audit trail: registrations, logins, verifications, resends.
+
+Auth views call record_audit_event(), which only appends a tuple to a
+per-worker buffer; no request waits for an INSERT. The buffer is written
+in batches (backend.db_utils.bulk_insert_rows, COPY on PostgreSQL) by a
+background thread every AUDIT_FLUSH_INTERVAL seconds, when it holds
+AUDIT_BUFFER_MAX events, at interpreter exit and from gunicorn's
+worker_exit hook.
+
+The table is append-only and split by month, so retention drops whole
+months instead of deleting rows:
+
+- PostgreSQL: `auth_audit_event` is range partitioned on occurred_at, one
+  partition per month (`auth_audit_event_p202610`). Rows are written to
+  the parent and routed by the database.
+- SQLite: each month is its own table with the same name scheme, and
+  `auth_audit_event` is a UNION ALL view over them, rebuilt whenever a
+  month is added or dropped. Ids are offset by the month (yyyymm * 10^10)
+  so they stay unique across month tables.
+
+Month partitions are created on demand before a flush writes into them;
+the `rotate_audit_log` command creates next month's ahead of time and
+drops months older than AUDIT_RETENTION_MONTHS.
+"""
+import atexit
+import ipaddress
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DataError, DatabaseError, IntegrityError, connections, router, transaction
+from django.utils import timezone
+
+from backend.db_utils import bulk_insert_rows
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'auth_audit_event'
+PARTITION_NAME = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+SQLITE_ID_OFFSET = 10 ** 10
+# Columns written by a flush, in the order of the buffered tuples
+FIELDS = ('occurred_at', 'event_type', 'method', 'success', 'user_id', 'email', 'ip_address', 'user_agent', 'detail')
+
+
+def _model():
+    from .models import AuthAuditEvent
+    return AuthAuditEvent
+
+
+def month_start(value):
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def next_month(start):
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+def partition_name(start):
+    return f'{TABLE}_p{start.year:04d}{start.month:02d}'
+
+
+def _column_definitions(connection):
+    qn = connection.ops.quote_name
+    columns = []
+    for name in FIELDS:
+        field = _model()._meta.get_field(name)
+        columns.append(f'{qn(field.column)} {field.db_type(connection)} {"NULL" if field.null else "NOT NULL"}')
+    return columns
+
+
+def create_audit_table(connection):
+    """The partitioned parent on PostgreSQL, the current month and view elsewhere (used by the migration)"""
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {qn(TABLE)} (id bigserial, {", ".join(_column_definitions(connection))}, '
+                f'PRIMARY KEY (id, occurred_at)) PARTITION BY RANGE (occurred_at)'
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {qn(TABLE + "_user_idx")} ON {qn(TABLE)} (user_id, occurred_at)')
+    ensure_partition(connection, month_start(timezone.now()))
+
+
+def drop_audit_table(connection):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'DROP TABLE IF EXISTS {qn(TABLE)}')  # Drops the partitions with it
+            return
+        cursor.execute(f'DROP VIEW IF EXISTS {qn(TABLE)}')
+        for name in list_partitions(connection):
+            cursor.execute(f'DROP TABLE {qn(name)}')
+
+
+def list_partitions(connection):
+    """Names of the month partitions (tables on SQLite), oldest first"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT child.relname FROM pg_inherits '
+                'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+                'JOIN pg_class child ON child.oid = pg_inherits.inhrelid WHERE parent.relname = %s',
+                [TABLE],
+            )
+        else:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE %s", [f'{TABLE}_p%'])
+        return sorted(name for (name,) in cursor.fetchall() if PARTITION_NAME.match(name))
+
+
+def _rebuild_sqlite_view(connection):
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(name) for name in FIELDS)
+    selects = []
+    for name in list_partitions(connection):
+        year, month = PARTITION_NAME.match(name).groups()
+        selects.append(f'SELECT id + {int(year + month) * SQLITE_ID_OFFSET} AS id, {columns} FROM {qn(name)}')
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP VIEW IF EXISTS {qn(TABLE)}')
+        if selects:
+            cursor.execute(f'CREATE VIEW {qn(TABLE)} AS {" UNION ALL ".join(selects)}')
+
+
+def ensure_partition(connection, start):
+    """Create the partition for the month beginning at `start` unless it exists; returns its name"""
+    qn = connection.ops.quote_name
+    name = partition_name(start)
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {qn(name)} PARTITION OF {qn(TABLE)} "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{next_month(start).isoformat()}')"
+                )
+                return name
+            if name in list_partitions(connection):
+                return name
+            cursor.execute(
+                f'CREATE TABLE {qn(name)} (id integer PRIMARY KEY AUTOINCREMENT, '
+                f'{", ".join(_column_definitions(connection))})'
+            )
+            cursor.execute(f'CREATE INDEX {qn(name + "_user_idx")} ON {qn(name)} (user_id, occurred_at)')
+    except DatabaseError:
+        # Another worker created it first
+        if name not in list_partitions(connection):
+            raise
+        return name
+    _rebuild_sqlite_view(connection)
+    return name
+
+
+def drop_expired_partitions(connection, months=None, now=None):
+    """Drop whole months older than the newest `months` (default AUDIT_RETENTION_MONTHS); returns their names"""
+    months = settings.AUDIT_RETENTION_MONTHS if months is None else months
+    cutoff = month_start(now or timezone.now())
+    for _ in range(max(months - 1, 0)):
+        cutoff = cutoff.replace(year=cutoff.year - (cutoff.month == 1), month=(cutoff.month - 2) % 12 + 1)
+    expired = [name for name in list_partitions(connection) if name < partition_name(cutoff)]
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for name in expired:
+            cursor.execute(f'DROP TABLE {qn(name)}')
+    if expired and connection.vendor == 'sqlite':
+        _rebuild_sqlite_view(connection)
+    return expired
+
+
+def client_ip(request):
+    """
+    The client's address as seen by the first of TRUSTED_PROXY_HOPS proxies.
+    Each proxy appends the address it received from to X-Forwarded-For, so
+    only the last TRUSTED_PROXY_HOPS entries (REMOTE_ADDR included) are ours;
+    anything further left was sent by the client and can be forged.
+    """
+    if request is None:
+        return None
+    forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+    chain = forwarded + [request.META.get('REMOTE_ADDR', '')]
+    address = chain[max(len(chain) - 1 - settings.TRUSTED_PROXY_HOPS, 0)]
+    try:
+        return str(ipaddress.ip_address(address))
+    except ValueError:
+        return None
+
+
+class AuditLog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._flusher_pid = None
+        self._wake = threading.Event()
+        self._known_partitions = set()
+
+    def record(self, event_type, user=None, email='', method='', success=True, request=None, detail='', at=None):
+        """Buffer one event; it is written by the next flush"""
+        user_agent = request.META.get('HTTP_USER_AGENT', '')[:255] if request is not None else ''
+        event = (
+            at or timezone.now(), event_type, method, success, getattr(user, 'pk', None),
+            (email or getattr(user, 'email', '') or '')[:254], client_ip(request), user_agent, detail[:255],
+        )
+        with self._lock:
+            self._pending.append(event)
+            size = len(self._pending)
+        self._ensure_flusher()
+        if size >= settings.AUDIT_BUFFER_MAX:
+            # Written by the flusher thread, never by the request recording the event
+            self._wake.set()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Write every buffered event in batched inserts. Returns the number written."""
+        with self._lock:
+            events, self._pending = self._pending, []
+        if not events:
+            return 0
+
+        model = _model()
+        using = router.db_for_write(model)
+        connection = connections[using]
+        by_month = {}
+        for event in events:
+            by_month.setdefault(month_start(event[0]), []).append(event)
+        months = sorted(by_month.items())
+        written = 0
+        for done, (start, month_events) in enumerate(months):
+            try:
+                name = partition_name(start)
+                if (using, name) not in self._known_partitions:
+                    ensure_partition(connection, start)
+                    self._known_partitions.add((using, name))
+                # PostgreSQL routes rows written to the parent; SQLite's parent is a view
+                written += self._insert(model, using, None if connection.vendor == 'postgresql' else name, month_events)
+            except Exception as exc:
+                unwritten = [event for _, pending in months[done:] for event in pending]
+                if isinstance(exc, DatabaseError):
+                    # Usually transient (a lock, a failover): the events are retried by the next flush
+                    logger.warning(f"Failed to flush {len(unwritten)} audit events, will retry: {exc}")
+                else:
+                    logger.exception(f"Failed to flush {len(unwritten)} audit events")
+                self._known_partitions.clear()
+                self._requeue(unwritten)
+                break
+        return written
+
+    def _insert(self, model, using, table, events):
+        """
+        Insert `events`; when the database rejects the data itself, retry in
+        halves down to single rows and drop only the rows it rejects, so one
+        bad value can't block the trail
+        """
+        try:
+            with transaction.atomic(using=using):
+                return bulk_insert_rows(model, FIELDS, events, using=using, table=table)
+        except (DataError, IntegrityError) as exc:
+            if len(events) == 1:
+                logger.error(f"Dropped an audit event rejected by the database ({exc}): {events[0][1]} {events[0][5]!r}")
+                return 0
+            middle = len(events) // 2
+            return (
+                self._insert(model, using, table, events[:middle])
+                + self._insert(model, using, table, events[middle:])
+            )
+
+    def discard(self):
+        """Drop everything buffered without writing it. Returns the number of events dropped."""
+        with self._lock:
+            dropped, self._pending = len(self._pending), []
+        return dropped
+
+    def _requeue(self, events):
+        limit = settings.AUDIT_BUFFER_MAX * 10
+        with self._lock:
+            self._pending[:0] = events
+            if len(self._pending) > limit:
+                logger.error(f"Audit buffer full, dropping {len(self._pending) - limit} oldest events")
+                del self._pending[:len(self._pending) - limit]
+
+    def _ensure_flusher(self):
+        # Started lazily so each forked worker runs its own thread (threads don't survive fork)
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            self._wake = threading.Event()
+        threading.Thread(target=self._run_flusher, args=(self._wake,), name='audit-flusher', daemon=True).start()
+
+    def _run_flusher(self, wake):
+        while True:
+            # Every AUDIT_FLUSH_INTERVAL seconds, or as soon as the buffer reaches AUDIT_BUFFER_MAX
+            wake.wait(settings.AUDIT_FLUSH_INTERVAL)
+            wake.clear()
+            try:
+                self.flush()
+            finally:
+                # This thread's connection would otherwise stay open between flushes
+                connections.close_all()
+
+
+audit_log = AuditLog()
+
+
+def record_audit_event(event_type, **kwargs):
+    return audit_log.record(event_type, **kwargs)
+
+
+def flush_audit_log():
+    return audit_log.flush()
+
+
+atexit.register(flush_audit_log)
@@ -0,0 +1,13 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .activity import record_seen
+
+
+class ActivityJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that buffers the user's last-seen time (see api_auth.activity)"""
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            record_seen(result[0])
+        return result
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, router
+from django.utils import timezone
+
+from api_auth.audit import drop_expired_partitions, ensure_partition, month_start, next_month
+from api_auth.models import AuthAuditEvent
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the audit log partitions for this month and the next, and drop the months '
+        'older than AUDIT_RETENTION_MONTHS. Run daily (idempotent).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-months', type=int, help='Override AUDIT_RETENTION_MONTHS')
+
+    def handle(self, *args, **options):
+        connection = connections[router.db_for_write(AuthAuditEvent)]
+        current = month_start(timezone.now())
+        for start in (current, next_month(current)):
+            self.stdout.write(f"Partition {ensure_partition(connection, start)} ready")
+        for name in drop_expired_partitions(connection, months=options['retention_months']):
+            self.stdout.write(f"Dropped partition {name}")
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Admin search (backend.admin_utils.LargeTableAdmin) filters with
+# UPPER(column) LIKE UPPER('%term%'); trigram indexes on the same expression
+# serve both that and prefix searches. PostgreSQL only: other databases fall
+# back to prefix search without an extra index.
+INDEXES = [
+    ('auth_user_email_trgm_idx', 'auth_user', 'email'),
+    ('profile_display_name_trgm_idx', 'profile', 'display_name'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in INDEXES:
+        # CONCURRENTLY: building these on a large table must not block writes
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api_auth', '0003_user_last_seen'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes, elidable=False),
+    ]
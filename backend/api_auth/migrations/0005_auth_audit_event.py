@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+# The table is created by api_auth.audit: a partitioned table on PostgreSQL,
+# month tables behind a view on SQLite. Neither fits a Django-managed model.
+
+
+def create_table(apps, schema_editor):
+    from api_auth.audit import create_audit_table
+    create_audit_table(schema_editor.connection)
+
+
+def drop_table(apps, schema_editor):
+    from api_auth.audit import drop_audit_table
+    drop_audit_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_auth', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthAuditEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('occurred_at', models.DateTimeField()),
+                ('event_type', models.CharField(choices=[('register', 'Registration'), ('login', 'Login'), ('verify_email', 'Email verification'), ('resend_verification', 'Verification resend')], max_length=30)),
+                ('method', models.CharField(blank=True, max_length=20)),
+                ('success', models.BooleanField(default=True)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('email', models.CharField(blank=True, max_length=254)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.CharField(blank=True, max_length=255)),
+                ('detail', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'db_table': 'auth_audit_event',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_table, drop_table, elidable=False),
+    ]
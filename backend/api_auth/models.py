@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 import uuid
@@ -53,6 +54,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_email_verified = models.BooleanField(default=False)
     last_login = models.DateTimeField(null=True, blank=True)
+    last_seen = models.DateTimeField(null=True, blank=True)  # Written in batches by api_auth.activity
     date_joined = models.DateTimeField(auto_now_add=True)
 
     REGISTRATION_CHOICES = [
@@ -83,6 +85,28 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return self.email
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_tier()
+        return instance
+
+    def _remember_loaded_tier(self):
+        # Left unset when deferred: an assigned tier then counts as changed
+        if 'tier' in self.__dict__:
+            self._loaded_tier = self.tier
+
+    def tier_changed(self):
+        """True if `tier` differs from the value loaded from (or last saved to) the database, or that is unknown"""
+        if 'tier' not in self.__dict__:
+            return False
+        return getattr(self, '_loaded_tier', None) != self.tier
+
+    def save(self, *args, **kwargs):
+        # post_save receivers still see the previous tier through tier_changed()
+        super().save(*args, **kwargs)
+        self._remember_loaded_tier()
     
     class Meta:
         db_table = 'auth_user' 
@@ -101,10 +125,59 @@ class Profile(models.Model):
     link_facebook = models.CharField(max_length=200, blank=True, null=True)
     link_website = models.CharField(max_length=200, blank=True, null=True)
     created = models.DateTimeField(auto_now_add=True)
+    version = models.PositiveIntegerField(default=1)  # Bumped on every write, exposed as the ETag
+
+    EDITABLE_FIELDS = (
+        'display_name', 'first_name', 'last_name', 'short_intro', 'bio',
+        'link_twitter', 'link_linkedin', 'link_youtube', 'link_facebook', 'link_website',
+    )
 
     def __str__(self):
         return f"{self.user.email}'s profile"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_values()
+        return instance
+
+    def _remember_loaded_values(self):
+        # Deferred fields are left out and count as unchanged until assigned
+        self._loaded_values = {
+            name: self.__dict__[name] for name in self.EDITABLE_FIELDS if name in self.__dict__
+        }
+
+    def changed_fields(self):
+        """Editable fields that differ from the values loaded from the database, None if unknown"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return [
+            name for name in self.EDITABLE_FIELDS
+            if name in self.__dict__ and (name not in loaded or loaded[name] != self.__dict__[name])
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Existing rows only write the columns that changed (plus version), and
+        nothing at all when no column changed. Pass update_fields to bypass the diff.
+        """
+        adding = self._state.adding
+        if not adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = self.changed_fields()
+            if update_fields is not None:
+                if not update_fields:
+                    return
+                kwargs['update_fields'] = {*update_fields, 'version'}
+            # Incremented by the UPDATE itself, so concurrent saves each get their own version
+            self.version = F('version') + 1
+        super().save(*args, **kwargs)
+        if not adding:
+            self.refresh_from_db(fields=['version'])
+        self._remember_loaded_values()
+
     class Meta:
         db_table = 'profile'
 
@@ -128,4 +201,35 @@ class EmailVerification(models.Model):
         return f"Verification for {self.user.email}"
 
     class Meta:
-        db_table = 'email_verification'
\ No newline at end of file
+        db_table = 'email_verification'
+
+class AuthAuditEvent(models.Model):
+    """
+    Append-only authentication audit trail, written in batches by api_auth.audit.
+    The table is partitioned by month (a view over month tables on SQLite), so
+    Django doesn't manage it.
+    """
+    EVENT_CHOICES = [
+        ('register', 'Registration'),
+        ('login', 'Login'),
+        ('verify_email', 'Email verification'),
+        ('resend_verification', 'Verification resend'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    occurred_at = models.DateTimeField()
+    event_type = models.CharField(max_length=30, choices=EVENT_CHOICES)
+    method = models.CharField(max_length=20, blank=True)  # password, google, email
+    success = models.BooleanField(default=True)
+    user_id = models.BigIntegerField(null=True, blank=True)  # Not a foreign key: the trail outlives accounts
+    email = models.CharField(max_length=254, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True)
+    detail = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f"{self.event_type} {self.email or self.user_id} at {self.occurred_at}"
+
+    class Meta:
+        db_table = 'auth_audit_event'
+        managed = False
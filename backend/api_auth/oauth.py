@@ -0,0 +1,83 @@
+"""
+Google sign-in as two upserts.
+
+The user row is inserted or, when the email exists, has its login
+timestamps updated, in one INSERT ... ON CONFLICT (email) DO UPDATE ...
+RETURNING statement; the profile likewise on user_id, where the DO UPDATE
+only fires when the name Google reports differs from the stored one. Two
+callbacks for the same new email can't both insert, so there is no
+IntegrityError to handle, and a repeated login costs two statements.
+
+Both PostgreSQL and SQLite (>= 3.35) support ON CONFLICT with RETURNING.
+Each upsert is idempotent, so they are not wrapped in a transaction: if the
+profile write fails, the next sign-in repeats it. The profile upsert sends
+no post_save, so it invalidates the cached profile payload itself.
+"""
+from django.contrib.auth.hashers import make_password
+from django.db import connections, router
+from django.utils import timezone
+
+from backend.caching import two_tier_cache
+
+from .models import Profile, User
+from .utils import profile_cache_key
+
+
+def _truncate(value, model, field):
+    return (value or '')[:model._meta.get_field(field).max_length]
+
+
+def upsert_google_user(email, display_name='', first_name='', now=None):
+    """Create or update the user and profile for a Google sign-in; returns (user, created)"""
+    now = now or timezone.now()
+    using = router.db_for_write(User)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    prep_datetime = User._meta.get_field('date_joined').get_db_prep_save
+
+    email = User.objects.normalize_email(email)
+    user_table = qn(User._meta.db_table)
+    stamp = prep_datetime(now, connection)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {user_table} (email, password, is_staff, is_superuser, is_active, is_email_verified, '
+            f'last_login, last_seen, date_joined, register_method, tier) '
+            f'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) '
+            # The row is written either way, so the login timestamps ride along
+            # instead of going through the activity buffer
+            f'ON CONFLICT (email) DO UPDATE SET last_login = EXCLUDED.last_login, last_seen = EXCLUDED.last_seen '
+            # date_joined is only ours if this statement inserted the row
+            f'RETURNING id, tier, is_active, is_email_verified, register_method, date_joined = %s',
+            [
+                email, make_password(None), False, False, True,
+                True,  # Google accounts have verified emails
+                stamp, stamp, stamp, 'google', 'free', stamp,
+            ],
+        )
+        user_id, tier, is_active, is_email_verified, register_method, created = cursor.fetchone()
+
+        distinct = 'IS DISTINCT FROM' if connection.vendor == 'postgresql' else 'IS NOT'
+        profile_table = qn(Profile._meta.db_table)
+        cursor.execute(
+            f'INSERT INTO {profile_table} AS p (user_id, display_name, first_name, last_name, created, version) '
+            f'VALUES (%s, %s, %s, %s, %s, %s) '
+            f'ON CONFLICT (user_id) DO UPDATE SET display_name = EXCLUDED.display_name, '
+            f'first_name = EXCLUDED.first_name, version = p.version + 1 '
+            f'WHERE p.display_name {distinct} EXCLUDED.display_name OR p.first_name {distinct} EXCLUDED.first_name',
+            [
+                user_id, _truncate(display_name, Profile, 'display_name'),
+                _truncate(first_name, Profile, 'first_name'), '', stamp, 1,
+            ],
+        )
+        # Raw SQL sends no post_save: drop the cached profile payload when the row was written
+        if cursor.rowcount:
+            two_tier_cache.invalidate_tags(profile_cache_key(user_id))
+
+    user = User(
+        id=user_id, email=email, tier=tier, is_active=bool(is_active), is_email_verified=bool(is_email_verified),
+        register_method=register_method, last_login=now, last_seen=now,
+    )
+    user._state.adding = False
+    user._state.db = using
+    return user, bool(created)
+
@@ -1,6 +1,14 @@
 from rest_framework import serializers
 from .models import TestModel, Profile, User, EmailVerification
 from django.contrib.auth import get_user_model
+from django.conf import settings
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from backend.caching import two_tier_cache
+from rest_framework.exceptions import AuthenticationFailed
+from .activity import record_login
+from .audit import record_audit_event
+from .tokens import TieredRefreshToken, refresh_token_jti
 
 User = get_user_model()
 
@@ -45,4 +53,47 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 
 class ResendVerificationSerializer(serializers.Serializer):
-    email = serializers.EmailField()
\ No newline at end of file
+    email = serializers.EmailField()
+
+
+class ActivityTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Records the login in the coalesced activity buffer instead of an UPDATE per token, and in the audit trail"""
+    token_class = TieredRefreshToken
+
+    def validate(self, attrs):
+        request = self.context.get('request')
+        try:
+            data = super().validate(attrs)
+        except AuthenticationFailed:
+            record_audit_event('login', email=attrs.get(self.username_field, ''), method='password',
+                               success=False, request=request)
+            raise
+        record_login(self.user)
+        record_audit_event('login', user=self.user, method='password', request=request)
+        return data
+
+
+class TieredTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refreshes of one refresh token within TOKEN_REFRESH_GRACE_SECONDS get the
+    pair minted by the first of them. A client whose access token expired
+    often refreshes from several requests at once; with rotation each would
+    get a different pair, and all but the stored one would be lost.
+
+    Workers agree on the first pair through the two-tier cache's L2, so the
+    default cache must be shared by all of them (CACHE_URL, Redis in the
+    docker deployments); with per-process locmem the grace period only
+    holds within one worker.
+    """
+    token_class = TieredRefreshToken
+    cache = two_tier_cache
+
+    def validate(self, attrs):
+        rotate = super().validate
+        if not settings.TOKEN_REFRESH_GRACE_SECONDS or not api_settings.ROTATE_REFRESH_TOKENS:
+            return rotate(attrs)
+        jti = refresh_token_jti(attrs['refresh'])
+        # Single flight: concurrent refreshes wait for the first one's pair
+        return self.cache.get_or_set(
+            f'token_refresh:{jti}', lambda: rotate(attrs), ttl=settings.TOKEN_REFRESH_GRACE_SECONDS,
+        )
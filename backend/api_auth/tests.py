@@ -0,0 +1,585 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import DataError, OperationalError, connection, connections
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend.caching import TwoTierCache
+from backend.db_utils import bulk_insert_rows
+
+from .activity import ActivityBuffer
+from .audit import AuditLog, audit_log, client_ip, drop_expired_partitions, list_partitions
+from .models import AuthAuditEvent, EmailVerification, Profile, TestModel
+from .oauth import upsert_google_user
+from .serializers import TieredTokenRefreshSerializer
+from .verification import SIGNED_TOKEN_SALT, consume_verification_token, issue_verification_token
+
+User = get_user_model()
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProfileUpdateTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='profile@example.com', password='pw')
+        Profile.objects.create(user=self.user, display_name='Old', bio='x' * 2000)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('user_profile')
+
+    def get_etag(self):
+        return self.client.get(self.url)['ETag']
+
+    def test_patch_writes_only_changed_columns(self):
+        etag = self.get_etag()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, {'display_name': 'New', 'bio': 'x' * 2000}, format='json',
+                                         HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['profile']['display_name'], 'New')
+        self.assertNotEqual(response['ETag'], etag)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"display_name"', updates[0])
+        self.assertIn('"version"', updates[0])
+        self.assertNotIn('"bio"', updates[0])
+
+    def test_patch_without_changes_does_not_write(self):
+        etag = self.get_etag()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, {'display_name': 'Old'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE')])
+
+    def test_stale_if_match_is_rejected(self):
+        etag = self.get_etag()
+        self.client.patch(self.url, {'first_name': 'Ann'}, format='json', HTTP_IF_MATCH=etag)
+
+        response = self.client.patch(self.url, {'first_name': 'Bob'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Profile.objects.get(user=self.user).first_name, 'Ann')
+
+    def test_conditional_get(self):
+        etag = self.get_etag()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # The response also carries user columns, so they change the ETag too
+        User.objects.filter(pk=self.user.pk).update(tier='premium')
+        self.user.refresh_from_db()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_save_of_unchanged_profile_does_not_write(self):
+        profile = Profile.objects.get(user=self.user)
+        with self.assertNumQueries(0):
+            profile.save()
+        profile.bio = 'changed'
+        profile.save()
+        self.assertEqual(Profile.objects.get(user=self.user).version, 2)
+
+    def test_concurrent_saves_each_bump_the_version(self):
+        first = Profile.objects.get(user=self.user)
+        second = Profile.objects.get(user=self.user)
+        first.first_name = 'Ann'
+        first.save()
+        second.last_name = 'Lee'
+        second.save()
+
+        # The second save was loaded before the first one wrote, yet doesn't reuse its version
+        self.assertEqual((first.version, second.version), (2, 3))
+        self.assertEqual(Profile.objects.get(user=self.user).version, 3)
+
+
+class ActivityBufferTests(TestCase):
+
+    def setUp(self):
+        self.buffer = ActivityBuffer()
+        self.users = [User.objects.create_user(email=f'seen{n}@example.com', password='pw') for n in range(3)]
+
+    @override_settings(LAST_SEEN_GRANULARITY=300)
+    def test_flush_coalesces_into_one_update_per_column(self):
+        now = timezone.now()
+        for user in self.users:
+            # Two requests, each with its own copy of the user loaded before any flush
+            self.buffer.record(User.objects.get(pk=user.pk), ['last_seen'], at=now - timedelta(seconds=1))
+            self.buffer.record(User.objects.get(pk=user.pk), ['last_seen'], at=now)
+        self.users[0].last_login = None
+        self.buffer.record(self.users[0], ['last_login', 'last_seen'], at=now)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.buffer.flush(), 4)
+        self.assertEqual(len([q for q in queries if 'UPDATE' in q['sql']]), 2)
+        self.assertEqual(self.buffer.pending_count(), 0)
+        self.assertEqual(set(User.objects.values_list("last_seen", flat=True)), {now})
+        self.assertEqual(User.objects.get(pk=self.users[0].pk).last_login, now)
+
+    @override_settings(LAST_SEEN_GRANULARITY=300)
+    def test_timestamps_within_granularity_are_not_recorded(self):
+        user = self.users[0]
+        now = timezone.now()
+        self.assertTrue(self.buffer.record(user, ['last_seen'], at=now))
+        self.buffer.flush()
+        self.assertFalse(self.buffer.record(user, ['last_seen'], at=now + timedelta(seconds=299)))
+        self.assertTrue(self.buffer.record(user, ['last_seen'], at=now + timedelta(seconds=300)))
+
+    def test_flush_never_moves_timestamps_backwards(self):
+        user = self.users[0]
+        now = timezone.now()
+        User.objects.filter(pk=user.pk).update(last_seen=now)
+        user.last_seen = None  # Stale copy loaded before another worker wrote
+        self.buffer.record(user, ['last_seen'], at=now - timedelta(hours=1))
+
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(User.objects.get(pk=user.pk).last_seen, now)
+
+    @override_settings(ACTIVITY_BUFFER_MAX=2)
+    def test_full_buffer_wakes_the_flusher_instead_of_writing_in_the_request(self):
+        now = timezone.now()
+        with mock.patch.object(self.buffer, '_ensure_flusher'), mock.patch.object(self.buffer, 'flush') as flush:
+            self.buffer.record(self.users[0], ['last_seen'], at=now)
+            self.assertFalse(self.buffer._wake.is_set())
+            self.buffer.record(self.users[1], ['last_seen'], at=now)
+        flush.assert_not_called()
+        self.assertTrue(self.buffer._wake.is_set())
+
+
+class AuditLogTests(TestCase):
+
+    def setUp(self):
+        self.log = AuditLog()
+        self.user = User.objects.create_user(email='audited@example.com', password='pw')
+
+    def test_flush_writes_each_month_to_its_partition(self):
+        january = datetime(2026, 1, 31, 23, 59, tzinfo=dt_timezone.utc)
+        february = datetime(2026, 2, 1, tzinfo=dt_timezone.utc)
+        self.log.record('login', user=self.user, method='password', at=january)
+        self.log.record('login', email='nobody@example.com', method='password', success=False, at=february)
+        self.log.record('verify_email', user=self.user, at=february)
+
+        self.assertEqual(self.log.flush(), 3)
+        self.assertEqual(self.log.pending_count(), 0)
+        self.assertTrue({'auth_audit_event_p202601', 'auth_audit_event_p202602'} <= set(list_partitions(connection)))
+        events = AuthAuditEvent.objects.filter(occurred_at__lt=datetime(2026, 3, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(
+            list(events.order_by('occurred_at', 'event_type').values_list('event_type', 'success', 'user_id')),
+            [('login', True, self.user.pk), ('login', False, None), ('verify_email', True, self.user.pk)],
+        )
+        self.assertEqual(len(set(events.values_list('id', flat=True))), 3)
+
+    def test_drop_expired_partitions_removes_whole_months(self):
+        for month in (1, 2, 3):
+            self.log.record('login', user=self.user, at=datetime(2026, month, 10, tzinfo=dt_timezone.utc))
+        self.log.flush()
+
+        now = datetime(2026, 3, 20, tzinfo=dt_timezone.utc)
+        self.assertEqual(drop_expired_partitions(connection, months=2, now=now), ['auth_audit_event_p202601'])
+        self.assertEqual(
+            sorted(AuthAuditEvent.objects.filter(occurred_at__lt=now).values_list('occurred_at__month', flat=True)),
+            [2, 3],
+        )
+
+    def test_login_buffers_the_event_without_writing_it(self):
+        audit_log.flush()
+        client = APIClient()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(reverse('token_obtain_pair'), {'email': 'audited@example.com', 'password': 'pw'})
+            client.post(reverse('token_obtain_pair'), {'email': 'audited@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'auth_audit_event' in q['sql']])
+        self.assertEqual(audit_log.pending_count(), 2)
+
+        self.assertEqual(audit_log.flush(), 2)
+        self.assertEqual(
+            sorted(AuthAuditEvent.objects.filter(email='audited@example.com').values_list('success', flat=True)),
+            [False, True],
+        )
+
+    def test_rows_the_database_rejects_are_dropped_alone(self):
+        def insert(model, fields, rows, **kwargs):
+            if any(row[5] == 'bad@example.com' for row in rows):
+                raise DataError('value rejected')
+            return original(model, fields, rows, **kwargs)
+
+        original = bulk_insert_rows
+        for n in range(5):
+            self.log.record('login', email='bad@example.com' if n == 3 else f'ok{n}@example.com')
+        with mock.patch('api_auth.audit.bulk_insert_rows', side_effect=insert):
+            self.assertEqual(self.log.flush(), 4)
+        self.assertEqual(self.log.pending_count(), 0)
+        self.assertFalse(AuthAuditEvent.objects.filter(email='bad@example.com').exists())
+
+    def test_transient_failures_are_retried(self):
+        self.log.record('login', user=self.user)
+        with mock.patch('api_auth.audit.bulk_insert_rows', side_effect=OperationalError('database is locked')):
+            self.assertEqual(self.log.flush(), 0)
+        self.assertEqual(self.log.pending_count(), 1)
+        self.assertEqual(self.log.flush(), 1)
+
+    @override_settings(AUDIT_BUFFER_MAX=2)
+    def test_full_buffer_wakes_the_flusher_instead_of_writing_in_the_request(self):
+        with mock.patch.object(self.log, '_ensure_flusher'), mock.patch.object(self.log, 'flush') as flush:
+            self.log.record('login', user=self.user)
+            self.assertFalse(self.log._wake.is_set())
+            self.log.record('login', user=self.user)
+        flush.assert_not_called()
+        self.assertTrue(self.log._wake.is_set())
+
+    @override_settings(TRUSTED_PROXY_HOPS=1)
+    def test_client_ip_is_read_behind_the_trusted_proxy(self):
+        factory = RequestFactory()
+        request = factory.get('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.7')
+        self.assertEqual(client_ip(request), '203.0.113.7')  # 1.2.3.4 was sent by the client
+        self.assertEqual(client_ip(factory.get('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='198.51.100.1')),
+                         '198.51.100.1')
+        self.assertEqual(client_ip(factory.get('/', REMOTE_ADDR='10.0.0.2')), '10.0.0.2')
+        self.assertIsNone(client_ip(factory.get('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='not-an-ip')))
+
+
+class EmailVerificationConsumeTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='verify@example.com', password='pw')
+        self.verification = EmailVerification.objects.create(user=self.user)
+
+    def test_consume_is_two_updates_and_no_select(self):
+        with CaptureQueriesContext(connection) as queries:
+            email = consume_verification_token(self.verification.token)
+
+        self.assertEqual(email, 'verify@example.com')
+        statements = [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 2)
+        self.assertTrue(all(sql.startswith('UPDATE') for sql in statements))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_email_verified)
+
+    def test_used_and_expired_tokens_are_rejected(self):
+        self.assertIsNotNone(consume_verification_token(self.verification.token))
+        self.assertIsNone(consume_verification_token(self.verification.token))
+
+        expired = EmailVerification.objects.create(user=self.user, expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(consume_verification_token(expired.token))
+
+    def test_view(self):
+        url = reverse('verify_email', args=[self.verification.token])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class EmailVerificationRaceTests(TransactionTestCase):
+
+    def test_concurrent_consumes_have_exactly_one_winner(self):
+        user = User.objects.create_user(email='race@example.com', password='pw')
+        token = EmailVerification.objects.create(user=user).token
+        contenders = 8
+        barrier = threading.Barrier(contenders)
+        results = []
+
+        def consume():
+            barrier.wait()
+            try:
+                while True:
+                    try:
+                        results.append(consume_verification_token(token))
+                        return
+                    except OperationalError as e:
+                        # The in-memory SQLite test database locks whole tables and
+                        # doesn't wait for them; a real client would retry too
+                        if 'locked' not in str(e):
+                            raise
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=consume) for _ in range(contenders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count('race@example.com'), 1)
+        self.assertEqual(results.count(None), contenders - 1)
+
+
+@override_settings(EMAIL_VERIFICATION_MODE='signed', EMAIL_VERIFICATION_MAX_AGE=3600)
+class SignedEmailVerificationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='signed@example.com', password='pw')
+
+    def test_issuing_writes_nothing_and_verifying_is_one_read_and_one_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            token = issue_verification_token(self.user)
+        self.assertEqual(len(queries), 0)
+        self.assertNotIn(b'signed@', signing.b64_decode(token.split(':')[0].encode()))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(consume_verification_token(token), 'signed@example.com')
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['SELECT', 'UPDATE'])
+        self.assertFalse(EmailVerification.objects.exists())
+
+    def test_tokens_carrying_the_address_still_verify(self):
+        token = signing.TimestampSigner(salt=SIGNED_TOKEN_SALT).sign_object(
+            {'id': self.user.pk, 'email': 'signed@example.com'},
+        )
+        self.assertEqual(consume_verification_token(token), 'signed@example.com')
+
+    def test_token_is_single_use(self):
+        token = issue_verification_token(self.user)
+        url = reverse('verify_email', args=[token])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_changed_email_tampered_and_expired_tokens_are_rejected(self):
+        token = issue_verification_token(self.user)
+        self.assertIsNone(consume_verification_token(token[:-2] + 'xx'))
+        with mock.patch('time.time', return_value=time.time() + 3601):
+            self.assertIsNone(consume_verification_token(token))
+
+        User.objects.filter(pk=self.user.pk).update(email='changed@example.com')
+        self.assertIsNone(consume_verification_token(token))
+
+    def test_table_tokens_issued_before_a_mode_switch_still_verify(self):
+        with self.settings(EMAIL_VERIFICATION_MODE='table'):
+            token = issue_verification_token(self.user)
+        self.assertEqual(consume_verification_token(token), 'signed@example.com')
+
+
+class BulkTestModelTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = '/api/auth/test/bulk/'
+
+    def test_create_update_delete_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.url, [{'display_name': f'row-{n}', 'test_count': n} for n in range(50)], format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertLessEqual(len(queries), 3)
+        ids = [row['test_id'] for row in response.json()]
+        self.assertEqual(TestModel.objects.filter(pk__in=ids).count(), 50)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, [{'test_id': pk, 'test_count': -1} for pk in ids], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), 5)
+        self.assertEqual(TestModel.objects.filter(test_count=-1).count(), 50)
+        self.assertEqual(TestModel.objects.get(pk=ids[0]).display_name, 'row-0')  # Left out, left alone
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(self.url, ids, format='json')
+        self.assertEqual(response.json(), {'deleted': 50})
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('DELETE')]), 1)
+        self.assertFalse(TestModel.objects.exists())
+
+    def test_invalid_items_are_reported_and_nothing_is_written(self):
+        existing = TestModel.objects.create(display_name='keep', test_count=1)
+
+        response = self.client.post(self.url, [{'display_name': 'ok'}, {'display_name': 'x' * 50}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1])
+        self.assertEqual(TestModel.objects.count(), 1)
+
+        response = self.client.patch(self.url, [
+            {'test_id': existing.pk, 'test_count': 2}, {'test_id': existing.pk + 100, 'test_count': 2},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [{'index': 1, 'errors': {'test_id': ['Not found.']}}])
+        self.assertEqual(TestModel.objects.get(pk=existing.pk).test_count, 1)
+
+        response = self.client.delete(self.url, [existing.pk, existing.pk + 100], format='json')
+        self.assertEqual(response.json()['errors'], [{'index': 1, 'errors': ['Not found.']}])
+        self.assertTrue(TestModel.objects.filter(pk=existing.pk).exists())
+
+    @override_settings(BULK_MAX_BATCH_SIZE=2)
+    def test_batch_size_limit(self):
+        response = self.client.post(self.url, [{'display_name': str(n)} for n in range(3)], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(TestModel.objects.exists())
+        self.assertEqual(self.client.post(self.url, {'display_name': 'one'}, format='json').status_code, 400)
+
+    def test_protected_routes_require_authentication(self):
+        response = self.client.post('/api/auth/test-protected/bulk/', [{'display_name': 'a'}], format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class GoogleUpsertTests(TestCase):
+
+    def test_sign_in_is_two_statements_and_profile_writes_only_changes(self):
+        with CaptureQueriesContext(connection) as queries:
+            user, created = upsert_google_user('new@example.com', 'New User', 'New')
+        self.assertTrue(created)
+        self.assertEqual(len(queries), 2)
+        profile = Profile.objects.get(user=user)
+        self.assertEqual((profile.display_name, profile.first_name, profile.version), ('New User', 'New', 1))
+        stored = User.objects.get(pk=user.pk)
+        self.assertTrue(stored.is_email_verified)
+        self.assertEqual(stored.register_method, 'google')
+        self.assertFalse(stored.has_usable_password())
+
+        with CaptureQueriesContext(connection) as queries:
+            again, created = upsert_google_user('new@example.com', 'New User', 'New')
+        self.assertFalse(created)
+        self.assertEqual(again.pk, user.pk)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(Profile.objects.get(user=user).version, 1)  # Unchanged, not rewritten
+
+        upsert_google_user('new@example.com', 'Renamed', 'New')
+        profile = Profile.objects.get(user=user)
+        self.assertEqual((profile.display_name, profile.version), ('Renamed', 2))
+
+    def test_existing_email_account_keeps_its_settings(self):
+        existing = User.objects.create_user(email='mail@example.com', password='pw')
+        user, created = upsert_google_user('mail@example.com', None, None)
+        self.assertFalse(created)
+        self.assertEqual(user.pk, existing.pk)
+        stored = User.objects.get(pk=existing.pk)
+        self.assertEqual(stored.register_method, 'email')
+        self.assertTrue(stored.check_password('pw'))
+        self.assertEqual(Profile.objects.get(user=existing).display_name, '')
+
+
+class GoogleUpsertRaceTests(TransactionTestCase):
+
+    def test_concurrent_callbacks_for_a_new_email(self):
+        contenders = 8
+        barrier = threading.Barrier(contenders)
+        results, errors = [], []
+
+        def sign_in():
+            barrier.wait()
+            try:
+                while True:
+                    try:
+                        results.append(upsert_google_user('race@example.com', 'Racer', 'Race'))
+                        return
+                    except OperationalError as e:
+                        # See EmailVerificationRaceTests: SQLite test databases lock whole tables
+                        if 'locked' not in str(e):
+                            raise
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=sign_in) for _ in range(contenders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len({user.pk for user, _ in results}), 1)
+        self.assertEqual([created for _, created in results].count(True), 1)
+        self.assertEqual(User.objects.filter(email='race@example.com').count(), 1)
+        self.assertEqual(Profile.objects.filter(user__email='race@example.com').count(), 1)
+
+
+class TokenRefreshGraceTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='refresh@example.com', password='pw')
+        self.refresh = str(RefreshToken.for_user(self.user))
+        self.url = reverse('token_refresh')
+
+    def test_repeated_refreshes_share_one_new_pair(self):
+        first = self.client.post(self.url, {'refresh': self.refresh})
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.post(self.url, {'refresh': self.refresh})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json(), second.json())
+        self.assertNotEqual(first.json()['refresh'], self.refresh)
+        self.assertEqual(len(queries), 0)
+
+        # The new refresh token is a different jti, so it rotates again
+        third = self.client.post(self.url, {'refresh': first.json()['refresh']})
+        self.assertNotEqual(third.json()['refresh'], first.json()['refresh'])
+
+    @override_settings(TOKEN_REFRESH_GRACE_SECONDS=0)
+    def test_without_grace_window_every_refresh_rotates(self):
+        first = self.client.post(self.url, {'refresh': self.refresh}).json()
+        second = self.client.post(self.url, {'refresh': self.refresh}).json()
+        self.assertNotEqual(first['refresh'], second['refresh'])
+
+    def test_only_valid_refresh_tokens_are_looked_up(self):
+        access = str(RefreshToken.for_user(self.user).access_token)
+        self.assertEqual(self.client.post(self.url, {'refresh': access}).status_code, 401)
+        self.assertEqual(self.client.post(self.url, {'refresh': self.refresh[:-2] + 'xx'}).status_code, 401)
+
+
+class TokenRefreshGraceRaceTests(TransactionTestCase):
+
+    def test_parallel_refreshes_get_the_same_pair(self):
+        user = User.objects.create_user(email='storm@example.com', password='pw')
+        refresh = str(RefreshToken.for_user(user))
+        contenders = 6
+        barrier = threading.Barrier(contenders)
+        results, errors = [], []
+
+        def refresh_once():
+            barrier.wait()
+            try:
+                serializer = TieredTokenRefreshSerializer(data={'refresh': refresh})
+                serializer.is_valid(raise_exception=True)
+                results.append(serializer.validated_data['refresh'])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=refresh_once) for _ in range(contenders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), contenders)
+        self.assertEqual(len(set(results)), 1)
+
+    def test_parallel_refreshes_on_different_workers_get_the_same_pair(self):
+        # Each worker has its own two-tier cache (own L1 and key locks); only the default cache is shared
+        workers = [
+            type('WorkerRefreshSerializer', (TieredTokenRefreshSerializer,), {'cache': TwoTierCache()})
+            for _ in range(2)
+        ]
+        user = User.objects.create_user(email='workers@example.com', password='pw')
+        refresh = str(RefreshToken.for_user(user))
+        contenders = 6
+        barrier = threading.Barrier(contenders)
+        results, errors = [], []
+
+        def refresh_once(serializer_class):
+            barrier.wait()
+            try:
+                serializer = serializer_class(data={'refresh': refresh})
+                serializer.is_valid(raise_exception=True)
+                results.append(serializer.validated_data['refresh'])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=refresh_once, args=(workers[i % 2],)) for i in range(contenders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), contenders)
+        self.assertEqual(len(set(results)), 1)
@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
+
+TIER_CLAIM = 'tier'
+STAFF_CLAIM = 'staff'
+
+
+class TieredRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the user's tier and staff flag, copied into every
+    access token so admission control can prioritise requests (and the
+    profiler turn down non-staff ones) without a database lookup.
+    """
+
+    def __init__(self, token=None, verify=True):
+        super().__init__(token, verify)
+        if token is not None:
+            # Being refreshed: pick up plan and role changes made since the token was issued
+            self.refresh_claims()
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[TIER_CLAIM] = user.tier
+        if user.is_staff:
+            token[STAFF_CLAIM] = True
+        return token
+
+    def refresh_claims(self):
+        user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+        row = get_user_model().objects.filter(
+            **{api_settings.USER_ID_FIELD: user_id}
+        ).values_list('tier', 'is_staff').first()
+        if row is None:
+            return
+        tier, is_staff = row
+        self[TIER_CLAIM] = tier
+        if is_staff:
+            self[STAFF_CLAIM] = True
+        else:
+            self.payload.pop(STAFF_CLAIM, None)
+
+
+def refresh_token_jti(token):
+    """
+    jti of a refresh token after checking its signature, expiry and type, but
+    not the blacklist (a rotated token is blacklisted on its first refresh)
+    """
+    untyped = UntypedToken(token)
+    if untyped.get(api_settings.TOKEN_TYPE_CLAIM) != RefreshToken.token_type:
+        raise TokenError('Token has wrong type')
+    return untyped[api_settings.JTI_CLAIM]
@@ -1,8 +1,13 @@
+import hashlib
 import logging
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+
+from backend.events import publish, user_channel
 
 logger = logging.getLogger(__name__)
 
@@ -59,4 +64,42 @@ def send_welcome_email(user):
         return True
     except Exception as e:
         logger.error(f"Failed to send welcome email to {user.email}: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+# User columns that appear in the profile response next to the profile itself
+PROFILE_RESPONSE_USER_FIELDS = (
+    'id', 'email', 'is_active', 'is_email_verified', 'is_staff',
+    'last_login', 'date_joined', 'register_method', 'tier',
+)
+
+
+def profile_etag(user, version):
+    """
+    ETag of the profile response: the profile row version plus a short digest
+    of the user columns included in the response, so a tier change or email
+    verification also invalidates cached copies.
+    """
+    user_state = repr(tuple(getattr(user, name) for name in PROFILE_RESPONSE_USER_FIELDS))
+    digest = hashlib.blake2b(user_state.encode(), digest_size=6).hexdigest()
+    return quote_etag(f"{user.pk}-{version}-{digest}")
+
+
+def profile_cache_key(user_id):
+    """Key (and invalidation tag) of a user's cached profile payload in backend.caching"""
+    return f'profile:{user_id}'
+
+
+def publish_tier_changes(user_tiers, using=None):
+    """Once the transaction commits, send a `tier` event (backend.events) to each user: {user_id: tier}"""
+    def send():
+        for user_id, tier in user_tiers.items():
+            publish(user_channel(user_id), 'tier', tier=tier)
+    transaction.on_commit(send, using=using)
+
+
+def etag_matches(header, etag):
+    """True if an If-Match / If-None-Match header lists `etag` (or `*`), ignoring weak markers"""
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return '*' in tags or etag.removeprefix('W/') in (tag.removeprefix('W/') for tag in tags)
@@ -0,0 +1,117 @@
+"""
+Email verification tokens.
+
+EMAIL_VERIFICATION_MODE picks how new tokens are issued:
+
+- `table`: a random UUID stored in EmailVerification, claimed once on use,
+- `signed`: an HMAC-signed, timestamped token over the user's id and a
+  digest of their email (the address itself is not readable from the link).
+  Nothing is written when it is issued and it expires after
+  EMAIL_VERIFICATION_MAX_AGE. Verifying it reads the user's email, checks it
+  against the digest and runs an UPDATE conditional on the user still having
+  that email and not being verified yet, so a token stops working once it
+  has been used or the address changed.
+
+Both formats are accepted on verification whatever the mode, so links sent
+before a mode switch keep working.
+"""
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import EmailVerification, User
+
+SIGNED_TOKEN_SALT = 'api_auth.email_verification'
+
+
+def issue_verification_token(user, replace=False):
+    """
+    New verification token for `user`, as it goes in the link. With `replace`
+    the user's previous table tokens are deleted first (resending).
+    """
+    if settings.EMAIL_VERIFICATION_MODE == 'signed':
+        return signing.TimestampSigner(salt=SIGNED_TOKEN_SALT).sign_object(
+            {'id': user.pk, 'email_digest': _email_digest(user.email)},
+        )
+    if replace:
+        user.verification_tokens.all().delete()
+    return str(EmailVerification.objects.create(user=user).token)
+
+
+def consume_verification_token(token, now=None):
+    """Verify the user `token` was issued for; their email, or None if the token is not valid (any more)"""
+    try:
+        token = uuid.UUID(str(token))
+    except ValueError:
+        return _consume_signed_token(str(token))
+    return _consume_table_token(token, now)
+
+
+def _email_digest(email):
+    return salted_hmac(SIGNED_TOKEN_SALT, email).hexdigest()[:16]
+
+
+def _consume_signed_token(token):
+    try:
+        payload = signing.TimestampSigner(salt=SIGNED_TOKEN_SALT).unsign_object(
+            token, max_age=settings.EMAIL_VERIFICATION_MAX_AGE,
+        )
+        user_id = int(payload['id'])
+        if 'email' in payload:
+            # Issued before tokens stopped carrying the address; valid until they expire
+            email_digest = _email_digest(payload['email'])
+        else:
+            email_digest = payload['email_digest']
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+    email = User.objects.filter(pk=user_id, is_email_verified=False).values_list('email', flat=True).first()
+    if email is None or not constant_time_compare(_email_digest(email), email_digest):
+        return None
+    # Signature and age are checked above; being unverified with this email is the one-time part
+    verified = User.objects.filter(pk=user_id, email=email, is_email_verified=False).update(is_email_verified=True)
+    return email if verified else None
+
+
+def _consume_table_token(token, now=None):
+    """
+    Mark `token` used and its user verified, without reading either row first.
+
+    Two conditional UPDATEs in one transaction: the first only matches an
+    unused, unexpired token, so of several concurrent calls exactly one
+    changes a row and wins; the others match nothing and get None. The
+    winner gets the user's email back (for the welcome email) from the
+    second UPDATE's RETURNING clause.
+    """
+    now = now or timezone.now()
+    using = router.db_for_write(EmailVerification)
+    with transaction.atomic(using=using):
+        claimed = EmailVerification.objects.using(using).filter(
+            token=token, is_used=False, expires_at__gt=now,
+        ).update(is_used=True)
+        if not claimed:
+            return None
+        return _verify_user_returning_email(using, token)
+
+
+def _verify_user_returning_email(using, token):
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    user_table = qn(User._meta.db_table)
+    token_table = qn(EmailVerification._meta.db_table)
+    params = [True, EmailVerification._meta.get_field('token').get_db_prep_value(token, connection)]
+    sql = (
+        f'UPDATE {user_table} SET {qn("is_email_verified")} = %s '
+        f'WHERE {qn("id")} = (SELECT {qn("user_id")} FROM {token_table} WHERE {qn("token")} = %s)'
+    )
+    with connection.cursor() as cursor:
+        if connection.features.can_return_columns_from_insert:
+            # PostgreSQL, SQLite >= 3.35: same statement hands back the address
+            cursor.execute(f'{sql} RETURNING {qn("email")}', params)
+            row = cursor.fetchone()
+            return row[0] if row else None
+        cursor.execute(sql, params)
+    return User.objects.using(using).filter(verification_tokens__token=token).values_list('email', flat=True).first()
@@ -1,26 +1,30 @@
-import requests
 from django.shortcuts import render, redirect, get_object_or_404
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.utils import timezone
+from django.db import transaction
 from rest_framework import viewsets, generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import TestModel, Profile, EmailVerification
+from .models import TestModel, Profile
 from .serializers import TestModelSerializer, RegisterSerializer, ResendVerificationSerializer, CustomUserSerializer, ProfileSerializer
 import logging
-from .utils import send_verification_email, send_welcome_email
+from .audit import record_audit_event
+from .oauth import upsert_google_user
+from .verification import consume_verification_token, issue_verification_token
+from .utils import send_verification_email, send_welcome_email, profile_etag, profile_cache_key, etag_matches
 
 from django.contrib.auth import get_user_model
+from backend.bulk import BulkModelMixin
+from backend.caching import two_tier_cache
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import TieredRefreshToken
 
 logger = logging.getLogger(__name__)
 env = settings.ENV
 User = get_user_model()
 
 # Create your views here.
-class TestModelViewSet(viewsets.ModelViewSet):
+class TestModelViewSet(BulkModelMixin, viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     queryset = TestModel.objects.all()
     serializer_class = TestModelSerializer
@@ -31,7 +35,7 @@ class TestModelViewSet(viewsets.ModelViewSet):
         return super().list(request, *args, **kwargs)
 
 
-class TestModelProtectedViewSet(viewsets.ModelViewSet):
+class TestModelProtectedViewSet(BulkModelMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = TestModel.objects.all()
     serializer_class = TestModelSerializer
@@ -44,10 +48,11 @@ class CustomRegisterView(generics.CreateAPIView):
     
     def perform_create(self, serializer):
         user = serializer.save()
-        # Create verification token
-        verification = EmailVerification.objects.create(user=user)
+        record_audit_event('register', user=user, method='email', request=self.request)
+        # Create verification token (a table row, or nothing to write in signed mode)
+        token = issue_verification_token(user)
         # Send verification email
-        send_verification_email(user, verification.token)
+        send_verification_email(user, token)
 
 
 class GoogleLoginView(APIView):
@@ -72,6 +77,9 @@ class GoogleOAuth2CallbackView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, *args, **kwargs):
+        # Imported here: `requests` is only needed on this route and is slow to import at boot
+        import requests
+
         code = request.GET.get('code')
         if not code:
             return Response({'error': 'Code is required'}, status=status.HTTP_400_BAD_REQUEST)
@@ -105,25 +113,17 @@ class GoogleOAuth2CallbackView(APIView):
         user_name = user_info.get('name')
         first_name = user_info.get('given_name')
 
-        # Create or get user
-        user, created = User.objects.get_or_create(email=email)
-        user.last_login = timezone.now()
+        # Create or update the user and profile: two upserts, safe against parallel callbacks
+        user, created = upsert_google_user(email, display_name=user_name, first_name=first_name)
+        record_audit_event(
+            'register' if created else 'login', user=user, method='google', request=request,
+        )
         if created:
-            user.register_method = "google"
-            user.is_email_verified = True  # Google accounts have verified emails
-            user.save()
-
             # Send welcome email to new Google users
             send_welcome_email(user)
-        
-        # Update profile
-        Profile.objects.update_or_create(
-            user=user,
-            defaults={'display_name': user_name, 'first_name': first_name}
-        )
 
         # Generate JWT token
-        refresh = RefreshToken.for_user(user)
+        refresh = TieredRefreshToken.for_user(user)
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -135,23 +135,17 @@ class VerifyEmailView(APIView):
     
     def get(self, request, token):
         try:
-            verification = get_object_or_404(EmailVerification, token=token)
-            
-            if not verification.is_valid():
+            # Conditional UPDATEs only, no SELECT (two for table tokens, one for signed ones)
+            email = consume_verification_token(token)
+            record_audit_event('verify_email', email=email or '', success=email is not None, request=request)
+            if email is None:
                 return Response(
-                    {'error': 'Verification link has expired or already been used'}, 
+                    {'error': 'Verification link is invalid, has expired or has already been used'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
-                
-            user = verification.user
-            user.is_email_verified = True
-            user.save()
-            
-            verification.is_used = True
-            verification.save()
             
-            # Send welcome email
-            send_welcome_email(user)
+            # Send welcome email (the address is all the template needs)
+            send_welcome_email(User(email=email))
             
             return Response({'message': 'Email verified successfully'})
             
@@ -170,6 +164,7 @@ class ResendVerificationView(APIView):
         serializer = ResendVerificationSerializer(data=request.data)
         if serializer.is_valid():
             email = serializer.validated_data['email']
+            record_audit_event('resend_verification', email=email, request=request)
             
             try:
                 user = User.objects.get(email=email)
@@ -180,14 +175,11 @@ class ResendVerificationView(APIView):
                         status=status.HTTP_200_OK
                     )
                 
-                # Delete any existing verification tokens
-                user.verification_tokens.all().delete()
-                
-                # Create new verification token
-                verification = EmailVerification.objects.create(user=user)
+                # Replace any existing verification tokens
+                token = issue_verification_token(user, replace=True)
                 
                 # Send verification email
-                send_verification_email(user, verification.token)
+                send_verification_email(user, token)
                 
                 return Response(
                     {'message': 'Verification email sent successfully'}, 
@@ -209,18 +201,51 @@ class UserProfileView(APIView):
     
     def get(self, request):
         user = request.user
-        profile = user.profile
-        
+        # The profile part of the response is cached; saving the profile invalidates it
+        cached = two_tier_cache.get_or_set(
+            profile_cache_key(user.pk),
+            lambda: {'version': user.profile.version, 'data': dict(ProfileSerializer(user.profile).data)},
+            ttl=settings.PROFILE_CACHE_TTL, tags=[profile_cache_key(user.pk)],
+        )
+
+        # Conditional GET: the client's copy is current, skip serialization
+        etag = profile_etag(user, cached['version'])
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        return self._profile_response(user, cached['data'], etag)
+
+    def patch(self, request):
+        user = request.user
+        serializer = ProfileSerializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            # Lock the row so the If-Match check and the write see the same version
+            profile = Profile.objects.select_for_update().get(user=user)
+            if_match = request.headers.get('If-Match')
+            if if_match and not etag_matches(if_match, profile_etag(user, profile.version)):
+                return Response(
+                    {'error': 'Profile was modified by another request, reload and retry'},
+                    status=status.HTTP_412_PRECONDITION_FAILED,
+                    headers={'ETag': profile_etag(user, profile.version)},
+                )
+
+            for field, value in serializer.validated_data.items():
+                setattr(profile, field, value)
+            # Writes only the changed columns, or nothing when the input matches the stored values
+            profile.save()
+
+        return self._profile_response(user, ProfileSerializer(profile).data, profile_etag(user, profile.version))
+
+    def _profile_response(self, user, profile_data, etag):
         # Serialize user data
         user_data = CustomUserSerializer(user).data
         
-        # Serialize profile data
-        profile_data = ProfileSerializer(profile).data
-        
         # Combine data
         response_data = {
             **user_data,
             'profile': profile_data
         }
         
-        return Response(response_data)
\ No newline at end of file
+        return Response(response_data, headers={'ETag': etag})
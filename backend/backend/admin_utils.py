@@ -0,0 +1,57 @@
+"""
+Admin building blocks for tables with millions of rows.
+
+- EstimatedCountPaginator: on PostgreSQL the changelist count comes from
+  the planner's row estimate (EXPLAIN) once that estimate is above
+  ADMIN_ESTIMATED_COUNT_THRESHOLD, instead of a COUNT(*) over the table on
+  every page load. Smaller results are still counted exactly.
+- LargeTableAdmin: uses that paginator, skips the second, unfiltered count
+  (show_full_result_count) and searches `indexed_search_fields` with
+  `icontains` on PostgreSQL, where trigram indexes on UPPER(column) back
+  them (see the `*_search_indexes` migrations). Other databases have no
+  trigram indexes, so the same fields are searched by prefix there.
+"""
+import json
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections, router
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def estimated_count(queryset):
+    """Planner's row estimate for `queryset` on PostgreSQL, None elsewhere"""
+    if not isinstance(queryset, QuerySet):
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    indexed_search_fields = ()
+
+    def get_search_fields(self, request):
+        if connections[router.db_for_read(self.model)].vendor == 'postgresql':
+            return self.indexed_search_fields
+        return [f'^{field}' for field in self.indexed_search_fields]
@@ -0,0 +1,137 @@
+"""
+Tier-based admission control for one worker process.
+
+Every worker has a fixed number of threads. Under overload this middleware
+rejects the lowest priority requests first, with 503 and Retry-After, so the
+threads stay available for paying users:
+
+- requests to ADMISSION_EXEMPT_PATHS (health checks, login, registration,
+  webhooks, admin) are never shed,
+- other requests are classified by the `tier` claim of their access token
+  (api_auth.tokens), or as `anonymous`,
+- a class listed in ADMISSION_MAX_IN_FLIGHT is rejected while this worker
+  already runs that share of its threads, or when the request waited in the
+  queue longer than ADMISSION_MAX_QUEUE_MS for its class (measured from the
+  X-Request-Start header set by nginx).
+
+Classes without limits (premium by default) are always admitted.
+"""
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api_auth.tokens import TIER_CLAIM
+
+ANONYMOUS = 'anonymous'
+EXEMPT = 'exempt'
+
+
+def request_class(request):
+    """Priority class of a request: its user's tier, `anonymous`, or `exempt`"""
+    if request.path_info.startswith(tuple(settings.ADMISSION_EXEMPT_PATHS)):
+        return EXEMPT
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not header.startswith('Bearer '):
+        return ANONYMOUS
+    try:
+        # Verified, so a forged claim can't buy priority
+        token = AccessToken(header[len('Bearer '):])
+    except TokenError:
+        return ANONYMOUS
+    return token.get(TIER_CLAIM, 'free')
+
+
+def queue_ms(request, now=None):
+    """Time since the proxy received the request (X-Request-Start: t=<seconds|ms|us>), or None"""
+    value = request.META.get('HTTP_X_REQUEST_START', '').removeprefix('t=')
+    try:
+        started = float(value)
+    except ValueError:
+        return None
+    # nginx sends seconds with millisecond resolution; other proxies use ms or us
+    while started > 1e11:
+        started /= 1000
+    return max(0.0, ((now or time.time()) - started) * 1000)
+
+
+class AdmissionController:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.admitted = Counter()
+        self.shed = Counter()
+
+    def limit_for(self, request_cls):
+        share = settings.ADMISSION_MAX_IN_FLIGHT.get(request_cls)
+        if share is None:
+            return None
+        return max(1, math.floor(settings.ADMISSION_WORKER_THREADS * share))
+
+    def try_admit(self, request_cls, waited_ms=None):
+        """Reserve a slot for a request of `request_cls`; False if it must be shed"""
+        limit = self.limit_for(request_cls)
+        max_queue_ms = settings.ADMISSION_MAX_QUEUE_MS.get(request_cls)
+        with self._lock:
+            overloaded = (
+                (limit is not None and self.in_flight >= limit)
+                or (max_queue_ms is not None and waited_ms is not None and waited_ms > max_queue_ms)
+            )
+            if overloaded:
+                self.shed[request_cls] += 1
+                return False
+            self.in_flight += 1
+            self.admitted[request_cls] += 1
+            return True
+
+    def try_reserve(self, request_cls, slots):
+        """
+        Reserve `slots` more slots for an admitted request of `request_cls`
+        that wants extra threads (backend.batch), all or none
+        """
+        limit = self.limit_for(request_cls)
+        with self._lock:
+            if limit is not None and self.in_flight + slots > limit:
+                return False
+            self.in_flight += slots
+            return True
+
+    def release(self, slots=1):
+        with self._lock:
+            self.in_flight -= slots
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': self.in_flight, 'admitted': dict(self.admitted), 'shed': dict(self.shed)}
+
+
+admission_controller = AdmissionController()
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.ADMISSION_CONTROL_ENABLED:
+            return self.get_response(request)
+
+        request_cls = request_class(request)
+        if not admission_controller.try_admit(request_cls, queue_ms(request)):
+            response = JsonResponse(
+                {'error': 'Service is overloaded, please retry later'},
+                status=503,
+                headers={'Retry-After': str(settings.ADMISSION_RETRY_AFTER)},
+            )
+            # Kept out of the django.request log by settings.skip_shed_requests
+            request.admission_shed = True
+            return response
+        try:
+            return self.get_response(request)
+        finally:
+            admission_controller.release()
@@ -2,6 +2,8 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The server-sent event stream at /api/events/ (backend.events) is only served
+through this app, e.g. by gunicorn with uvicorn.workers.UvicornWorker.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -0,0 +1,222 @@
+"""
+Several API calls in one request: POST /api/batch/
+
+    {"requests": [{"method": "GET", "path": "/api/auth/profile/"},
+                  {"method": "GET", "path": "/api/subscriptions/plans/", "headers": {"If-None-Match": "..."}},
+                  {"method": "PATCH", "path": "/api/auth/profile/", "body": {...}}],
+     "concurrent": true}
+
+    -> 200 {"responses": [{"status": 200, "headers": {...}, "body": {...}}, ...]}
+
+The batch pays for TLS, the middleware stack and JWT authentication once.
+Each sub-request is then resolved and run by its view in-process, with
+the batch's user forced onto it (no second token decode or user query).
+The responses come back in request order, each with its own status: one
+failing sub-request does not fail the others.
+
+- Sub-requests run in order. With `concurrent`, each run of consecutive
+  GETs goes to a pool of BATCH_MAX_CONCURRENCY threads; writes still wait
+  for everything before them and block everything after them.
+- At most BATCH_MAX_REQUESTS sub-requests per batch. Paths must be under
+  BATCH_ALLOWED_PREFIXES; batches can't nest, and async views (the event
+  stream) can't be batched.
+- Sub-requests skip the middleware. Being inside a POST, their reads go
+  to the primary database (backend.db_router).
+- The batch is admitted once (backend.admission), and its slot covers
+  the sub-requests it runs one at a time. A concurrent run takes one more
+  slot of the caller's class per extra pool thread, reserved as a unit;
+  when there isn't room for all of them, the run goes one by one on the
+  batch's own slot instead. Either way a batch never runs on more threads
+  than admission control allows its class.
+"""
+import io
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.http import Http404
+from django.urls import Resolver404, resolve
+from rest_framework import serializers, status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .admission import admission_controller, request_class
+
+logger = logging.getLogger(__name__)
+
+BATCH_PATH = '/api/batch/'
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Request headers of the batch that don't carry over to its sub-requests
+BATCH_ONLY_META = ('CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH')
+
+
+class BatchItemSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=METHODS, default='GET')
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+    headers = serializers.DictField(child=serializers.CharField(), required=False)
+
+    def validate_path(self, value):
+        path = value.split('?', 1)[0]
+        if path.startswith(BATCH_PATH) or not path.startswith(tuple(settings.BATCH_ALLOWED_PREFIXES)):
+            raise serializers.ValidationError('Path cannot be batched.')
+        return value
+
+    def validate_headers(self, value):
+        if any(name.lower() == 'authorization' for name in value):
+            raise serializers.ValidationError('Sub-requests use the credentials of the batch.')
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchItemSerializer(many=True, allow_empty=False)
+    concurrent = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(f'At most {settings.BATCH_MAX_REQUESTS} requests per batch.')
+        return value
+
+
+def build_request(batch_request, item):
+    """A WSGIRequest for `item`, with the batch's client details and authenticated user"""
+    path, _, query = item['path'].partition('?')
+    body = json.dumps(item['body']).encode() if 'body' in item else b''
+    environ = {key: value for key, value in batch_request.META.items() if key not in BATCH_ONLY_META}
+    environ.update({
+        'REQUEST_METHOD': item['method'],
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+    })
+    for name, value in item.get('headers', {}).items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    request = WSGIRequest(environ)
+    if batch_request.user.is_authenticated:
+        # Picked up by rest_framework.request.Request instead of running the authenticators again
+        request._force_auth_user = batch_request.user
+        request._force_auth_token = batch_request.auth
+    return request
+
+
+def response_item(response):
+    if hasattr(response, 'render') and callable(response.render):
+        response = response.render()
+    if response.streaming:
+        return error_item(status.HTTP_400_BAD_REQUEST, 'Streaming responses cannot be batched')
+    headers = {name: value for name, value in response.items() if name != 'Content-Length'}
+    body = None
+    if response.content:
+        if response.get('Content-Type', '').startswith('application/json'):
+            body = json.loads(response.content)
+        else:
+            body = response.content.decode(response.charset or 'utf-8', errors='replace')
+    return {'status': response.status_code, 'headers': headers, 'body': body}
+
+
+def error_item(status_code, message):
+    return {'status': status_code, 'headers': {}, 'body': {'error': message}}
+
+
+def dispatch(request):
+    """Run `request` through the view its path resolves to; returns its response item"""
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return error_item(status.HTTP_404_NOT_FOUND, 'Not found')
+    if iscoroutinefunction(match.func):
+        return error_item(status.HTTP_400_BAD_REQUEST, 'Path cannot be batched')
+    try:
+        return response_item(match.func(request, *match.args, **match.kwargs))
+    except Http404:
+        return error_item(status.HTTP_404_NOT_FOUND, 'Not found')
+    except Exception:
+        logger.exception(f"Batched {request.method} {request.path} failed")
+        return error_item(status.HTTP_500_INTERNAL_SERVER_ERROR, 'Internal server error')
+
+
+def _dispatch_in_pool(request):
+    # Pool threads keep their connection between tasks, within CONN_MAX_AGE like request threads
+    close_old_connections()
+    try:
+        return dispatch(request)
+    finally:
+        close_old_connections()
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # Created lazily so each forked worker gets its own threads (threads don't survive fork)
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(settings.BATCH_MAX_CONCURRENCY, thread_name_prefix='batch')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def reserve_slots(request_cls, slots):
+    if not settings.ADMISSION_CONTROL_ENABLED:
+        return True
+    return admission_controller.try_reserve(request_cls, slots)
+
+
+def release_slots(slots):
+    if settings.ADMISSION_CONTROL_ENABLED:
+        admission_controller.release(slots)
+
+
+def run_batch(requests, request_cls, concurrent=False):
+    """
+    Response items for `requests` in order. If `concurrent`, consecutive
+    GETs run in the pool while admission control has room for `request_cls`.
+    """
+    results = []
+    index = 0
+    while index < len(requests):
+        end = index + 1
+        if concurrent:
+            while end < len(requests) and requests[index].method == requests[end].method == 'GET':
+                end += 1
+        if end - index > 1:
+            gets = requests[index:end]
+            # The batch's own slot covers one thread, the others are admitted together
+            extra_slots = min(len(gets), settings.BATCH_MAX_CONCURRENCY) - 1
+            if reserve_slots(request_cls, extra_slots):
+                try:
+                    results.extend(get_executor().map(_dispatch_in_pool, gets))
+                finally:
+                    release_slots(extra_slots)
+            else:
+                results.extend(dispatch(request) for request in gets)
+        else:
+            results.append(dispatch(requests[index]))
+        index = end
+    return results
+
+
+class BatchView(APIView):
+    # Each sub-request is checked by its own view; anonymous batches can still read public routes
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        requests = [build_request(request, item) for item in serializer.validated_data['requests']]
+        return Response({'responses': run_batch(
+            requests, request_class(request), serializer.validated_data['concurrent'],
+        )})
@@ -0,0 +1,159 @@
+"""
+Bulk create, update and delete for model viewsets.
+
+BulkModelMixin adds one route, `<prefix>/bulk/`, to a ModelViewSet:
+
+- POST   [{...}, ...]                 -> bulk_create, 201 with the created objects
+- PATCH  [{"<pk>": 1, ...}, ...]      -> one UPDATE per batch, 200 with the updated objects
+- DELETE [1, 2, ...]                  -> DELETE ... WHERE pk IN (...), 200 with the count
+
+Each request is validated in one `many=True` serializer pass and written in
+one transaction: either every item is written or none is, and a 400 lists
+the failing items as `{"errors": [{"index": i, "errors": {...}}]}` with
+`index` pointing into the request body. Lists longer than
+BULK_MAX_BATCH_SIZE are rejected before validation.
+
+Writes skip Model.save() and per-object signals, like QuerySet.bulk_create()
+and update() do. Updates go through backend.db_utils.bulk_update_from_values
+rather than QuerySet.bulk_update(), whose CASE expression per row makes
+large batches quadratic. Many-to-many fields are not supported.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import router, transaction
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .db_utils import bulk_update_from_values
+
+
+def item_errors(errors):
+    """Per-item errors of a many=True serializer, without the items that passed"""
+    return [{'index': index, 'errors': detail} for index, detail in enumerate(errors) if detail]
+
+
+class BulkUpdateListSerializer(serializers.ListSerializer):
+    """
+    Validate a list of partial updates against `instances`, a {pk: object}
+    mapping loaded in one query. Each item names its object by primary key.
+    """
+
+    def __init__(self, *args, instances=None, **kwargs):
+        self.instances = instances or {}
+        self.seen = set()
+        super().__init__(*args, **kwargs)
+
+    def run_child_validation(self, data):
+        pk_field = self.child.Meta.model._meta.pk
+        try:
+            pk = pk_field.to_python(data.get(pk_field.name)) if isinstance(data, dict) else None
+        except DjangoValidationError:
+            pk = None
+        if pk is None or pk not in self.instances:
+            raise serializers.ValidationError({pk_field.name: ['Not found.']})
+        if pk in self.seen:
+            raise serializers.ValidationError({pk_field.name: ['Duplicate item.']})
+        self.seen.add(pk)
+        self.child.instance = self.instances[pk]
+        self.child.initial_data = data
+        return {'instance': self.instances[pk], 'attrs': super().run_child_validation(data)}
+
+
+class BulkModelMixin:
+    """Bulk routes for a ModelViewSet; see the module docstring"""
+
+    def check_bulk_payload(self, data):
+        """An error Response for bodies that aren't a non-empty list within BULK_MAX_BATCH_SIZE, else None"""
+        if not isinstance(data, list) or not data:
+            return Response({'error': 'Expected a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(data) > settings.BULK_MAX_BATCH_SIZE:
+            return Response(
+                {'error': f'At most {settings.BULK_MAX_BATCH_SIZE} items per request'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return None
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        if error := self.check_bulk_payload(request.data):
+            return error
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response({'errors': item_errors(serializer.errors)}, status=status.HTTP_400_BAD_REQUEST)
+
+        model = self.get_queryset().model
+        objects = [model(**attrs) for attrs in serializer.validated_data]
+        with transaction.atomic(using=router.db_for_write(model)):
+            model.objects.bulk_create(objects)
+        return Response(self.get_serializer(objects, many=True).data, status=status.HTTP_201_CREATED)
+
+    @bulk.mapping.patch
+    def bulk_update(self, request, *args, **kwargs):
+        if error := self.check_bulk_payload(request.data):
+            return error
+        queryset = self.get_queryset()
+        model = queryset.model
+        pk_field = model._meta.pk
+        ids = set()
+        for item in request.data:
+            try:
+                ids.add(pk_field.to_python(item.get(pk_field.name)) if isinstance(item, dict) else None)
+            except DjangoValidationError:
+                pass
+        ids.discard(None)
+
+        using = router.db_for_write(model)
+        with transaction.atomic(using=using):
+            # Locked, so the fields an item leaves out are written back unchanged
+            instances = queryset.using(using).select_for_update().in_bulk(ids)
+            serializer = BulkUpdateListSerializer(
+                child=self.get_serializer(partial=True), data=request.data, partial=True,
+                instances=instances, context=self.get_serializer_context(),
+            )
+            if not serializer.is_valid():
+                return Response({'errors': item_errors(serializer.errors)}, status=status.HTTP_400_BAD_REQUEST)
+
+            fields = []
+            for item in serializer.validated_data:
+                for name, value in item['attrs'].items():
+                    setattr(item['instance'], name, value)
+                    if name not in fields:
+                        fields.append(name)
+            updated = [item['instance'] for item in serializer.validated_data]
+            if fields:
+                bulk_update_from_values(
+                    model,
+                    [(obj.pk, *(getattr(obj, name) for name in fields)) for obj in updated],
+                    fields, using=using,
+                )
+        return Response(self.get_serializer(updated, many=True).data)
+
+    @bulk.mapping.delete
+    def bulk_destroy(self, request, *args, **kwargs):
+        if error := self.check_bulk_payload(request.data):
+            return error
+        queryset = self.get_queryset()
+        model = queryset.model
+        pk_field = model._meta.pk
+        ids, errors = [], []
+        for index, value in enumerate(request.data):
+            try:
+                ids.append(pk_field.to_python(value))
+            except DjangoValidationError as exc:
+                errors.append({'index': index, 'errors': exc.messages})
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        using = router.db_for_write(model)
+        with transaction.atomic(using=using):
+            _, per_model = queryset.using(using).filter(pk__in=ids).delete()
+            deleted = per_model.get(model._meta.label, 0)
+            if deleted != len(set(ids)):
+                # Some ids don't exist (any more): undo, then name them
+                transaction.set_rollback(True, using=using)
+        if deleted != len(set(ids)):
+            existing = set(queryset.using(using).filter(pk__in=ids).values_list('pk', flat=True))
+            errors = [{'index': index, 'errors': ['Not found.']} for index, pk in enumerate(ids) if pk not in existing]
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'deleted': deleted})
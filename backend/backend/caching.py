@@ -0,0 +1,280 @@
+"""
+Two-tier cache: a small in-process L1 in front of the shared Django cache (L2).
+
+    from backend.caching import two_tier_cache
+    data = two_tier_cache.get_or_set('plans:list', build, ttl=300, stale_ttl=60, tags=['catalog'])
+
+- L1 keeps up to CACHE_L1_MAX_ENTRIES values per process, evicting the
+  least recently used, each for at most CACHE_L1_TTL seconds. Hot keys skip
+  the L2 round trip and unpickling. Values are shared between callers and
+  must not be mutated.
+- L2 is the `default` cache (CACHE_URL: Redis in production; filecache://
+  or dbcache:// work as local stand-ins). Entries carry their own freshness
+  deadline and are kept `stale_ttl` seconds past it.
+- Single flight: on a miss, one thread per process recomputes the key and,
+  through cache.add() on a lock key, one process across workers. The others
+  wait up to CACHE_LOCK_TIMEOUT seconds for its result before computing it
+  themselves.
+- Stale-while-revalidate: an entry past its TTL but within `stale_ttl` is
+  returned as is while a background thread recomputes it.
+- Tags: an entry records the version of each of its tags when it is
+  computed. invalidate_tags() gives the tags new versions in L2, so older
+  entries become misses everywhere, and drops them from this process's L1;
+  other processes' L1 copies age out within CACHE_L1_TTL.
+  invalidate_on_change() ties tags to a model's post_save / post_delete.
+- Values are computed from the primary database (db_router.primary_reads):
+  a lagging replica's rows would otherwise be cached for the whole TTL,
+  right after the invalidation that was meant to drop them.
+- stats(): hits per tier, stale hits, misses and recomputes of this process.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+
+from .db_router import primary_reads
+
+logger = logging.getLogger(__name__)
+
+LOCK_STRIPES = 64
+LOCK_POLL_SECONDS = 0.02
+
+
+class TwoTierCache:
+
+    def __init__(self, alias='default', prefix='tt'):
+        self.alias = alias
+        self.prefix = prefix
+        self._l1 = OrderedDict()  # key -> (value, expires_at, tags)
+        self._l1_lock = threading.Lock()
+        # Keys hash onto a fixed set of locks: threads recomputing one key queue on the same lock
+        self._key_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._refreshing = set()
+        self._counters = dict.fromkeys(('l1_hits', 'l2_hits', 'stale_hits', 'misses', 'recomputes'), 0)
+        self._counters_lock = threading.Lock()
+
+    @property
+    def l2(self):
+        return caches[self.alias]
+
+    def _key(self, kind, name):
+        return f'{self.prefix}:{kind}:{name}'
+
+    def _count(self, name):
+        with self._counters_lock:
+            self._counters[name] += 1
+
+    # L1
+
+    def _l1_get(self, key, now):
+        with self._l1_lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return entry
+
+    def _l1_set(self, key, value, fresh_until, tags):
+        expires_at = min(fresh_until, time.time() + settings.CACHE_L1_TTL)
+        with self._l1_lock:
+            self._l1[key] = (value, expires_at, frozenset(tags))
+            self._l1.move_to_end(key)
+            while len(self._l1) > settings.CACHE_L1_MAX_ENTRIES:
+                self._l1.popitem(last=False)
+
+    # L2
+
+    def _l2_get(self, key, tags):
+        """The (value, fresh_until) stored for `key`, None if missing or written under an older tag version"""
+        tag_keys = [self._key('tag', tag) for tag in tags]
+        found = self.l2.get_many([self._key('v', key), *tag_keys])
+        envelope = found.get(self._key('v', key))
+        if envelope is None:
+            return None
+        value, fresh_until, versions = envelope
+        if any(versions.get(tag) != found.get(tag_key) for tag, tag_key in zip(tags, tag_keys)):
+            return None
+        return value, fresh_until
+
+    def _tag_versions(self, tags):
+        if not tags:
+            return {}
+        tag_keys = {tag: self._key('tag', tag) for tag in tags}
+        found = self.l2.get_many(list(tag_keys.values()))
+        versions = {}
+        for tag, tag_key in tag_keys.items():
+            version = found.get(tag_key)
+            if version is None:
+                # First use, or the version was evicted: a fresh one never matches older entries
+                self.l2.add(tag_key, uuid.uuid4().hex, timeout=None)
+                version = self.l2.get(tag_key)
+            versions[tag] = version
+        return versions
+
+    # Reads
+
+    def get(self, key, tags=()):
+        """Fresh cached value of `key`, or None; never computes"""
+        tags = tuple(tags)
+        now = time.time()
+        entry = self._l1_get(key, now)
+        if entry is not None:
+            self._count('l1_hits')
+            return entry[0]
+        stored = self._l2_get(key, tags)
+        if stored is None or now >= stored[1]:
+            return None
+        self._count('l2_hits')
+        self._l1_set(key, stored[0], stored[1], tags)
+        return stored[0]
+
+    def get_or_set(self, key, compute, ttl, stale_ttl=0, tags=()):
+        """Cached value of `key`, computing it with `compute()` (once across workers) on a miss"""
+        tags = tuple(tags)
+        now = time.time()
+        entry = self._l1_get(key, now)
+        if entry is not None:
+            self._count('l1_hits')
+            return entry[0]
+
+        stored = self._l2_get(key, tags)
+        if stored is not None:
+            value, fresh_until = stored
+            if now < fresh_until:
+                self._count('l2_hits')
+                self._l1_set(key, value, fresh_until, tags)
+                return value
+            self._count('stale_hits')
+            self._refresh_in_background(key, compute, ttl, stale_ttl, tags)
+            return value
+
+        self._count('misses')
+        return self._single_flight(key, compute, ttl, stale_ttl, tags)
+
+    def _single_flight(self, key, compute, ttl, stale_ttl, tags):
+        with self._key_locks[hash(key) % LOCK_STRIPES]:
+            # A thread ahead of us in this process may have just computed it
+            entry = self._l1_get(key, time.time())
+            if entry is not None:
+                return entry[0]
+
+            lock_key = self._key('lock', key)
+            if self.l2.add(lock_key, 1, timeout=settings.CACHE_LOCK_TIMEOUT):
+                try:
+                    return self._recompute(key, compute, ttl, stale_ttl, tags)
+                finally:
+                    self.l2.delete(lock_key)
+
+            # Another worker holds the lock: wait for its value
+            deadline = time.time() + settings.CACHE_LOCK_TIMEOUT
+            while time.time() < deadline:
+                time.sleep(LOCK_POLL_SECONDS)
+                stored = self._l2_get(key, tags)
+                if stored is not None and time.time() < stored[1]:
+                    self._l1_set(key, stored[0], stored[1], tags)
+                    return stored[0]
+            logger.warning(f"Gave up waiting for another worker to compute cache key {key}")
+            return self._recompute(key, compute, ttl, stale_ttl, tags)
+
+    def _recompute(self, key, compute, ttl, stale_ttl, tags):
+        # Versions are read before computing: an invalidation while we compute makes the result stale
+        versions = self._tag_versions(tags)
+        with primary_reads():
+            value = compute()
+        fresh_until = time.time() + ttl
+        self.l2.set(self._key('v', key), (value, fresh_until, versions), timeout=ttl + stale_ttl)
+        self._l1_set(key, value, fresh_until, tags)
+        self._count('recomputes')
+        return value
+
+    def _refresh_in_background(self, key, compute, ttl, stale_ttl, tags):
+        with self._l1_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            lock_key = self._key('lock', key)
+            try:
+                if self.l2.add(lock_key, 1, timeout=settings.CACHE_LOCK_TIMEOUT):
+                    try:
+                        self._recompute(key, compute, ttl, stale_ttl, tags)
+                    finally:
+                        self.l2.delete(lock_key)
+            except Exception:
+                logger.exception(f"Background refresh of cache key {key} failed")
+            finally:
+                with self._l1_lock:
+                    self._refreshing.discard(key)
+                # Database connections are per thread; this one ends here
+                connections.close_all()
+
+        threading.Thread(target=refresh, name=f'cache-refresh:{key}', daemon=True).start()
+
+    # Invalidation
+
+    def invalidate(self, key):
+        self.l2.delete(self._key('v', key))
+        with self._l1_lock:
+            self._l1.pop(key, None)
+
+    def invalidate_tags(self, *tags):
+        if not tags:
+            return
+        self.l2.set_many({self._key('tag', tag): uuid.uuid4().hex for tag in tags}, timeout=None)
+        dropped = set(tags)
+        with self._l1_lock:
+            for key in [key for key, entry in self._l1.items() if entry[2] & dropped]:
+                del self._l1[key]
+
+    def clear_local(self):
+        """Empty this process's L1 and reset its stats (L2 is left alone)"""
+        with self._l1_lock:
+            self._l1.clear()
+        with self._counters_lock:
+            self._counters = dict.fromkeys(self._counters, 0)
+
+    def stats(self):
+        with self._counters_lock:
+            counters = dict(self._counters)
+        hits = counters['l1_hits'] + counters['l2_hits'] + counters['stale_hits']
+        lookups = hits + counters['misses']
+        with self._l1_lock:
+            l1_entries = len(self._l1)
+        return {
+            **counters,
+            'l1_entries': l1_entries,
+            'hit_rate': round(hits / lookups, 4) if lookups else None,
+            'l1_hit_rate': round(counters['l1_hits'] / lookups, 4) if lookups else None,
+        }
+
+
+two_tier_cache = TwoTierCache()
+
+
+def invalidate_on_change(model, *tags):
+    """
+    Invalidate `tags` whenever an instance of `model` is saved or deleted.
+    A tag may be a callable taking the instance, for per-object tags.
+
+    Tags are bumped right away, so the rest of the writing transaction reads
+    its own changes, and again after commit, dropping anything another
+    request cached from the old rows in between.
+    """
+    def changed(sender, instance, using, **kwargs):
+        names = [tag(instance) if callable(tag) else tag for tag in tags]
+        two_tier_cache.invalidate_tags(*names)
+        transaction.on_commit(lambda: two_tier_cache.invalidate_tags(*names), using=using)
+
+    uid = f'two_tier_cache:{model._meta.label}'
+    post_save.connect(changed, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(changed, sender=model, weak=False, dispatch_uid=uid)
@@ -0,0 +1,186 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+PrimaryReplicaRouter sends reads to a healthy replica only while serving a
+safe (GET/HEAD/OPTIONS) request that is not pinned; everything else, and all
+code outside requests (management commands, background threads), uses the
+primary. A request is pinned to the primary when
+
+- it is not a safe method, or it has already written in this request,
+- it carries the pin set after a recent write (REPLICA_STICKY_SECONDS): the
+  `db_pin` cookie for same-site clients, or the `X-DB-Pin` header, which
+  the SPA on another origin copies from the write's response (frontend
+  src/api.js),
+- its JWT access token was issued within the sticky window (fresh logins).
+
+Replicas are probed at most every REPLICA_CHECK_INTERVAL seconds per process
+and skipped while unreachable or lagging more than REPLICA_MAX_LAG_SECONDS.
+"""
+import base64
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+PIN_COOKIE_NAME = 'db_pin'
+PIN_HEADER = 'X-DB-Pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# True unless the current request is allowed to read from replicas
+_use_primary = ContextVar('use_primary', default=True)
+_wrote = ContextVar('wrote', default=False)
+
+# Seconds behind the primary; 0 when the replica has replayed everything it received
+POSTGRES_LAG_SQL = (
+    'SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+
+
+class ReplicaMonitor:
+    """Per-process view of which replicas may serve reads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._healthy = []
+        self._status = {}  # alias -> {'healthy': bool, 'lag': float | None, 'error': str | None}
+        self._checked_at = None
+
+    def healthy_replicas(self):
+        interval = settings.REPLICA_CHECK_INTERVAL
+        if self._checked_at is None or time.monotonic() - self._checked_at >= interval:
+            # One thread probes; the others keep using the previous result meanwhile
+            if self._lock.acquire(blocking=self._checked_at is None):
+                try:
+                    self.check()
+                finally:
+                    self._lock.release()
+        return self._healthy
+
+    def check(self):
+        status = {}
+        for alias in settings.REPLICA_DATABASES:
+            try:
+                lag = replica_lag(alias)
+                healthy = lag <= settings.REPLICA_MAX_LAG_SECONDS
+                status[alias] = {'healthy': healthy, 'lag': lag, 'error': None}
+                if not healthy:
+                    logger.warning(f"Replica {alias} is {lag:.1f}s behind, reading from the primary")
+            except Exception as e:
+                status[alias] = {'healthy': False, 'lag': None, 'error': str(e)}
+                logger.warning(f"Replica {alias} is unavailable: {e}")
+                connections[alias].close()
+        self._status = status
+        self._healthy = [alias for alias, state in status.items() if state['healthy']]
+        self._checked_at = time.monotonic()
+        return status
+
+    def status(self):
+        return dict(self._status)
+
+    def reset(self):
+        self._healthy, self._status, self._checked_at = [], {}, None
+
+
+def replica_lag(alias):
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(POSTGRES_LAG_SQL)
+            return float(cursor.fetchone()[0])
+        cursor.execute('SELECT 1')  # No replication to measure, only reachability
+        return 0.0
+
+
+replica_monitor = ReplicaMonitor()
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, e.g. to build values that outlive the request"""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_primary.get() or not settings.REPLICA_DATABASES:
+            return PRIMARY
+        replicas = replica_monitor.healthy_replicas()
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # Whatever this request reads from now on must see its own writes
+        _wrote.set(True)
+        _use_primary.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def _token_issued_at(request):
+    """`iat` of the bearer token, read without verification (it can only force the primary)"""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not header.startswith('Bearer '):
+        return None
+    try:
+        payload = header[len('Bearer '):].split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['iat'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def request_is_pinned(request, now=None):
+    if request.method not in SAFE_METHODS:
+        return True
+    now = now or time.time()
+    for pinned_until in (request.COOKIES.get(PIN_COOKIE_NAME), request.headers.get(PIN_HEADER)):
+        try:
+            if pinned_until and float(pinned_until) > now:
+                return True
+        except ValueError:
+            pass
+    issued_at = _token_issued_at(request)
+    return issued_at is not None and now - issued_at < settings.REPLICA_STICKY_SECONDS
+
+
+class ReplicaPinningMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        primary_token = _use_primary.set(request_is_pinned(request))
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and response.status_code < 400 and settings.REPLICA_DATABASES:
+                # Keep this client on the primary until replicas have caught up with the write
+                sticky = settings.REPLICA_STICKY_SECONDS
+                pinned_until = str(int(time.time() + sticky))
+                response.set_cookie(
+                    PIN_COOKIE_NAME, pinned_until, max_age=sticky,
+                    httponly=True, secure=settings.SESSION_COOKIE_SECURE, samesite='Lax',
+                )
+                # Cross-origin clients can't rely on the cookie coming back; they send this header instead
+                response[PIN_HEADER] = pinned_until
+            return response
+        finally:
+            _use_primary.reset(primary_token)
+            _wrote.reset(wrote_token)
@@ -0,0 +1,162 @@
+import functools
+import io
+
+from django.core.management.color import no_style
+from django.db import connections, router
+
+
+def bulk_update_from_values(model, rows, fields, key='pk', using=None, batch_size=1000, only_if_newer=False):
+    """
+    Write per-row values in one statement per batch:
+
+        WITH v(key, f1, f2) AS (VALUES (...), (...))
+        UPDATE table SET f1 = v.f1, f2 = v.f2 FROM v WHERE table.key = v.key
+
+    `rows` is an iterable of tuples `(key_value, f1_value, f2_value, ...)`.
+    Unlike `QuerySet.bulk_update()` this builds no CASE expression per row, so
+    its cost stays linear in the batch size. Works on PostgreSQL and on
+    SQLite >= 3.33 (UPDATE ... FROM). Returns the number of rows updated.
+
+    With `only_if_newer`, rows whose stored values are already >= the new
+    ones (NULL counts as older) are left alone, so concurrent writers of
+    timestamps or counters never move a value backwards or rewrite it.
+    """
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    opts = model._meta
+    key_field = opts.pk if key == 'pk' else opts.get_field(key)
+    columns = [key_field] + [opts.get_field(name) for name in fields]
+    qn = connection.ops.quote_name
+
+    if connection.vendor == 'postgresql':
+        # VALUES has no column types; without casts a NULL-only column would be text
+        placeholders = [f'CAST(%s AS {field.db_type(connection)})' for field in columns]
+    else:
+        placeholders = ['%s'] * len(columns)
+    row_sql = '(' + ', '.join(placeholders) + ')'
+
+    table = qn(opts.db_table)
+    cte_columns = ', '.join(qn(field.column) for field in columns)
+    assignments = ', '.join(f'{qn(field.column)} = v.{qn(field.column)}' for field in columns[1:])
+    key_column = qn(key_field.column)
+    where = f'{table}.{key_column} = v.{key_column}'
+    if only_if_newer:
+        where += ''.join(
+            f' AND ({table}.{qn(field.column)} IS NULL OR {table}.{qn(field.column)} < v.{qn(field.column)})'
+            for field in columns[1:]
+        )
+
+    rows = list(rows)
+    updated = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = []
+            for row in batch:
+                params.extend(
+                    field.get_db_prep_save(value, connection)
+                    for field, value in zip(columns, row)
+                )
+            sql = (
+                f'WITH v ({cte_columns}) AS (VALUES {", ".join([row_sql] * len(batch))}) '
+                f'UPDATE {table} SET {assignments} FROM v WHERE {where}'
+            )
+            cursor.execute(sql, params)
+            rowcount = cursor.rowcount
+            if rowcount < 0 and connection.vendor == 'sqlite':
+                # Python's sqlite3 reports -1 for statements starting with WITH
+                cursor.execute('SELECT changes()')
+                rowcount = cursor.fetchone()[0]
+            updated += rowcount
+    return updated
+
+
+# Field types whose Python values the database drivers take as they are
+PASSTHROUGH_TYPES = {
+    'AutoField', 'BigAutoField', 'BigIntegerField', 'BooleanField', 'CharField', 'EmailField',
+    'ForeignKey', 'IntegerField', 'OneToOneField', 'PositiveIntegerField', 'SmallIntegerField', 'TextField',
+}
+
+
+def _prep_save(field, connection, value):
+    return field.get_db_prep_save(value, connection)
+
+
+def _copy_csv_field(value):
+    # COPY csv reads only an unquoted empty field as NULL: quoting every value
+    # keeps client-supplied strings ('', '\N', ...) from ever turning into NULL
+    if value is None:
+        return ''
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def bulk_insert_rows(model, fields, rows, using=None, batch_size=10000, table=None):
+    """
+    Insert plain tuples into `model`'s table, one value per name in `fields`
+    (column attnames such as `user_id`), without building model instances:
+    COPY ... FROM STDIN on PostgreSQL, batched executemany() elsewhere.
+    No save(), no signals, no defaults: every NOT NULL column must be listed.
+    `table` writes to another table with the same columns (a partition).
+    Returns the number of rows inserted.
+    """
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    opts = model._meta
+    columns = [opts.get_field(name) for name in fields]
+    qn = connection.ops.quote_name
+    table = qn(table or opts.db_table)
+    column_sql = ', '.join(qn(field.column) for field in columns)
+
+    # Adapting every value through its field dominates the insert time; most
+    # columns need no adapting and generated timestamps repeat a lot
+    converters = []
+    for field in columns:
+        internal_type = field.get_internal_type()
+        if internal_type in PASSTHROUGH_TYPES:
+            converters.append(None)
+        elif internal_type in ('DateField', 'DateTimeField'):
+            converters.append(functools.lru_cache(maxsize=4096)(functools.partial(_prep_save, field, connection)))
+        else:
+            converters.append(functools.partial(_prep_save, field, connection))
+
+    inserted = 0
+    batch = []
+    with connection.cursor() as cursor:
+        def write():
+            if connection.vendor == 'postgresql':
+                buffer = io.StringIO()
+                for row in batch:
+                    buffer.write(','.join(_copy_csv_field(value) for value in row))
+                    buffer.write('\n')
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {table} ({column_sql}) FROM STDIN WITH (FORMAT csv)", buffer)
+            else:
+                placeholders = ', '.join(['%s'] * len(columns))
+                if any(converters):
+                    params = [
+                        [value if convert is None else convert(value) for convert, value in zip(converters, row)]
+                        for row in batch
+                    ]
+                else:
+                    params = batch
+                cursor.executemany(f'INSERT INTO {table} ({column_sql}) VALUES ({placeholders})', params)
+
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                write()
+                inserted += len(batch)
+                batch = []
+        if batch:
+            write()
+            inserted += len(batch)
+    return inserted
+
+
+def reset_sequences(models, using='default'):
+    """Move PostgreSQL id sequences past explicitly inserted primary keys (no-op elsewhere)"""
+    connection = connections[using]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
@@ -0,0 +1,310 @@
+"""
+Change notifications pushed to clients as server-sent events (SSE).
+
+    GET /api/events/    Authorization: Bearer <access token> (optional)
+    GET /api/events/?token=<stream token>
+
+A browser's EventSource can't send an Authorization header, so signed in
+browsers first POST /api/events-token/ (with their access token) for a
+stream token and pass it in the query string. It is signed, names only the
+user, and opens streams for EVENTS_TOKEN_MAX_AGE seconds, which limits what
+a copy in a proxy log is good for. An EventSource that gets a 401 stops
+reconnecting; the client then fetches a new token (frontend
+src/utils/events.js).
+
+Instead of polling the plan list and their profile, clients refetch when
+told something changed:
+
+- `catalog`: a plan, feature or plan feature was saved or deleted,
+- `tier`: the signed in user's tier was set; the event carries the tier.
+
+Every event carries the version of its channel, one more per change,
+counted in the default cache (so shared by workers when it is Redis). A
+stream opens with a `snapshot` event holding the current versions: a
+client that reconnects compares them with the last ones it saw instead of
+replaying what it missed. A stream that falls EVENTS_QUEUE_SIZE events
+behind gets `resync`, meaning refetch everything.
+
+Each worker keeps one Broadcaster indexing its open streams by channel. An
+idle stream is a suspended coroutine and a small queue, so a worker holds
+thousands of them; a comment line every EVENTS_HEARTBEAT_SECONDS keeps
+proxies from closing them. publish() hands events to EVENTS_BACKEND, which
+delivers them to the broadcaster of every worker:
+
+- LocalBackend: this process only (development, a single worker),
+- RedisBackend: Redis pub/sub on EVENTS_REDIS_URL, with one listener
+  thread per worker.
+
+Streams need the ASGI app (backend.asgi under uvicorn workers). Under WSGI
+each one would hold a worker thread for good, so the view answers 501. In
+the docker deployments the `events` service (`entrypoint.sh events`,
+gunicorn.events.conf.py) serves them, and nginx routes /api/events/ to it.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from django.views.decorators.http import require_GET
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CHANNEL = 'catalog'
+STREAM_TOKEN_SALT = 'backend.events.stream'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def _version_key(channel):
+    return f'events:version:{channel}'
+
+
+def next_version(channel):
+    cache = caches['default']
+    try:
+        return cache.incr(_version_key(channel))
+    except ValueError:
+        # First change on this channel, or its counter was evicted
+        cache.add(_version_key(channel), 0, timeout=None)
+        return cache.incr(_version_key(channel))
+
+
+def current_versions(channels):
+    found = caches['default'].get_many([_version_key(channel) for channel in channels])
+    return {channel: found.get(_version_key(channel), 0) for channel in channels}
+
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    def __init__(self, channels, loop):
+        self.channels = frozenset(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+
+    def put(self, event):
+        # Runs on the stream's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind for the individual events to matter: the client refetches everything
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'resync'})
+
+
+def _put_all(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.put(event)
+
+
+class Broadcaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # channel -> set of Subscription
+
+    def subscribe(self, channels):
+        """Register a stream of the running event loop for `channels`"""
+        subscription = Subscription(channels, asyncio.get_running_loop())
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[channel]
+
+    def deliver(self, channel, event):
+        """Queue `event` on every stream of this process listening on `channel`. Safe from any thread."""
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        # One wakeup per event loop, not one per stream
+        by_loop = {}
+        for subscription in subscribers:
+            by_loop.setdefault(subscription.loop, []).append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_put_all, subscriptions, event)
+            except RuntimeError:
+                # The loop has closed; its streams are gone
+                for subscription in subscriptions:
+                    self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def connection_count(self):
+        with self._lock:
+            return len(set().union(*self._subscriptions.values()))
+
+
+broadcaster = Broadcaster()
+
+
+class LocalBackend:
+    """Delivers to the streams of this process only"""
+
+    def __init__(self, broadcaster):
+        self.broadcaster = broadcaster
+
+    def start(self):
+        pass
+
+    def publish(self, channel, event):
+        self.broadcaster.deliver(channel, event)
+
+
+class RedisBackend:
+    """Delivers to every worker through Redis pub/sub"""
+
+    prefix = 'events:'
+
+    def __init__(self, broadcaster):
+        import redis
+
+        self.broadcaster = broadcaster
+        self.client = redis.Redis.from_url(settings.EVENTS_REDIS_URL)
+        self._lock = threading.Lock()
+        self._listener_pid = None
+
+    def start(self):
+        # Started lazily so each forked worker runs its own listener (threads don't survive fork)
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+        threading.Thread(target=self._listen, name='events-listener', daemon=True).start()
+
+    def publish(self, channel, event):
+        self.client.publish(self.prefix + channel, json.dumps(event))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.prefix + '*')
+                for message in pubsub.listen():
+                    channel = message['channel'].decode().removeprefix(self.prefix)
+                    self.broadcaster.deliver(channel, json.loads(message['data']))
+            except Exception:
+                logger.exception("Event listener lost its Redis connection, reconnecting")
+                time.sleep(1)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.EVENTS_BACKEND)(broadcaster)
+    return _backend
+
+
+def publish(channel, event_type, **data):
+    """
+    Send an event to every stream listening on `channel`, with the channel's
+    next version. Call it once the change has committed.
+    """
+    event = {'type': event_type, 'channel': channel, 'version': next_version(channel), **data}
+    try:
+        get_backend().publish(channel, event)
+    except Exception:
+        # Best effort: the change itself stands, clients catch up from the next snapshot
+        logger.exception(f"Failed to publish {event_type} event on {channel}")
+    return event
+
+
+async def _stream(user):
+    channels = [CATALOG_CHANNEL] + ([user_channel(user.pk)] if user is not None else [])
+    get_backend().start()
+    # Subscribed before reading the versions, so no change falls between the snapshot and the stream
+    subscription = broadcaster.subscribe(channels)
+    try:
+        snapshot = {'type': 'snapshot', 'versions': await sync_to_async(current_versions)(channels)}
+        if user is not None:
+            snapshot['tier'] = user.tier
+        yield format_event(snapshot)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(event)
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+def stream_token(user):
+    return signing.TimestampSigner(salt=STREAM_TOKEN_SALT).sign(str(user.pk))
+
+
+def user_for_stream_token(token):
+    """The active user `token` was issued to; raises AuthenticationFailed"""
+    try:
+        user_id = signing.TimestampSigner(salt=STREAM_TOKEN_SALT).unsign(token, max_age=settings.EVENTS_TOKEN_MAX_AGE)
+        return get_user_model().objects.get(pk=user_id, is_active=True)
+    except (signing.BadSignature, ObjectDoesNotExist, ValueError):
+        raise AuthenticationFailed('Invalid or expired stream token')
+
+
+class StreamTokenView(APIView):
+    """A stream token for the signed in user, for clients that can't send headers with the stream request"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        return Response({'token': stream_token(request.user), 'expires_in': settings.EVENTS_TOKEN_MAX_AGE})
+
+
+def _authenticate(request):
+    if 'token' in request.GET:
+        return user_for_stream_token(request.GET['token'])
+    authenticated = JWTAuthentication().authenticate(request)
+    return authenticated[0] if authenticated else None
+
+
+@require_GET
+async def event_stream(request):
+    """Catalog changes for everyone, plus tier changes for the signed in user"""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Event streams are only served by the ASGI app'}, status=501)
+    try:
+        user = await sync_to_async(_authenticate)(request)
+    except AuthenticationFailed:
+        return JsonResponse({'error': 'Invalid or expired token'}, status=401)
+
+    response = StreamingHttpResponse(_stream(user), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx would otherwise hold events in its buffer
+    return response
@@ -0,0 +1,79 @@
+"""
+Browser-only middleware, skipped on API routes.
+
+The API authenticates with JWTs inside DRF views, so sessions, CSRF
+checks, the session-backed request.user and messages only matter to the
+admin. BrowserMiddleware takes the place of the BROWSER_MIDDLEWARE list in
+MIDDLEWARE:
+
+- requests under FAST_PATH_PREFIXES (/api/, /health/) go straight on to
+  the rest of the stack: no session lookup, CSRF cookie or messages storage,
+- every other request runs through those middleware exactly as if they were
+  listed in its place.
+
+Django only calls process_view, process_exception and
+process_template_response on classes listed in MIDDLEWARE, so
+BrowserMiddleware forwards these hooks to the wrapped middleware, in the
+order Django would call them. Django's admin checks look for the session,
+auth and messages middleware in MIDDLEWARE by class, so settings silences
+them (admin.E408 - E410).
+"""
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+
+
+def is_fast_path(request):
+    return request.path_info.startswith(tuple(settings.FAST_PATH_PREFIXES))
+
+
+class BrowserMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Built like Django's own chain: innermost first, each layer's exceptions turned into responses
+        handler = get_response
+        middleware = []
+        for path in reversed(settings.BROWSER_MIDDLEWARE):
+            try:
+                instance = import_string(path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            handler = convert_exception_to_response(instance)
+            middleware.insert(0, instance)
+        self.browser_handler = handler
+        self.view_hooks = [m.process_view for m in middleware if hasattr(m, 'process_view')]
+        self.template_response_hooks = [
+            m.process_template_response for m in reversed(middleware) if hasattr(m, 'process_template_response')
+        ]
+        self.exception_hooks = [m.process_exception for m in reversed(middleware) if hasattr(m, 'process_exception')]
+
+    def __call__(self, request):
+        if is_fast_path(request):
+            return self.get_response(request)
+        return self.browser_handler(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if is_fast_path(request):
+            return None
+        for hook in self.view_hooks:
+            response = hook(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        if is_fast_path(request):
+            return response
+        for hook in self.template_response_hooks:
+            response = hook(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        if is_fast_path(request):
+            return None
+        for hook in self.exception_hooks:
+            response = hook(request, exception)
+            if response is not None:
+                return response
+        return None
@@ -0,0 +1,161 @@
+"""
+N+1 query detection for development and tests.
+
+QueryShapeRecorder watches every statement run on this thread's database
+connections and groups them by shape: the SQL with literals and IN lists
+normalized away. A shape executed NPLUSONE_THRESHOLD times or more within
+one request (or one `detect_n_plus_one()` block) is reported together with
+the project code that issued it, which is almost always a related object or
+queryset looked up per item of a list.
+
+NPLUSONE_ACTION decides what happens to a report: `log` a warning, `warn`
+(NPlusOneWarning, which tests can turn into errors) or `raise` NPlusOneError.
+Known cases are skipped with NPLUSONE_WHITELIST, regular expressions
+searched in the normalized SQL and in the `path:function` of the calling
+frames (e.g. r'subscriptions/serializers\\.py:get_features').
+
+The middleware only exists when NPLUSONE_ENABLED is set (DEBUG by default).
+"""
+import logging
+import re
+import traceback
+import warnings
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = str(Path(settings.BASE_DIR).resolve())
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+class NPlusOneWarning(UserWarning):
+    pass
+
+
+def normalize_sql(sql):
+    """Shape of a statement: the same for every execution of one ORM query, whatever its parameters"""
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def project_stack():
+    """Calling frames inside this project (no Django, no site-packages, not this module), innermost last"""
+    frames = []
+    for frame in traceback.extract_stack()[:-2]:
+        if not frame.filename.startswith(PROJECT_ROOT) or 'site-packages' in frame.filename:
+            continue
+        if frame.filename == __file__:
+            continue
+        frames.append(frame)
+    return frames
+
+
+def _location(frame):
+    return f"{Path(frame.filename).relative_to(PROJECT_ROOT).as_posix()}:{frame.name}"
+
+
+@dataclass
+class Offender:
+    sql: str
+    count: int
+    stack: list = field(default_factory=list)  # traceback.FrameSummary, innermost last
+
+    def format(self, frames=4):
+        lines = [f"{self.count}x {self.sql}"]
+        lines += [f"    {_location(frame)} line {frame.lineno}: {frame.line}" for frame in self.stack[-frames:]]
+        return '\n'.join(lines)
+
+
+class QueryShapeRecorder:
+    def __init__(self):
+        self.counts = Counter()
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = normalize_sql(sql)
+        self.counts[shape] += 1
+        if self.counts[shape] == 2:
+            # The first repeat is the one a loop issued; the first execution may come from elsewhere
+            self.stacks[shape] = project_stack()
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def recording(self):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    def offenders(self, threshold=None, whitelist=None):
+        threshold = threshold or settings.NPLUSONE_THRESHOLD
+        patterns = [re.compile(pattern) for pattern in (
+            settings.NPLUSONE_WHITELIST if whitelist is None else whitelist
+        )]
+        found = []
+        for shape, count in self.counts.most_common():
+            if count < threshold:
+                break
+            stack = self.stacks.get(shape, [])
+            subjects = [shape, *(_location(frame) for frame in stack)]
+            if any(pattern.search(subject) for pattern in patterns for subject in subjects):
+                continue
+            found.append(Offender(shape, count, stack))
+        return found
+
+
+def report(offenders, label, action=None):
+    if not offenders:
+        return
+    action = action or settings.NPLUSONE_ACTION
+    message = f"Possible N+1 queries in {label}:\n" + '\n'.join(offender.format() for offender in offenders)
+    if action == 'raise':
+        raise NPlusOneError(message)
+    if action == 'warn':
+        warnings.warn(message, NPlusOneWarning, stacklevel=3)
+    else:
+        logger.warning(message)
+
+
+@contextmanager
+def detect_n_plus_one(label='block', threshold=None, whitelist=None, action='raise'):
+    """
+    Test helper: report repeated query shapes run inside the block, raising
+    NPlusOneError by default.
+
+        with detect_n_plus_one('plan list'):
+            self.client.get('/api/subscriptions/plans/')
+    """
+    recorder = QueryShapeRecorder()
+    with recorder.recording():
+        yield recorder
+    report(recorder.offenders(threshold, whitelist), label, action)
+
+
+class NPlusOneMiddleware:
+    def __init__(self, get_response):
+        if not settings.NPLUSONE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryShapeRecorder()
+        with recorder.recording():
+            response = self.get_response(request)
+        report(recorder.offenders(), f"{request.method} {request.path}")
+        return response
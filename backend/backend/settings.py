@@ -14,6 +14,7 @@ from pathlib import Path
 import environ
 import os
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -57,24 +58,39 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'api_auth',
     'health_check',
-    'subscriptions'
+    'subscriptions',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
+    'backend.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'backend.admission.AdmissionControlMiddleware',
+    'backend.db_router.ReplicaPinningMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'backend.fast_path.BrowserMiddleware',  # Runs BROWSER_MIDDLEWARE, except under FAST_PATH_PREFIXES
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'health_check.profiler.ProfilingMiddleware',
+]
+# Only the admin (and other browser pages) use sessions, CSRF and messages; JWT requests skip them
+BROWSER_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+FAST_PATH_PREFIXES = ['/api/', '/health/']
+# The admin checks look for BROWSER_MIDDLEWARE in MIDDLEWARE itself
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
 
 AUTH_USER_MODEL = 'api_auth.User'
 
 ROOT_URLCONF = 'backend.urls'
 
+# Drops buffered activity and audit writes before the test databases go away
+TEST_RUNNER = 'backend.test_runner.BufferDrainingTestRunner'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -97,16 +113,61 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': ENV('DATABASE_NAME'),
-        'USER': ENV('DATABASE_USER'),
-        'PASSWORD': ENV('DATABASE_PASSWORD'),
-        'HOST': ENV('DATABASE_HOST', default='localhost'),
-        'PORT': ENV('DATABASE_PORT', default=5432),
+# Set DATABASE_ENGINE=sqlite3 to run fully offline (e.g. tests and benchmarks without PostgreSQL)
+DATABASE_ENGINE = ENV('DATABASE_ENGINE', default='postgresql')
+
+if DATABASE_ENGINE == 'sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ENV('DATABASE_NAME', default=os.path.join(BASE_DIR, 'db.sqlite3')),
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': ENV('DATABASE_NAME'),
+            'USER': ENV('DATABASE_USER'),
+            'PASSWORD': ENV('DATABASE_PASSWORD'),
+            'HOST': ENV('DATABASE_HOST', default='localhost'),
+            'PORT': ENV('DATABASE_PORT', default=5432),
+        }
+    }
+
+# Read replicas: comma separated hosts (PostgreSQL, same credentials as the primary)
+# or database files (SQLite, for trying the routing locally). Aliases: replica1, replica2, ...
+REPLICA_DATABASES = []
+for index, replica in enumerate(filter(None, ENV('DATABASE_REPLICAS', default='').split(',')), start=1):
+    alias = f'replica{index}'
+    if DATABASE_ENGINE == 'sqlite3':
+        DATABASES[alias] = {**DATABASES['default'], 'NAME': replica}
+    else:
+        DATABASES[alias] = {**DATABASES['default'], 'HOST': replica, 'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['backend.db_router.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = ENV.int('REPLICA_STICKY_SECONDS', default=15)  # Primary-only window after a write
+REPLICA_MAX_LAG_SECONDS = ENV.float('REPLICA_MAX_LAG_SECONDS', default=5.0)
+REPLICA_CHECK_INTERVAL = ENV.int('REPLICA_CHECK_INTERVAL', default=10)  # Seconds between health probes
+
+
+# Caches
+# CACHE_URL: redis://host:6379/0 in production; filecache:///path or dbcache://table as local stand-ins
+CACHES = {
+    'default': ENV.cache_url('CACHE_URL', default='locmemcache://'),
 }
+# Two-tier cache (backend.caching): in-process L1 in front of the default cache
+CACHE_L1_MAX_ENTRIES = ENV.int('CACHE_L1_MAX_ENTRIES', default=1000)
+CACHE_L1_TTL = ENV.int('CACHE_L1_TTL', default=5)  # seconds; bounds how long other workers serve invalidated values
+CACHE_LOCK_TIMEOUT = ENV.int('CACHE_LOCK_TIMEOUT', default=10)  # Longest wait for another worker's recompute, seconds
+
+# Server-sent change notifications (backend.events), streamed by the ASGI app
+EVENTS_BACKEND = ENV.str('EVENTS_BACKEND', default='backend.events.LocalBackend')  # RedisBackend across workers
+EVENTS_REDIS_URL = ENV.str('EVENTS_REDIS_URL', default='redis://localhost:6379/0')
+EVENTS_HEARTBEAT_SECONDS = ENV.int('EVENTS_HEARTBEAT_SECONDS', default=25)  # Below proxy idle timeouts
+EVENTS_QUEUE_SIZE = ENV.int('EVENTS_QUEUE_SIZE', default=16)  # Undelivered events per stream before a resync
+EVENTS_TOKEN_MAX_AGE = ENV.int('EVENTS_TOKEN_MAX_AGE', default=60)  # Seconds a stream token can open streams
 
 
 # Password validation
@@ -131,12 +192,18 @@ AUTH_PASSWORD_VALIDATORS = [
 # Rest Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api_auth.authentication.ActivityJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
+BULK_MAX_BATCH_SIZE = ENV.int('BULK_MAX_BATCH_SIZE', default=1000)  # Items per request on the bulk/ routes (backend.bulk)
+# POST /api/batch/ (backend.batch): API calls run in-process behind one authentication
+BATCH_MAX_REQUESTS = ENV.int('BATCH_MAX_REQUESTS', default=20)  # Sub-requests per batch
+BATCH_MAX_CONCURRENCY = ENV.int('BATCH_MAX_CONCURRENCY', default=4)  # Threads per worker running batched GETs
+# Routes a batch may call; login, registration and webhooks keep their own requests
+BATCH_ALLOWED_PREFIXES = ['/api/auth/profile/', '/api/auth/test/', '/api/auth/test-protected/', '/api/subscriptions/plans/']
 
 
 # Simple JWT settings
@@ -145,16 +212,85 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=3),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': False,
+    # Logins are recorded through api_auth.activity's batched writes instead of UPDATE_LAST_LOGIN
+    'TOKEN_OBTAIN_SERIALIZER': 'api_auth.serializers.ActivityTokenObtainPairSerializer',
+    # Tokens carry the user's tier for admission control (re-read from the database on refresh)
+    'TOKEN_REFRESH_SERIALIZER': 'api_auth.serializers.TieredTokenRefreshSerializer',
+}
+# Repeated refreshes of one refresh token within this many seconds return the same new pair (0 disables)
+TOKEN_REFRESH_GRACE_SECONDS = ENV.int('TOKEN_REFRESH_GRACE_SECONDS', default=30)
+
+# Coalesced last-login / last-seen writes (api_auth.activity)
+LAST_SEEN_GRANULARITY = ENV.int('LAST_SEEN_GRANULARITY', default=300)  # seconds
+ACTIVITY_FLUSH_INTERVAL = ENV.int('ACTIVITY_FLUSH_INTERVAL', default=30)  # seconds
+ACTIVITY_BUFFER_MAX = ENV.int('ACTIVITY_BUFFER_MAX', default=5000)  # users per column before an early flush
+
+# Authentication audit trail (api_auth.audit), buffered per worker and written in batches
+AUDIT_FLUSH_INTERVAL = ENV.int('AUDIT_FLUSH_INTERVAL', default=5)  # seconds
+AUDIT_BUFFER_MAX = ENV.int('AUDIT_BUFFER_MAX', default=1000)  # events before an early flush
+AUDIT_RETENTION_MONTHS = ENV.int('AUDIT_RETENTION_MONTHS', default=13)  # Months kept, the current one included
+
+# Admission control (backend.admission): under overload, shed anonymous and free requests first
+ADMISSION_CONTROL_ENABLED = ENV.bool('ADMISSION_CONTROL_ENABLED', default=True)
+ADMISSION_WORKER_THREADS = ENV.int('ADMISSION_WORKER_THREADS', default=4)  # Exported by the gunicorn config
+# Share of the worker's threads a class may occupy; classes not listed (premium) are never shed.
+# With 4 threads anonymous requests get 3 and free ones all 4, so normal load is never shed by these.
+ADMISSION_MAX_IN_FLIGHT = {
+    'anonymous': ENV.float('ADMISSION_ANONYMOUS_SHARE', default=0.75),
+    'free': ENV.float('ADMISSION_FREE_SHARE', default=1.0),
+    'basic': ENV.float('ADMISSION_BASIC_SHARE', default=1.0),
+}
+# Longest wait in the proxy / socket queue (X-Request-Start) before a class is shed
+ADMISSION_MAX_QUEUE_MS = {
+    'anonymous': ENV.int('ADMISSION_ANONYMOUS_MAX_QUEUE_MS', default=500),
+    'free': ENV.int('ADMISSION_FREE_MAX_QUEUE_MS', default=1000),
+    'basic': ENV.int('ADMISSION_BASIC_MAX_QUEUE_MS', default=3000),
 }
+ADMISSION_EXEMPT_PATHS = [
+    '/health/', '/admin/', '/static/', '/api/subscriptions/webhooks/',
+    '/api/auth/token/', '/api/auth/register/', '/api/auth/google/',
+    '/api/auth/verify-email/', '/api/auth/resend-verification/',
+]
+ADMISSION_RETRY_AFTER = ENV.int('ADMISSION_RETRY_AFTER', default=5)  # seconds
+
+# N+1 query detection (backend.nplusone): report query shapes repeated within one request
+NPLUSONE_ENABLED = ENV.bool('NPLUSONE_ENABLED', default=DEBUG)
+NPLUSONE_THRESHOLD = ENV.int('NPLUSONE_THRESHOLD', default=5)  # Executions of one shape before it is reported
+NPLUSONE_ACTION = ENV('NPLUSONE_ACTION', default='log')  # log, warn or raise
+NPLUSONE_WHITELIST = ENV.list('NPLUSONE_WHITELIST', default=[])  # Regexes on the SQL or `path:function` of callers
 
 
 # LOG_FILE_PATH = os.path.join(BASE_DIR, ENV('LOG_FILE_FOLDER'), ENV('LOG_FILE_NAME'))
 from .server_startup import init_log_path
-LOG_FILE_PATH = init_log_path()
+LOG_FILE_PATH = init_log_path(ENV('LOG_FILE_FOLDER'), ENV('LOG_FILE_NAME'))  # Timed by profile_startup
+
+# Admin changelists (backend.admin_utils): above this many rows, show PostgreSQL's estimate instead of COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = ENV.int('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100_000)
+
+# On-demand sampling profiler (health_check.profiler), staff only
+PROFILER_DIR = os.path.join(ENV('LOG_FILE_FOLDER'), 'profiles')
+PROFILER_HEADER = 'X-Profile'  # Request header that profiles that one request
+PROFILER_INTERVAL = ENV.float('PROFILER_INTERVAL', default=0.002)  # Seconds between samples
+PROFILER_MAX_SECONDS = ENV.int('PROFILER_MAX_SECONDS', default=30)  # Longest /health/profile/ run
+PROFILER_COOLDOWN = ENV.int('PROFILER_COOLDOWN', default=60)  # Seconds between two profiles
+PROFILER_TOP_N = ENV.int('PROFILER_TOP_N', default=30)
+
+
+def skip_shed_requests(record):
+    # Shedding is counted in admission_controller.stats(); an error log line per
+    # rejected request (backend.admission) would only add load while overloaded
+    return not getattr(getattr(record, 'request', None), 'admission_shed', False)
+
 
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'skip_shed_requests': {
+            '()': 'django.utils.log.CallbackFilter',
+            'callback': skip_shed_requests,
+        },
+    },
     'formatters': {
         'console': {
             'format': '%(levelname)-5s %(filename)s:%(lineno)-12s %(message)s',
@@ -192,6 +328,7 @@ LOGGING = {
         'django.request': {
             'handlers': ['console', 'file'],
             'level': 'INFO',
+            'filters': ['skip_shed_requests'],
             'propagate': False,
         },
         'django.template': {
@@ -221,6 +358,15 @@ STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 #STATICFILES_DIRS = []  # Only needed if you have project-level static files
 
+# Content-hashed file names with .gz/.br siblings, written once at collectstatic time
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'backend.static.CompressedManifestStaticFilesStorage'},
+}
+
+# Let Django serve STATIC_ROOT (with immutable caching) when nginx isn't in front of it
+SERVE_STATIC = ENV.bool('SERVE_STATIC', default=False)
+
 
 # MEDIA_URL = 'media/'
 # MEDIA_ROOT = os.path.join(BASE_DIR, 'mediafiles')
@@ -234,9 +380,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # CORS_ALLOWS_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = ENV('CORS_ALLOWED_ORIGINS', default='http://localhost:3000,http://localhost:5173').split(',')
 CORS_ALLOW_CREDENTIALS = True
+# The SPA reads the replica pin from write responses and sends it back (backend.db_router)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-db-pin')
+CORS_EXPOSE_HEADERS = ['X-DB-Pin']
 
 # SSL setting
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
+# Proxies in front of the app that append to X-Forwarded-For (nginx); client addresses are read behind them
+TRUSTED_PROXY_HOPS = ENV.int('TRUSTED_PROXY_HOPS', default=1)
 SECURE_SSL_REDIRECT = not DEBUG
 SESSION_COOKIE_SECURE = not DEBUG
 CSRF_COOKIE_SECURE = not DEBUG
@@ -254,6 +405,25 @@ else:
 
 DEFAULT_FROM_EMAIL = ENV('DEFAULT_FROM_EMAIL', default='Recipe App <noreply@example.com>')
 FRONTEND_URL = ENV('FRONTEND_URL', default='http://localhost:5173')  # Frontend URL for redirects
+# `table` (EmailVerification rows) or `signed` (stateless HMAC tokens, see api_auth.verification)
+EMAIL_VERIFICATION_MODE = ENV('EMAIL_VERIFICATION_MODE', default='table')
+EMAIL_VERIFICATION_MAX_AGE = ENV.int('EMAIL_VERIFICATION_MAX_AGE', default=2 * 24 * 3600)  # Signed tokens, seconds
+PROFILE_CACHE_TTL = ENV.int('PROFILE_CACHE_TTL', default=300)  # Cached profile payloads, seconds
+
+# Subscription settings
+# Max age (seconds) of the in-process entitlement index before it is rebuilt from the catalog
+ENTITLEMENT_INDEX_TTL = ENV.int('ENTITLEMENT_INDEX_TTL', default=300)
+# Cached plan list and plan responses; served stale for CATALOG_CACHE_STALE_TTL more seconds while refreshed
+CATALOG_CACHE_TTL = ENV.int('CATALOG_CACHE_TTL', default=300)
+CATALOG_CACHE_STALE_TTL = ENV.int('CATALOG_CACHE_STALE_TTL', default=60)
+
+# Payment webhooks
+PAYMENT_WEBHOOK_SECRETS = {
+    'stripe': ENV('STRIPE_WEBHOOK_SECRET', default=''),
+    'paypal': ENV('PAYPAL_WEBHOOK_SECRET', default=''),
+}
+PAYMENT_WEBHOOK_TOLERANCE = ENV.int('PAYMENT_WEBHOOK_TOLERANCE', default=300)  # Max signature age in seconds
+PAYMENT_PAST_DUE_GRACE_DAYS = ENV.int('PAYMENT_PAST_DUE_GRACE_DAYS', default=7)
 
 # Template directory
 TEMPLATES[0]['DIRS'] = [os.path.join(BASE_DIR, 'templates')]
\ No newline at end of file
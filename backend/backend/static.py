@@ -0,0 +1,132 @@
+"""
+Static files: content-hashed, precompressed storage and a matching serve view.
+
+`collectstatic` with CompressedManifestStaticFilesStorage writes every file
+under its content-hashed name (app.3f2a9c.css) plus `.gz` and `.br` siblings,
+so nginx (`gzip_static`) or `serve` below can send them without compressing
+per request. Because a hashed name identifies its content, a sibling that
+already exists is up to date and is not compressed again; only changed files
+cost compression time on the next deploy.
+"""
+import gzip
+import logging
+import os
+import posixpath
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.views.static import serve as serve_file
+
+try:
+    import brotli
+except ImportError:  # Optional: only .gz siblings are written without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot',
+)
+MIN_COMPRESS_SIZE = 256  # Smaller files don't gain enough to pay for the extra header
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _gzip(data):
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+def available_encodings():
+    """(suffix, Content-Encoding, compressor) in order of preference"""
+    encodings = [('.gz', 'gzip', _gzip)]
+    if brotli is not None:
+        encodings.insert(0, ('.br', 'br', _brotli))
+    return encodings
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        if brotli is None:
+            logger.warning('brotli is not installed, writing .gz static files only')
+        for hashed_name in set(self.hashed_files.values()):
+            self.compress(hashed_name)
+
+    def compress(self, name):
+        """Write compressed siblings of `name`, returning the suffixes actually written"""
+        if not name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+            return []
+
+        path = self.path(name)
+        pending = [encoding for encoding in available_encodings() if not os.path.exists(path + encoding[0])]
+        if not pending:
+            return []
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return []
+
+        written = []
+        for suffix, _, compressor in pending:
+            compressed = compressor(data)
+            if len(compressed) >= len(data):
+                continue
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(suffix)
+        return written
+
+    def is_hashed(self, name):
+        return name in self._hashed_names
+
+    @property
+    def _hashed_names(self):
+        # hashed_files is replaced wholesale on collectstatic; cache the set per dict
+        if getattr(self, '_hashed_names_source', None) is not self.hashed_files:
+            self._hashed_names_source = self.hashed_files
+            self._hashed_names_cache = frozenset(self.hashed_files.values())
+        return self._hashed_names_cache
+
+
+def accepted_encodings(header):
+    """Content codings the client accepts, ignoring any given q=0"""
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+
+def serve(request, path):
+    """
+    Serve a collected static file when Django serves static itself
+    (SERVE_STATIC). Prefers a precompressed sibling the client accepts, and
+    marks content-hashed names immutable so browsers never revalidate them.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    document_root = staticfiles_storage.location
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+    response = None
+    for suffix, encoding, _ in available_encodings():
+        if encoding in accepted and os.path.isfile(os.path.join(document_root, path + suffix)):
+            # django.views.static.serve sets Content-Type from the original name and Content-Encoding from the suffix
+            response = serve_file(request, path + suffix, document_root=document_root)
+            break
+    if response is None:
+        response = serve_file(request, path, document_root=document_root)
+
+    response['Vary'] = 'Accept-Encoding'
+    is_hashed = getattr(staticfiles_storage, 'is_hashed', None)
+    if is_hashed is not None and is_hashed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,20 @@
+"""
+Test runner that empties the per-process write buffers before the test
+databases are destroyed.
+
+api_auth.activity and api_auth.audit buffer their writes and flush them at
+interpreter exit. By then the test database is gone and the settings name
+the real one again, so whatever the tests left buffered would be written
+there, or fail with `no such table`.
+"""
+from django.test.runner import DiscoverRunner
+
+
+class BufferDrainingTestRunner(DiscoverRunner):
+    def teardown_databases(self, old_config, **kwargs):
+        from api_auth.activity import activity_buffer
+        from api_auth.audit import audit_log
+
+        activity_buffer.discard()
+        audit_log.discard()
+        super().teardown_databases(old_config, **kwargs)
@@ -0,0 +1,725 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api_auth.authentication import ActivityJWTAuthentication
+from api_auth.models import EmailVerification, Profile, TestModel
+from backend import admin_utils, admission, batch, db_router
+from backend.admin_utils import EstimatedCountPaginator
+from backend.caching import TwoTierCache, two_tier_cache
+from backend.db_utils import _copy_csv_field
+from backend.events import Broadcaster, broadcaster, current_versions, publish, user_channel
+from backend.admission import AdmissionController, AdmissionControlMiddleware, queue_ms, request_class
+from backend.nplusone import NPlusOneError, NPlusOneMiddleware, detect_n_plus_one, normalize_sql
+from backend.fast_path import BrowserMiddleware
+from backend.db_router import PIN_COOKIE_NAME, PIN_HEADER, PrimaryReplicaRouter, replica_monitor, request_is_pinned
+from backend.static import IMMUTABLE_CACHE_CONTROL, accepted_encodings, brotli, serve
+from subscriptions.models import Feature, PlanFeature, SubscriptionPlan
+
+STATIC_NAME = 'admin/css/base.css'
+
+
+class StaticStorageTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root)
+        cls.enterClassContext(override_settings(STATIC_ROOT=cls.static_root))
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def hashed_path(self):
+        return staticfiles_storage.path(staticfiles_storage.stored_name(STATIC_NAME))
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        hashed_name = staticfiles_storage.stored_name(STATIC_NAME)
+        self.assertNotEqual(hashed_name, STATIC_NAME)
+        self.assertTrue(os.path.exists(self.hashed_path() + '.gz'))
+        if brotli is not None:
+            self.assertTrue(os.path.exists(self.hashed_path() + '.br'))
+
+    def test_unchanged_files_are_not_compressed_again(self):
+        compressed = self.hashed_path() + '.gz'
+        os.utime(compressed, ns=(0, 0))
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.assertEqual(os.stat(compressed).st_mtime_ns, 0)
+
+    def test_serve_prefers_compressed_sibling_and_marks_hashed_names_immutable(self):
+        hashed_name = staticfiles_storage.stored_name(STATIC_NAME)
+        request = RequestFactory().get(f'/static/{hashed_name}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        response = serve(request, hashed_name)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_serve_unhashed_name_must_revalidate(self):
+        response = serve(RequestFactory().get(f'/static/{STATIC_NAME}'), STATIC_NAME)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+    def test_accepted_encodings_ignores_q_zero(self):
+        self.assertEqual(accepted_encodings('gzip;q=0, br;q=0.8'), {'br'})
+
+
+@override_settings(REPLICA_DATABASES=['replica1'], REPLICA_STICKY_SECONDS=15)
+class ReplicaPinningTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_unsafe_methods_are_pinned(self):
+        self.assertTrue(request_is_pinned(self.factory.post('/api/auth/profile/')))
+        self.assertFalse(request_is_pinned(self.factory.get('/api/subscriptions/plans/')))
+
+    def test_pin_cookie_holds_until_expiry(self):
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE_NAME] = str(int(time.time()) + 10)
+        self.assertTrue(request_is_pinned(request))
+        request.COOKIES[PIN_COOKIE_NAME] = str(int(time.time()) - 1)
+        self.assertFalse(request_is_pinned(request))
+
+    def test_pin_header_holds_until_expiry(self):
+        self.assertTrue(request_is_pinned(self.factory.get('/', HTTP_X_DB_PIN=str(int(time.time()) + 10))))
+        self.assertFalse(request_is_pinned(self.factory.get('/', HTTP_X_DB_PIN=str(int(time.time()) - 1))))
+        self.assertFalse(request_is_pinned(self.factory.get('/', HTTP_X_DB_PIN='garbage')))
+
+    def test_fresh_access_token_is_pinned(self):
+        token = AccessToken()
+        token['user_id'] = 1
+        request = self.factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertTrue(request_is_pinned(request))
+        self.assertFalse(request_is_pinned(request, now=time.time() + 60))
+
+    def test_lagging_replica_is_skipped(self):
+        router = PrimaryReplicaRouter()
+        token = db_router._use_primary.set(False)
+        self.addCleanup(db_router._use_primary.reset, token)
+        self.addCleanup(replica_monitor.reset)
+
+        with mock.patch.object(db_router, 'replica_lag', return_value=0.5):
+            replica_monitor.reset()
+            self.assertEqual(router.db_for_read(SubscriptionPlan), 'replica1')
+        with mock.patch.object(db_router, 'replica_lag', return_value=60):
+            replica_monitor.reset()
+            self.assertEqual(router.db_for_read(SubscriptionPlan), 'default')
+
+    def test_outside_requests_reads_use_primary(self):
+        self.assertEqual(PrimaryReplicaRouter().db_for_read(SubscriptionPlan), 'default')
+
+
+@unittest.skipUnless(settings.REPLICA_DATABASES, 'set DATABASE_REPLICAS to run against a replica database')
+class ReplicaRoutingTests(TestCase):
+    """
+    With DATABASE_ENGINE=sqlite3 DATABASE_REPLICAS=/tmp/replica.sqlite3 the
+    replica is a separate database that never receives the primary's writes,
+    so which one served a read is visible in the response.
+    """
+    databases = {'default', *settings.REPLICA_DATABASES}
+
+    def setUp(self):
+        replica_monitor.reset()
+        two_tier_cache.clear_local()
+        TestModel.objects.create(display_name='Primary only')
+        SubscriptionPlan.objects.create(name='Primary only', tier='basic', billing_cycle='monthly',
+                                        price=Decimal('5'))
+
+    def test_safe_reads_go_to_replica(self):
+        response = self.client.get('/api/auth/test/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    def test_pinned_reads_see_own_writes(self):
+        self.client.cookies[PIN_COOKIE_NAME] = str(int(time.time()) + 10)
+        response = self.client.get('/api/auth/test/')
+        self.assertEqual([row['display_name'] for row in response.json()], ['Primary only'])
+
+    def test_cache_entries_are_built_on_the_primary(self):
+        # Unpinned, yet the cached catalog doesn't come from the replica that missed the write
+        response = self.client.get('/api/subscriptions/plans/')
+        self.assertEqual([plan['name'] for plan in response.json()['basic']], ['Primary only'])
+        self.assertEqual(self.client.get('/api/auth/test/').json(), [])
+
+    def test_write_sets_pin_cookie(self):
+        response = self.client.post('/api/auth/resend-verification/', {'email': 'nobody@example.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)  # Nothing was written
+
+        response = self.client.post('/api/auth/register/', {
+            'email': 'pinned@example.com', 'password': 'a-Long-passw0rd', 'profile': {},
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+
+    def test_pin_header_round_trip(self):
+        # Like the SPA on another origin: no cookies, the pin comes back in a header
+        self.client.cookies.clear()
+        response = self.client.post('/api/auth/register/', {
+            'email': 'header@example.com', 'password': 'a-Long-passw0rd', 'profile': {},
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        pinned_until = response[PIN_HEADER]
+
+        self.client.cookies.clear()
+        response = self.client.get('/api/auth/test/', HTTP_X_DB_PIN=pinned_until)
+        self.assertEqual([row['display_name'] for row in response.json()], ['Primary only'])
+
+
+@override_settings(
+    ADMISSION_CONTROL_ENABLED=True,
+    ADMISSION_WORKER_THREADS=4,
+    ADMISSION_MAX_IN_FLIGHT={'anonymous': 0.5, 'free': 0.75},
+    ADMISSION_MAX_QUEUE_MS={'anonymous': 500, 'free': 1000},
+    ADMISSION_EXEMPT_PATHS=['/health/', '/api/auth/token/'],
+)
+class AdmissionControlTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def bearer(self, tier):
+        token = AccessToken()
+        token['user_id'] = 1
+        token['tier'] = tier
+        return {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def test_request_class(self):
+        self.assertEqual(request_class(self.factory.get('/health/')), 'exempt')
+        self.assertEqual(request_class(self.factory.get('/api/auth/profile/')), 'anonymous')
+        self.assertEqual(request_class(self.factory.get('/api/auth/profile/', **self.bearer('premium'))), 'premium')
+        forged = {'HTTP_AUTHORIZATION': 'Bearer ' + str(AccessToken())[:-4] + 'AAAA'}
+        self.assertEqual(request_class(self.factory.get('/api/auth/profile/', **forged)), 'anonymous')
+
+    def test_lower_tiers_are_shed_first(self):
+        controller = AdmissionController()
+        for _ in range(2):
+            self.assertTrue(controller.try_admit('premium'))
+        self.assertFalse(controller.try_admit('anonymous'))  # 2 of 4 threads busy
+        self.assertTrue(controller.try_admit('free'))
+        self.assertFalse(controller.try_admit('free'))  # 3 of 4 threads busy
+        self.assertTrue(controller.try_admit('premium'))
+        self.assertTrue(controller.try_admit('exempt'))
+        self.assertEqual(controller.stats()['shed'], {'anonymous': 1, 'free': 1})
+
+    def test_reservations_are_all_or_none(self):
+        controller = AdmissionController()
+        self.assertTrue(controller.try_admit('free'))
+        self.assertFalse(controller.try_reserve('free', 3))  # 4 of 3 allowed
+        self.assertTrue(controller.try_reserve('free', 2))
+        self.assertTrue(controller.try_reserve('premium', 5))
+        controller.release(7)
+        self.assertEqual(controller.in_flight, 1)
+        self.assertEqual(controller.stats()['shed'], {})
+
+    def test_queue_age_sheds_by_class(self):
+        controller = AdmissionController()
+        self.assertFalse(controller.try_admit('free', waited_ms=1500))
+        self.assertTrue(controller.try_admit('premium', waited_ms=1500))
+        request = self.factory.get('/', HTTP_X_REQUEST_START=f't={time.time() - 2:.3f}')
+        self.assertAlmostEqual(queue_ms(request), 2000, delta=100)
+
+    def test_middleware_rejects_with_retry_after(self):
+        middleware = AdmissionControlMiddleware(lambda request: HttpResponse('ok'))
+        stale = {'HTTP_X_REQUEST_START': f't={time.time() - 5:.3f}'}
+
+        response = middleware(self.factory.get('/api/subscriptions/plans/', **stale, **self.bearer('free')))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(settings.ADMISSION_RETRY_AFTER))
+
+        response = middleware(self.factory.get('/api/subscriptions/plans/', **stale, **self.bearer('premium')))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(middleware(self.factory.get('/health/', **stale)).status_code, 200)
+
+    def test_shed_requests_are_not_logged_as_errors(self):
+        stale = {'HTTP_X_REQUEST_START': f't={time.time() - 5:.3f}'}
+        with self.assertNoLogs('django.request', level='ERROR'):
+            response = self.client.get('/api/subscriptions/plans/', **stale)
+        self.assertEqual(response.status_code, 503)
+
+
+class CopyFormatTests(SimpleTestCase):
+
+    def test_only_none_is_written_as_null(self):
+        self.assertEqual(_copy_csv_field(None), '')
+        self.assertEqual(_copy_csv_field(''), '""')
+        self.assertEqual(_copy_csv_field('\\N'), '"\\N"')
+        self.assertEqual(_copy_csv_field('say "hi", bye'), '"say ""hi"", bye"')
+        self.assertEqual(_copy_csv_field(42), '"42"')
+
+
+@override_settings(NPLUSONE_THRESHOLD=3, NPLUSONE_WHITELIST=[])
+class NPlusOneDetectionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        feature = Feature.objects.create(name='Exports')
+        for tier in ('free', 'basic', 'premium'):
+            plan = SubscriptionPlan.objects.create(name=tier, tier=tier, billing_cycle='monthly', price=Decimal(1))
+            PlanFeature.objects.create(plan=plan, feature=feature)
+
+    def list_feature_names(self):
+        return [[pf.feature.name for pf in plan.plan_features.all()] for plan in SubscriptionPlan.objects.all()]
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x'  LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?',
+        )
+
+    def test_repeated_shapes_raise_with_calling_code(self):
+        with self.assertRaises(NPlusOneError) as raised:
+            with detect_n_plus_one('plans'):
+                self.list_feature_names()
+        self.assertIn('3x SELECT', str(raised.exception))
+        self.assertIn('backend/tests.py:list_feature_names', str(raised.exception))
+
+        with detect_n_plus_one('plans'):
+            list(SubscriptionPlan.objects.prefetch_related('plan_features__feature'))
+
+    def test_whitelist(self):
+        with detect_n_plus_one('plans', whitelist=[r'tests\.py:list_feature_names']):
+            self.list_feature_names()
+
+    @override_settings(NPLUSONE_ENABLED=True, NPLUSONE_ACTION='log')
+    def test_middleware_logs_offenders(self):
+        middleware = NPlusOneMiddleware(lambda request: HttpResponse(str(self.list_feature_names())))
+        with self.assertLogs('backend.nplusone', 'WARNING') as logs:
+            middleware(RequestFactory().get('/api/subscriptions/plans/'))
+        self.assertIn('Possible N+1 queries in GET /api/subscriptions/plans/', logs.output[0])
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    # Admin pages link static files; the manifest only exists after collectstatic
+    STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}},
+)
+class LargeTableAdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create_superuser(email='admin@example.com', password='pw')
+        for n in range(5):
+            user = User.objects.create_user(email=f'member{n}@example.com', password='pw')
+            Profile.objects.create(user=user, display_name=f'Member {n}')
+            EmailVerification.objects.create(user=user)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_query_count_does_not_grow_with_rows(self):
+        for n, url in enumerate(('/admin/api_auth/profile/', '/admin/api_auth/emailverification/')):
+            before = self.changelist_queries(url)
+            user = get_user_model().objects.create_user(email=f'late{n}@example.com', password='pw')
+            Profile.objects.create(user=user, display_name='Late')
+            EmailVerification.objects.create(user=user)
+            self.assertEqual(self.changelist_queries(url), before, url)
+
+    def test_search_falls_back_to_prefix_without_trigram_indexes(self):
+        response = self.client.get('/admin/api_auth/user/', {'q': 'member1'}, secure=True)
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get('/admin/api_auth/user/', {'q': 'ember1'}, secure=True)
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1000)
+    def test_paginator_uses_estimate_only_for_large_results(self):
+        queryset = get_user_model().objects.order_by('pk')
+        self.assertIsNone(admin_utils.estimated_count(queryset))  # Not PostgreSQL
+        self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 6)
+
+        with mock.patch.object(admin_utils, 'estimated_count', return_value=2_500_000):
+            self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 2_500_000)
+        with mock.patch.object(admin_utils, 'estimated_count', return_value=20):
+            self.assertEqual(EstimatedCountPaginator(queryset, 10).count, 6)
+
+
+@override_settings(CACHE_L1_MAX_ENTRIES=2, CACHE_L1_TTL=60, CACHE_LOCK_TIMEOUT=2)
+class TwoTierCacheTests(TestCase):
+
+    def setUp(self):
+        self.cache = TwoTierCache(prefix=f'test{time.monotonic_ns()}')
+        self.calls = 0
+
+    def compute(self, value='v', delay=0):
+        def build():
+            self.calls += 1
+            time.sleep(delay)
+            return f'{value}{self.calls}'
+        return build
+
+    def test_tiers_eviction_and_stats(self):
+        self.assertEqual(self.cache.get_or_set('a', self.compute(), ttl=60), 'v1')
+        self.assertEqual(self.cache.get_or_set('a', self.compute(), ttl=60), 'v1')  # L1
+        self.cache.get_or_set('b', self.compute(), ttl=60)
+        self.cache.get_or_set('c', self.compute(), ttl=60)  # Evicts a, the least recently used
+        self.assertEqual(self.cache.get_or_set('a', self.compute(), ttl=60), 'v1')  # From L2
+        self.assertEqual(self.calls, 3)
+
+        stats = self.cache.stats()
+        self.assertEqual((stats['l1_hits'], stats['l2_hits'], stats['misses']), (1, 1, 3))
+        self.assertEqual(stats['hit_rate'], 0.4)
+        self.assertEqual(stats['l1_entries'], 2)
+
+    def test_tag_invalidation_reaches_other_processes_through_l2(self):
+        other = TwoTierCache(prefix=self.cache.prefix)  # Another worker: own L1, same L2
+        self.cache.get_or_set('plans', self.compute(), ttl=60, tags=['catalog'])
+        self.assertEqual(other.get_or_set('plans', self.compute(), ttl=60, tags=['catalog']), 'v1')
+
+        other.invalidate_tags('catalog')
+        self.assertEqual(other.get_or_set('plans', self.compute(), ttl=60, tags=['catalog']), 'v2')
+        self.cache.clear_local()  # Its L1 copy would otherwise live out CACHE_L1_TTL
+        self.assertEqual(self.cache.get_or_set('plans', self.compute(), ttl=60, tags=['catalog']), 'v2')
+
+    @override_settings(CACHE_L1_TTL=0)
+    def test_stale_value_is_served_while_one_refresh_runs(self):
+        self.cache.get_or_set('k', self.compute(), ttl=0.05, stale_ttl=60)
+        time.sleep(0.06)
+        self.assertEqual(self.cache.get_or_set('k', self.compute(delay=0.1), ttl=60, stale_ttl=60), 'v1')
+        self.assertEqual(self.cache.get_or_set('k', self.compute(delay=0.1), ttl=60, stale_ttl=60), 'v1')
+        deadline = time.monotonic() + 2
+        while self.cache.get_or_set('k', self.compute(), ttl=60) != 'v2' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.calls, 2)
+        self.assertGreaterEqual(self.cache.stats()['stale_hits'], 2)
+
+    def test_single_flight(self):
+        workers = [TwoTierCache(prefix=self.cache.prefix) for _ in range(2)]
+        barrier = threading.Barrier(8)
+        results = []
+
+        def read(worker):
+            barrier.wait()
+            results.append(worker.get_or_set('slow', self.compute(delay=0.1), ttl=60))
+
+        threads = [threading.Thread(target=read, args=(workers[n % 2],)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['v1'] * 8)
+
+    def test_model_changes_invalidate_cached_responses(self):
+        two_tier_cache.clear_local()
+        self.assertEqual(self.client.get('/api/subscriptions/plans/').json(), {})
+        plan = SubscriptionPlan.objects.create(name='Basic', tier='basic', billing_cycle='monthly', price=1)
+        self.assertEqual([p['name'] for p in self.client.get('/api/subscriptions/plans/').json()['basic']], ['Basic'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/subscriptions/plans/{plan.pk}/')
+        self.assertEqual((response.json()['name'], len(queries)), ('Basic', 0))
+        self.assertEqual(self.client.get(f'/api/subscriptions/plans/{plan.pk + 1}/').status_code, 404)
+
+        user = get_user_model().objects.create_user(email='cached@example.com', password='pw')
+        Profile.objects.create(user=user, display_name='Before')
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+        self.assertEqual(self.client.get('/api/auth/profile/', **headers).json()['profile']['display_name'], 'Before')
+        self.client.patch('/api/auth/profile/', {'display_name': 'After'}, content_type='application/json', **headers)
+        self.assertEqual(self.client.get('/api/auth/profile/', **headers).json()['profile']['display_name'], 'After')
+
+
+class BrowserMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.seen = []
+        self.middleware = BrowserMiddleware(lambda request: self.seen.append(request) or HttpResponse())
+
+    def test_api_and_health_requests_skip_sessions_and_messages(self):
+        for path in ('/api/subscriptions/plans/', '/health/'):
+            request = RequestFactory().get(path)
+            self.middleware(request)
+            self.assertFalse(hasattr(request, 'session'))
+            self.assertFalse(hasattr(request, 'user'))
+            self.assertFalse(hasattr(request, '_messages'))
+
+        request = RequestFactory().get('/admin/')
+        self.middleware(request)
+        self.assertTrue(hasattr(request, 'session'))
+        self.assertFalse(request.user.is_authenticated)
+        self.assertTrue(hasattr(request, '_messages'))
+
+    def test_csrf_is_enforced_outside_the_fast_path_only(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        response = client.post('/admin/login/', {'username': 'x', 'password': 'y'})
+        self.assertEqual(response.status_code, 403)
+
+        response = client.post('/api/auth/test/', {'display_name': 'no csrf'})
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('csrftoken', response.cookies)
+        self.assertNotIn('sessionid', response.cookies)
+
+    @override_settings(STORAGES={**settings.STORAGES, 'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    }})
+    def test_admin_keeps_session_login(self):
+        staff = get_user_model().objects.create_superuser(email='admin@example.com', password='pw')
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/admin/').status_code, 200)
+
+
+class EventStreamTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='streamer@example.com', password='pw')
+
+    async def test_broadcaster_fans_out_by_channel(self):
+        broadcaster = Broadcaster()
+        everyone = broadcaster.subscribe(['catalog'])
+        mine = broadcaster.subscribe(['catalog', 'user:1'])
+
+        self.assertEqual(broadcaster.deliver('catalog', {'type': 'catalog'}), 2)
+        self.assertEqual(broadcaster.deliver('user:1', {'type': 'tier'}), 1)
+        await asyncio.sleep(0)
+        self.assertEqual([everyone.queue.get_nowait()['type']], ['catalog'])
+        self.assertEqual([mine.queue.get_nowait()['type'], mine.queue.get_nowait()['type']], ['catalog', 'tier'])
+
+        broadcaster.unsubscribe(everyone)
+        broadcaster.unsubscribe(mine)
+        self.assertEqual(broadcaster.connection_count(), 0)
+        self.assertEqual(broadcaster.deliver('catalog', {'type': 'catalog'}), 0)
+
+    async def test_stream_that_falls_behind_is_told_to_resync(self):
+        with override_settings(EVENTS_QUEUE_SIZE=2):
+            broadcaster = Broadcaster()
+            subscription = broadcaster.subscribe(['catalog'])
+        for version in range(1, 4):
+            broadcaster.deliver('catalog', {'type': 'catalog', 'version': version})
+        await asyncio.sleep(0)
+        self.assertEqual(subscription.queue.qsize(), 1)
+        self.assertEqual(subscription.queue.get_nowait(), {'type': 'resync'})
+
+    async def test_stream_sends_a_snapshot_then_changes(self):
+        token = AccessToken.for_user(self.user)
+        response = await self.async_client.get('/api/events/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        content = response.streaming_content
+        snapshot = (await anext(content)).decode()
+        self.assertTrue(snapshot.startswith('event: snapshot\n'))
+        self.assertIn('"tier":"free"', snapshot)
+        self.assertEqual(broadcaster.connection_count(), 1)
+
+        await sync_to_async(publish)(user_channel(self.user.pk), 'tier', tier='premium')
+        change = (await anext(content)).decode()
+        self.assertTrue(change.startswith('event: tier\n'))
+        self.assertIn('"tier":"premium"', change)
+
+        # The server cancels the response when the client disconnects
+        waiting = asyncio.ensure_future(anext(content))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(broadcaster.connection_count(), 0)
+
+    async def test_invalid_token_is_rejected(self):
+        response = await self.async_client.get('/api/events/', headers={'Authorization': 'Bearer nope'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_token_in_the_query_string(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        response = await sync_to_async(client.post)('/api/events-token/')
+        self.assertEqual(response.status_code, 200)
+        token = response.json()['token']
+
+        response = await self.async_client.get('/api/events/', {'token': token})
+        self.assertEqual(response.status_code, 200)
+        content = response.streaming_content
+        self.assertIn('"tier":"free"', (await anext(content)).decode())
+        waiting = asyncio.ensure_future(anext(content))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(broadcaster.connection_count(), 0)
+
+        response = await self.async_client.get('/api/events/', {'token': token + 'x'})
+        self.assertEqual(response.status_code, 401)
+        with override_settings(EVENTS_TOKEN_MAX_AGE=-1):
+            response = await self.async_client.get('/api/events/', {'token': token})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual((await sync_to_async(self.client.post)('/api/events-token/')).status_code, 401)
+
+    def test_wsgi_requests_are_refused(self):
+        self.assertEqual(self.client.get('/api/events/').status_code, 501)
+
+    def test_catalog_change_publishes_after_commit(self):
+        before = current_versions(['catalog'])['catalog']
+        with self.captureOnCommitCallbacks(execute=True):
+            SubscriptionPlan.objects.create(name='Streamed', tier='basic', billing_cycle='monthly', price=Decimal(1))
+            self.assertEqual(current_versions(['catalog'])['catalog'], before)
+        self.assertEqual(current_versions(['catalog'])['catalog'], before + 1)
+
+    def test_tier_change_publishes_to_the_user(self):
+        channel = user_channel(self.user.pk)
+        before = current_versions([channel])[channel]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['last_seen'])
+        self.assertEqual(current_versions([channel])[channel], before)
+
+        self.user.tier = 'basic'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['tier'])
+        self.assertEqual(current_versions([channel])[channel], before + 1)
+
+        # Full saves that leave the tier alone (admin edits, password changes) send nothing
+        user = get_user_model().objects.get(pk=self.user.pk)
+        user.set_password('changed')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+            user.tier = 'premium'
+            user.save()
+            user.save()
+        self.assertEqual(current_versions([channel])[channel], before + 2)
+
+
+class BatchRequestTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='batched@example.com', password='pw')
+        Profile.objects.create(user=self.user)
+        self.plan = SubscriptionPlan.objects.create(name='Batched', tier='basic', billing_cycle='monthly', price=Decimal(1))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def batch(self, *requests, **extra):
+        return self.client.post('/api/batch/', {'requests': list(requests), **extra}, format='json')
+
+    def test_sub_requests_share_one_authentication(self):
+        authenticate = ActivityJWTAuthentication.authenticate
+        with mock.patch.object(ActivityJWTAuthentication, 'authenticate', autospec=True,
+                               side_effect=authenticate) as authenticated:
+            response = self.batch(
+                {'method': 'GET', 'path': '/api/auth/profile/'},
+                {'method': 'GET', 'path': f'/api/subscriptions/plans/{self.plan.pk}/'},
+            )
+        self.assertEqual(response.status_code, 200)
+        profile, plan = response.json()['responses']
+        self.assertEqual(profile['status'], 200)
+        self.assertEqual(profile['body']['email'], 'batched@example.com')
+        self.assertIn('ETag', profile['headers'])
+        self.assertEqual((plan['status'], plan['body']['name']), (200, 'Batched'))
+        self.assertEqual(authenticated.call_count, 1)
+
+    def test_each_sub_request_has_its_own_status(self):
+        etag = self.client.get('/api/auth/profile/')['ETag']
+        response = self.batch(
+            {'method': 'GET', 'path': '/api/auth/profile/', 'headers': {'If-None-Match': etag}},
+            {'method': 'GET', 'path': '/api/subscriptions/plans/999999/'},
+            {'method': 'POST', 'path': '/api/auth/test/', 'body': {'test_count': 'many'}},
+            {'method': 'POST', 'path': '/api/auth/test/', 'body': {'display_name': 'batched', 'test_count': 1}},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['status'] for item in response.json()['responses']], [304, 404, 400, 201])
+        self.assertTrue(TestModel.objects.filter(display_name='batched').exists())
+
+    def test_anonymous_batches_only_reach_public_routes(self):
+        self.client.credentials()
+        response = self.batch(
+            {'method': 'GET', 'path': '/api/auth/profile/'},
+            {'method': 'GET', 'path': '/api/subscriptions/plans/'},
+        )
+        self.assertEqual([item['status'] for item in response.json()['responses']], [401, 200])
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_batches_are_limited(self):
+        self.assertEqual(self.batch(*[{'method': 'GET', 'path': '/api/auth/profile/'}] * 3).status_code, 400)
+        for path in ('/api/batch/', '/api/auth/token/', '/api/subscriptions/webhooks/stripe/', '/admin/'):
+            self.assertEqual(self.batch({'method': 'POST', 'path': path}).status_code, 400, path)
+        response = self.batch({'method': 'GET', 'path': '/api/auth/profile/', 'headers': {'Authorization': 'x'}})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.batch().status_code, 400)
+
+
+class BatchConcurrencyTests(TransactionTestCase):
+
+    def test_consecutive_gets_run_in_the_pool_and_writes_keep_their_order(self):
+        user = get_user_model().objects.create_user(email='pooled@example.com', password='pw')
+        Profile.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        threads = []
+
+        def dispatch(request):
+            threads.append((request.method, threading.current_thread().name))
+            return dispatch_wrapped(request)
+
+        dispatch_wrapped = batch.dispatch
+        with mock.patch.object(batch, 'dispatch', dispatch):
+            response = client.post('/api/batch/', {'concurrent': True, 'requests': [
+                {'method': 'GET', 'path': '/api/auth/test/'},
+                {'method': 'GET', 'path': '/api/auth/profile/'},
+                {'method': 'POST', 'path': '/api/auth/test/', 'body': {'display_name': 'pooled', 'test_count': 1}},
+                {'method': 'GET', 'path': '/api/auth/test/'},
+            ]}, format='json')
+
+        responses = response.json()['responses']
+        self.assertEqual([item['status'] for item in responses], [200, 200, 201, 200])
+        self.assertEqual(responses[0]['body'], [])
+        self.assertEqual([row['display_name'] for row in responses[3]['body']], ['pooled'])
+        self.assertTrue(all(name.startswith('batch') for method, name in threads[:2]))
+        self.assertFalse(any(name.startswith('batch') for method, name in threads[2:]))
+
+    @override_settings(ADMISSION_CONTROL_ENABLED=True, ADMISSION_WORKER_THREADS=4,
+                       ADMISSION_MAX_IN_FLIGHT={'anonymous': 0.5, 'free': 1.0}, ADMISSION_MAX_QUEUE_MS={})
+    def test_concurrent_batches_are_admitted_as_a_unit(self):
+        user = get_user_model().objects.create_user(email='admitted@example.com', password='pw')
+        Profile.objects.create(user=user)
+        threads = []
+
+        def dispatch(request):
+            threads.append(threading.current_thread().name)
+            return dispatch_wrapped(request)
+
+        def post_batch(client):
+            return client.post('/api/batch/', {'concurrent': True, 'requests': [
+                {'method': 'GET', 'path': '/api/subscriptions/plans/'},
+            ] * 4}, format='json')
+
+        dispatch_wrapped = batch.dispatch
+        with mock.patch.object(batch, 'dispatch', dispatch), \
+                mock.patch.object(admission, 'admission_controller', AdmissionController()) as controller, \
+                mock.patch.object(batch, 'admission_controller', controller):
+            # Anonymous: 2 of 4 threads, no room for 3 more next to the batch, so the GETs run one by one
+            response = post_batch(APIClient())
+            self.assertEqual([item['status'] for item in response.json()['responses']], [200] * 4)
+            self.assertFalse(any(name.startswith('batch') for name in threads))
+
+            # Free: all 4 threads, so the batch and 3 pool threads run at once
+            threads.clear()
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+            response = post_batch(client)
+            self.assertEqual([item['status'] for item in response.json()['responses']], [200] * 4)
+            self.assertTrue(all(name.startswith('batch') for name in threads))
+
+        self.assertEqual(controller.in_flight, 0)
+        self.assertEqual(dict(controller.shed), {})
+        self.assertEqual(dict(controller.admitted), {'anonymous': 1, 'free': 1})
@@ -14,20 +14,28 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
-# from django.conf import settings
-# from django.conf.urls.static import static
+from django.urls import path, include, re_path
+
+from backend import batch, events, static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('api_auth.urls')),
     path('health/', include('health_check.urls')),
     path('api/subscriptions/', include('subscriptions.urls')),
+    path('api/events/', events.event_stream, name='event_stream'),
+    path('api/events-token/', events.StreamTokenView.as_view(), name='event_stream_token'),
+    path('api/batch/', batch.BatchView.as_view(), name='batch'),
 ] 
 
-# if bool(settings.DEBUG):
-#     urlpatterns +=  static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+if settings.SERVE_STATIC:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), static.serve),
+    ]
 
 # if bool(settings.DEBUG):
 #     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
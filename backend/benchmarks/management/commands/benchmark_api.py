@@ -0,0 +1,94 @@
+import json
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from benchmarks.runner import (
+    BUDGETS_PATH, budgets_from_results, check_budgets, load_budgets, run_suite,
+)
+from benchmarks.seed import seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every API route on seeded data at several scales and compare '
+        'latency and queries per request against the checked-in budgets. '
+        'Runs against a throwaway test database (SQLite or a local PostgreSQL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='100,1000,10000',
+                            help='Comma separated user counts to seed, one run per scale')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--scenarios', help='Comma separated scenario names (default: all)')
+        parser.add_argument('--budgets', default=str(BUDGETS_PATH))
+        parser.add_argument('--latency-tolerance', type=float, default=1.0,
+                            help='Multiplier applied to p95 budgets (e.g. 2 on slow CI machines)')
+        parser.add_argument('--no-latency', action='store_true',
+                            help='Only enforce query budgets')
+        parser.add_argument('--update-budgets', action='store_true',
+                            help='Write budgets from this run instead of checking them')
+        parser.add_argument('--output', help='Write raw results as JSON to this file')
+
+    def handle(self, *args, **options):
+        scales = [int(scale) for scale in options['scales'].split(',')]
+        only = set(options['scenarios'].split(',')) if options['scenarios'] else None
+
+        results = []
+        setup_test_environment()
+        # Views log on every call; keep the console readable while measuring
+        logging.disable(logging.WARNING)
+        try:
+            for scale in scales:
+                old_config = setup_databases(verbosity=0, interactive=False)
+                try:
+                    started = time.perf_counter()
+                    seed_dataset(scale)
+                    self.stdout.write(f"Seeded scale {scale} in {time.perf_counter() - started:.1f}s")
+                    scale_results = run_suite(scale, options['iterations'], options['warmup'], only)
+                finally:
+                    teardown_databases(old_config, verbosity=0)
+                self._print_results(scale_results)
+                results.extend(scale_results)
+        finally:
+            logging.disable(logging.NOTSET)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump([result.as_dict() for result in results], f, indent=2)
+
+        if options['update_budgets']:
+            with open(options['budgets'], 'w') as f:
+                json.dump({'scenarios': budgets_from_results(results)}, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(self.style.SUCCESS(f"Budgets written to {options['budgets']}"))
+            return
+
+        violations = check_budgets(
+            results,
+            load_budgets(options['budgets']),
+            check_latency=not options['no_latency'],
+            latency_tolerance=options['latency_tolerance'],
+        )
+        if violations:
+            for violation in violations:
+                self.stderr.write(violation)
+            raise CommandError(f"{len(violations)} budget violation(s)")
+        self.stdout.write(self.style.SUCCESS('All scenarios within budget'))
+
+    def _print_results(self, results):
+        self.stdout.write(
+            f"{'scenario':<26}{'scale':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'req/s':>10}{'queries':>9}{'cold':>6}"
+        )
+        for r in results:
+            self.stdout.write(
+                f"{r.name:<26}{r.scale:>7}{r.p50_ms:>10.2f}{r.p95_ms:>10.2f}{r.p99_ms:>10.2f}"
+                f"{r.throughput_rps:>10.1f}{r.queries_max:>9}{r.queries_cold:>6}"
+            )
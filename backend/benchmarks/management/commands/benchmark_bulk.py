@@ -0,0 +1,105 @@
+import json
+import logging
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from api_auth.models import TestModel
+from benchmarks.runner import Scenario, create_context, run_scenario, scenario_environment
+from benchmarks.seed import seed_dataset
+
+
+def _prepare_rows(name, per_request):
+    def prepare(ctx, count):
+        rows = TestModel.objects.bulk_create([
+            TestModel(display_name=f'{name}-{n}') for n in range(count * per_request)
+        ])
+        ids = [row.pk for row in rows]
+        ctx.pools[name] = [ids[i:i + per_request] for i in range(0, len(ids), per_request)]
+    return prepare
+
+
+def single_scenarios():
+    """The per-object routes: one row per request"""
+    return [
+        Scenario('create', 'POST', lambda ctx, i: {
+            'path': '/api/auth/test/', 'data': {'display_name': f'one-{i}', 'test_count': i},
+        }, expected_status=201),
+        Scenario('update', 'PATCH', lambda ctx, i: {
+            'path': f"/api/auth/test/{ctx.pools['update'][i][0]}/", 'data': {'test_count': i},
+        }, prepare=_prepare_rows('update', 1)),
+        Scenario('delete', 'DELETE', lambda ctx, i: {
+            'path': f"/api/auth/test/{ctx.pools['delete'][i][0]}/",
+        }, expected_status=204, prepare=_prepare_rows('delete', 1)),
+    ]
+
+
+def bulk_scenarios(batch):
+    """The bulk/ routes: `batch` rows per request"""
+    return [
+        Scenario('create', 'POST', lambda ctx, i: {
+            'path': '/api/auth/test/bulk/',
+            'data': [{'display_name': f'bulk-{i}-{n}', 'test_count': n} for n in range(batch)],
+        }, expected_status=201),
+        Scenario('update', 'PATCH', lambda ctx, i: {
+            'path': '/api/auth/test/bulk/',
+            'data': [{'test_id': pk, 'test_count': i} for pk in ctx.pools['update'][i]],
+        }, prepare=_prepare_rows('update', batch)),
+        Scenario('delete', 'DELETE', lambda ctx, i: {
+            'path': '/api/auth/test/bulk/', 'data': ctx.pools['delete'][i],
+        }, prepare=_prepare_rows('delete', batch)),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare rows written per second through the per-object TestModel routes and '
+        'the bulk/ routes at several batch sizes. Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-sizes', default='10,100,1000', help='Comma separated rows per bulk request')
+        parser.add_argument('--rows', type=int, default=5000, help='Rows to write per scenario (approximately)')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',')]
+        setup_test_environment()
+        logging.disable(logging.WARNING)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        results = []
+        try:
+            seed_dataset(100)
+            ctx = create_context()
+            client = Client()
+            runs = [(1, single_scenarios())] + [(size, bulk_scenarios(size)) for size in batch_sizes]
+            with scenario_environment(), override_settings(BULK_MAX_BATCH_SIZE=max(batch_sizes)):
+                for batch, scenarios in runs:
+                    iterations = max(5, options['rows'] // batch)
+                    for scenario in scenarios:
+                        result = run_scenario(client, scenario, ctx, batch, iterations, warmup=2)
+                        results.append({
+                            'operation': scenario.name,
+                            'batch': batch,
+                            'route': 'single' if batch == 1 else 'bulk',
+                            'rows_per_second': round(result.throughput_rps * batch, 1),
+                            **result.as_dict(),
+                        })
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            logging.disable(logging.NOTSET)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'operation':<11}{'route':<8}{'batch':>7}{'p50 ms':>10}{'rows/s':>12}{'queries':>9}")
+        for result in results:
+            self.stdout.write(
+                f"{result['operation']:<11}{result['route']:<8}{result['batch']:>7}{result['p50_ms']:>10.2f}"
+                f"{result['rows_per_second']:>12,.0f}{result['queries_max']:>9}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
@@ -0,0 +1,78 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from benchmarks.runner import create_context, default_scenarios, run_scenario, scenario_environment
+from benchmarks.seed import seed_dataset
+
+SCENARIOS = ('health_basic', 'profile', 'plans_list', 'plans_retrieve')
+
+
+def full_stack_middleware():
+    """MIDDLEWARE with BROWSER_MIDDLEWARE listed in place of the fast path, as every request ran before"""
+    middleware = []
+    for path in settings.MIDDLEWARE:
+        if path == 'backend.fast_path.BrowserMiddleware':
+            middleware.extend(settings.BROWSER_MIDDLEWARE)
+        else:
+            middleware.append(path)
+    return middleware
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare API latency with every request running the session, CSRF, auth and '
+        'messages middleware against the fast path that skips them. Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1000, help='Users to seed')
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        logging.disable(logging.WARNING)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        modes = {'full': {'MIDDLEWARE': full_stack_middleware()}, 'fast': {}}
+        results = {}
+        try:
+            seed_dataset(options['scale'])
+            ctx = create_context()
+            scenarios = [s for s in default_scenarios() if s.name in SCENARIOS]
+            with scenario_environment():
+                for mode, overrides in modes.items():
+                    with override_settings(**overrides):
+                        client = Client()  # Loads the middleware chain of this mode
+                        results[mode] = {
+                            scenario.name: run_scenario(
+                                client, scenario, ctx, options['scale'], options['iterations'], options['warmup'],
+                            )
+                            for scenario in scenarios
+                        }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            logging.disable(logging.NOTSET)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'scenario':<18}{'full p50 ms':>13}{'fast p50 ms':>13}{'saved us':>10}{'saved %':>9}")
+        for name in SCENARIOS:
+            full, fast = results['full'].get(name), results['fast'].get(name)
+            if full is None:
+                continue
+            saved = full.p50_ms - fast.p50_ms
+            self.stdout.write(
+                f"{name:<18}{full.p50_ms:>13.3f}{fast.p50_ms:>13.3f}{saved * 1000:>10.0f}"
+                f"{saved / full.p50_ms * 100:>8.1f}%"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({mode: [r.as_dict() for r in rs.values()] for mode, rs in results.items()}, f, indent=2)
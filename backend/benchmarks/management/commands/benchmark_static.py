@@ -0,0 +1,86 @@
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from backend.static import COMPRESSIBLE_EXTENSIONS, CompressedManifestStaticFilesStorage
+
+PLAIN_STORAGES = {**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+
+
+def collect(static_root, storages):
+    with override_settings(STATIC_ROOT=static_root, STORAGES=storages):
+        started = time.perf_counter()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        return time.perf_counter() - started
+
+
+def transfer_sizes(static_root):
+    """Bytes per file extension a client downloads: uncompressed, with gzip and with brotli"""
+    storage = CompressedManifestStaticFilesStorage(location=static_root)
+    totals = defaultdict(lambda: {'files': 0, 'identity': 0, 'gzip': 0, 'br': 0})
+    for name in set(storage.hashed_files.values()):
+        path = storage.path(name)
+        extension = os.path.splitext(name)[1].lower()
+        if extension not in COMPRESSIBLE_EXTENSIONS:
+            continue
+        size = os.path.getsize(path)
+        row = totals[extension]
+        row['files'] += 1
+        row['identity'] += size
+        # Clients get the plain file when no smaller sibling was written
+        for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+            row[encoding] += os.path.getsize(path + suffix) if os.path.exists(path + suffix) else size
+    return dict(totals)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark collectstatic with the plain and the hashed + precompressed '
+        'storage (cold and warm builds) and report static transfer sizes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as plain_root, tempfile.TemporaryDirectory() as compressed_root:
+            results = {
+                'build_seconds': {
+                    'plain': collect(plain_root, PLAIN_STORAGES),
+                    'compressed_cold': collect(compressed_root, settings.STORAGES),
+                    # Nothing changed: existing hashed files keep their siblings
+                    'compressed_warm': collect(compressed_root, settings.STORAGES),
+                },
+                'transfer_bytes': transfer_sizes(compressed_root),
+            }
+
+        self.stdout.write('collectstatic build time:')
+        for name, seconds in results['build_seconds'].items():
+            self.stdout.write(f"  {name:<18}{seconds:>8.2f}s")
+
+        self.stdout.write(f"\n{'type':<8}{'files':>7}{'identity KB':>14}{'gzip KB':>10}{'br KB':>10}{'saved':>8}")
+        total = defaultdict(int)
+        for extension, row in sorted(results['transfer_bytes'].items()):
+            for key, value in row.items():
+                total[key] += value
+            self._print_row(extension, row)
+        self._print_row('total', total)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def _print_row(self, label, row):
+        best = min(row['gzip'], row['br'])
+        saved = 1 - best / row['identity'] if row['identity'] else 0
+        self.stdout.write(
+            f"{label:<8}{row['files']:>7}{row['identity'] / 1024:>14.1f}{row['gzip'] / 1024:>10.1f}"
+            f"{row['br'] / 1024:>10.1f}{saved:>8.0%}"
+        )
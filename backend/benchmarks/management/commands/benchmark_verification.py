@@ -0,0 +1,87 @@
+import json
+import logging
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from api_auth.verification import issue_verification_token
+from benchmarks.runner import Scenario, create_context, run_scenario
+from benchmarks.seed import seed_dataset
+
+User = get_user_model()
+MODES = ('table', 'signed')
+
+
+def _prepare_unverified_users(ctx, count):
+    users = User.objects.bulk_create([
+        User(email=f'unverified{uuid.uuid4().hex}@bench.example.com', password=ctx.user.password)
+        for _ in range(count)
+    ])
+    ctx.pools['unverified'] = [user.email for user in users]
+
+
+def _prepare_tokens(ctx, count):
+    _prepare_unverified_users(ctx, count)
+    users = User.objects.filter(email__in=ctx.pools['unverified'])
+    ctx.pools['tokens'] = [issue_verification_token(user) for user in users]
+
+
+def verification_scenarios():
+    return [
+        Scenario('resend_verification', 'POST', lambda ctx, i: {
+            'path': '/api/auth/resend-verification/', 'data': {'email': ctx.pools['unverified'][i]},
+        }, prepare=_prepare_unverified_users),
+        Scenario('verify_email', 'GET', lambda ctx, i: {
+            'path': f"/api/auth/verify-email/{ctx.pools['tokens'][i]}/",
+        }, prepare=_prepare_tokens),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare issuing (resend) and verifying email verification tokens with '
+        'EMAIL_VERIFICATION_MODE=table and signed. Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1000, help='Users to seed')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        logging.disable(logging.WARNING)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        results = {}
+        try:
+            seed_dataset(options['scale'])
+            ctx = create_context()
+            client = Client()
+            for mode in MODES:
+                with override_settings(EMAIL_VERIFICATION_MODE=mode):
+                    results[mode] = [
+                        run_scenario(client, scenario, ctx, options['scale'], options['iterations'], options['warmup'])
+                        for scenario in verification_scenarios()
+                    ]
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            logging.disable(logging.NOTSET)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'mode':<8}{'scenario':<22}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}{'queries':>9}")
+        for mode, mode_results in results.items():
+            for result in mode_results:
+                self.stdout.write(
+                    f"{mode:<8}{result.name:<22}{result.p50_ms:>10.2f}{result.p95_ms:>10.2f}"
+                    f"{result.throughput_rps:>10.1f}{result.queries_max:>9}"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({mode: [r.as_dict() for r in rs] for mode, rs in results.items()}, f, indent=2)
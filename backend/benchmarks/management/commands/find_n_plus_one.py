@@ -0,0 +1,59 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from api_auth.activity import flush_activity
+from backend.nplusone import QueryShapeRecorder
+from benchmarks.runner import create_context, default_scenarios, run_scenario, scenario_environment
+from benchmarks.seed import seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every benchmark scenario once on seeded data and list the query '
+        'shapes repeated within a request (N+1 candidates) with the code that issued them. '
+        'Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=100, help='Users to seed')
+        parser.add_argument('--threshold', type=int, help='Default: NPLUSONE_THRESHOLD')
+        parser.add_argument('--no-whitelist', action='store_true', help='Also list whitelisted shapes')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error when offenders are found')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        logging.disable(logging.WARNING)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        found = {}
+        try:
+            seed_dataset(options['scale'])
+            ctx = create_context()
+            whitelist = [] if options['no_whitelist'] else None
+            with scenario_environment():
+                client = Client()
+                for scenario in default_scenarios():
+                    recorder = QueryShapeRecorder()
+                    with recorder.recording():
+                        run_scenario(client, scenario, ctx, options['scale'], iterations=1, warmup=0)
+                    offenders = recorder.offenders(options['threshold'], whitelist)
+                    if offenders:
+                        found[scenario.name] = offenders
+            flush_activity()
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            logging.disable(logging.NOTSET)
+            teardown_test_environment()
+
+        for name, offenders in found.items():
+            self.stdout.write(self.style.WARNING(f"{name}:"))
+            for offender in offenders:
+                self.stdout.write('  ' + offender.format().replace('\n', '\n  '))
+        if not found:
+            self.stdout.write(self.style.SUCCESS('No repeated query shapes'))
+        elif options['fail']:
+            raise CommandError(f"N+1 candidates in {len(found)} scenario(s)")
@@ -0,0 +1,166 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from api_auth.activity import flush_activity
+from api_auth.tokens import TieredRefreshToken
+from backend.admission import admission_controller
+from benchmarks.runner import percentile
+from benchmarks.seed import create_bench_user, seed_dataset
+
+TIERS = ('free', 'premium')
+
+
+class SimulatedWorker:
+    """
+    One gthread worker: a fixed thread pool in front of the WSGI app. Requests
+    queue in the executor like they queue in gunicorn, and carry the time they
+    arrived in X-Request-Start, as nginx would send it.
+    """
+
+    def __init__(self, threads):
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.local = threading.local()
+
+    def submit(self, path, tier, token):
+        arrived = time.time()
+        return self.executor.submit(self._send, path, tier, token, arrived)
+
+    def _send(self, path, tier, token, arrived):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client()
+        response = client.get(path, secure=True, headers={
+            'Authorization': f'Bearer {token}',
+            'X-Request-Start': f't={arrived:.3f}',
+        })
+        return tier, response.status_code, (time.time() - arrived) * 1000
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class Command(BaseCommand):
+    help = (
+        'Overload one simulated gunicorn worker with free-tier traffic while '
+        'premium users keep a steady rate, with admission control off and on, '
+        'and compare premium latency. Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/subscriptions/plans/')
+        parser.add_argument('--threads', type=int, default=4, help='Threads of the simulated worker')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run')
+        parser.add_argument('--overload', type=float, default=2.0,
+                            help='Free-tier arrival rate as a multiple of measured capacity')
+        parser.add_argument('--premium-share', type=float, default=0.1,
+                            help='Premium arrival rate as a share of measured capacity')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        logging.disable(logging.WARNING)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            seed_dataset(100)
+            tokens = {}
+            for tier in TIERS:
+                user = create_bench_user(f'loadtest-{tier}@bench.example.com', tier=tier)
+                tokens[tier] = str(TieredRefreshToken.for_user(user).access_token)
+
+            capacity = self._measure_capacity(options['path'], tokens['premium'], options['threads'])
+            rates = {'free': capacity * options['overload'], 'premium': capacity * options['premium_share']}
+            self.stdout.write(
+                f"Capacity ~{capacity:.0f} req/s; offering free {rates['free']:.0f} req/s, "
+                f"premium {rates['premium']:.0f} req/s for {options['duration']:.0f}s per run\n"
+            )
+
+            results = {}
+            for enabled in (False, True):
+                label = 'admission on' if enabled else 'admission off'
+                with override_settings(ADMISSION_CONTROL_ENABLED=enabled,
+                                       ADMISSION_WORKER_THREADS=options['threads']):
+                    results[label] = self._run(options['path'], tokens, rates, options['threads'],
+                                               options['duration'])
+                self._print(label, results[label])
+            # Buffered last-seen writes belong to the throwaway database
+            flush_activity()
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            logging.disable(logging.NOTSET)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def _measure_capacity(self, path, token, threads, requests=50):
+        worker = SimulatedWorker(threads)
+        with override_settings(ADMISSION_CONTROL_ENABLED=False):
+            for future in [worker.submit(path, 'premium', token) for _ in range(5)]:
+                future.result()  # Warm up
+            started = time.perf_counter()
+            for future in [worker.submit(path, 'premium', token) for _ in range(requests)]:
+                future.result()
+        worker.shutdown()
+        return requests / (time.perf_counter() - started)
+
+    def _run(self, path, tokens, rates, threads, duration):
+        """Open-loop arrivals: requests are offered on schedule whether or not earlier ones finished"""
+        worker = SimulatedWorker(threads)
+        shed_before = dict(admission_controller.shed)
+        futures = []
+        next_at = {tier: 0.0 for tier in TIERS}
+        started = time.perf_counter()
+        while (elapsed := time.perf_counter() - started) < duration:
+            for tier in TIERS:
+                while next_at[tier] <= elapsed and rates[tier] > 0:
+                    futures.append(worker.submit(path, tier, tokens[tier]))
+                    next_at[tier] += 1 / rates[tier]
+            time.sleep(0.001)
+        worker.shutdown()
+
+        by_tier = defaultdict(lambda: {'sent': 0, 'ok': 0, 'shed': 0, 'latencies': []})
+        for future in futures:
+            tier, status_code, latency_ms = future.result()
+            row = by_tier[tier]
+            row['sent'] += 1
+            if status_code == 503:
+                row['shed'] += 1
+            elif status_code < 400:
+                row['ok'] += 1
+                row['latencies'].append(latency_ms)
+
+        summary = {}
+        for tier, row in by_tier.items():
+            latencies = row.pop('latencies') or [0]
+            summary[tier] = {
+                **row,
+                'p50_ms': round(percentile(latencies, 50), 1),
+                'p95_ms': round(percentile(latencies, 95), 1),
+                'p99_ms': round(percentile(latencies, 99), 1),
+            }
+        summary['shed_by_controller'] = {
+            cls: count - shed_before.get(cls, 0) for cls, count in admission_controller.shed.items()
+        }
+        return summary
+
+    def _print(self, label, summary):
+        self.stdout.write(f"{label}:")
+        self.stdout.write(f"  {'tier':<10}{'sent':>7}{'ok':>7}{'503':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for tier in TIERS:
+            row = summary.get(tier)
+            if row:
+                self.stdout.write(
+                    f"  {tier:<10}{row['sent']:>7}{row['ok']:>7}{row['shed']:>7}"
+                    f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+                )
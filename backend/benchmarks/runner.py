@@ -0,0 +1,375 @@
+import json
+import math
+import os
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connections
+from django.test import Client, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api_auth.activity import flush_activity
+from api_auth.audit import flush_audit_log
+from api_auth.models import TestModel, EmailVerification
+from backend.caching import two_tier_cache
+from subscriptions.models import SubscriptionPlan
+from subscriptions.webhooks import sign_payload
+from .seed import BENCH_PASSWORD, create_bench_user
+
+BUDGETS_PATH = Path(__file__).resolve().parent / 'budgets.json'
+WEBHOOK_SECRET = 'bench-webhook-secret'
+# Google OAuth settings are read from the environment at request time
+GOOGLE_ENV_DEFAULTS = {
+    'GOOGLE_OAUTH2_REDIRECT_URI': 'http://localhost:5173/login/callback',
+    'GOOGL_CLIENT_ID': 'bench-client-id',
+    'GOOGL_SECRET': 'bench-secret',
+}
+
+User = get_user_model()
+
+
+class QueryCounter:
+    """
+    Count statements on every configured database while active. Savepoint
+    bookkeeping is skipped so counts match between autocommit runs and
+    TestCase (where every atomic block becomes a savepoint).
+    """
+    IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+    def __init__(self):
+        self.count = 0
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(self.IGNORED_PREFIXES):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+
+class FakeGoogleResponse:
+    ok = True
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+@dataclass
+class BenchContext:
+    """Shared state for scenarios of one scale: the bench user, tokens and per-scenario pools"""
+    user: object
+    access_token: str
+    refresh_token: str
+    pools: dict = field(default_factory=dict)
+
+    @property
+    def auth_headers(self):
+        return {'Authorization': f'Bearer {self.access_token}'}
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    build: Callable  # (ctx, i) -> dict(path=..., data=..., headers=...)
+    expected_status: int = 200
+    prepare: Optional[Callable] = None  # (ctx, count) -> None, fills ctx.pools outside the timed loop
+    content_type: str = 'application/json'
+    per_database: bool = False  # Queries scale with the configured databases; counts are reported per database
+
+
+def _prepare_test_rows(name):
+    def prepare(ctx, count):
+        rows = TestModel.objects.bulk_create([TestModel(display_name=f'{name}-{n}') for n in range(count)])
+        ctx.pools[name] = [row.pk for row in rows]
+    return prepare
+
+
+def _prepare_verification_tokens(ctx, count):
+    users = User.objects.bulk_create([
+        User(email=f'verify{uuid.uuid4().hex}@bench.example.com', password=ctx.user.password)
+        for _ in range(count)
+    ])
+    expires_at = timezone.now() + timedelta(days=2)
+    tokens = EmailVerification.objects.bulk_create([
+        EmailVerification(user=user, expires_at=expires_at) for user in users
+    ])
+    ctx.pools['verify_email'] = [str(token.token) for token in tokens]
+
+
+def _prepare_plan_ids(ctx, count):
+    ctx.pools['plan_ids'] = list(SubscriptionPlan.objects.filter(is_active=True).values_list('pk', flat=True))
+
+
+def _webhook_request(ctx, i):
+    body = json.dumps({
+        'id': f'evt_bench_{uuid.uuid4().hex}',
+        'type': 'invoice.paid',
+        'data': {'object': {'object': 'invoice', 'subscription': f'sub_bench_{i % 50}'}},
+    }).encode()
+    return {
+        'path': '/api/subscriptions/webhooks/stripe/',
+        'data': body,
+        'headers': {'Stripe-Signature': sign_payload(WEBHOOK_SECRET, body)},
+    }
+
+
+def default_scenarios():
+    """One scenario per route in api_auth, subscriptions and health_check urls"""
+    return [
+        Scenario('health_basic', 'GET', lambda ctx, i: {'path': '/health/'}),
+        Scenario('health_db', 'GET', lambda ctx, i: {'path': '/health/db/'}, per_database=True),
+        Scenario('auth_api_root', 'GET', lambda ctx, i: {'path': '/api/auth/', 'headers': ctx.auth_headers}),
+        Scenario('test_list', 'GET', lambda ctx, i: {'path': '/api/auth/test/'}),
+        Scenario('test_create', 'POST', lambda ctx, i: {
+            'path': '/api/auth/test/', 'data': {'display_name': f'new-{i}', 'test_count': i},
+        }, expected_status=201),
+        Scenario('test_retrieve', 'GET', lambda ctx, i: {
+            'path': f"/api/auth/test/{ctx.pools['test_retrieve'][i]}/",
+        }, prepare=_prepare_test_rows('test_retrieve')),
+        Scenario('test_update', 'PATCH', lambda ctx, i: {
+            'path': f"/api/auth/test/{ctx.pools['test_update'][i]}/", 'data': {'test_count': i},
+        }, prepare=_prepare_test_rows('test_update')),
+        Scenario('test_delete', 'DELETE', lambda ctx, i: {
+            'path': f"/api/auth/test/{ctx.pools['test_delete'][i]}/",
+        }, expected_status=204, prepare=_prepare_test_rows('test_delete')),
+        Scenario('test_protected_list', 'GET', lambda ctx, i: {
+            'path': '/api/auth/test-protected/', 'headers': ctx.auth_headers,
+        }),
+        Scenario('test_protected_retrieve', 'GET', lambda ctx, i: {
+            'path': f"/api/auth/test-protected/{ctx.pools['test_protected_retrieve'][i]}/",
+            'headers': ctx.auth_headers,
+        }, prepare=_prepare_test_rows('test_protected_retrieve')),
+        Scenario('register', 'POST', lambda ctx, i: {
+            'path': '/api/auth/register/',
+            'data': {
+                'email': f'register{uuid.uuid4().hex}@bench.example.com',
+                'password': BENCH_PASSWORD,
+                'profile': {'display_name': 'New User'},
+            },
+        }, expected_status=201),
+        Scenario('token_obtain', 'POST', lambda ctx, i: {
+            'path': '/api/auth/token/', 'data': {'email': ctx.user.email, 'password': BENCH_PASSWORD},
+        }),
+        Scenario('token_refresh', 'POST', lambda ctx, i: {
+            'path': '/api/auth/token/refresh/', 'data': {'refresh': ctx.refresh_token},
+        }),
+        Scenario('google_login', 'GET', lambda ctx, i: {'path': '/api/auth/google/login/'}, expected_status=302),
+        Scenario('google_callback', 'GET', lambda ctx, i: {
+            'path': '/api/auth/google/callback/', 'data': {'code': f'code-{i}'},
+        }),
+        Scenario('verify_email', 'GET', lambda ctx, i: {
+            'path': f"/api/auth/verify-email/{ctx.pools['verify_email'][i]}/",
+        }, prepare=_prepare_verification_tokens),
+        Scenario('resend_verification', 'POST', lambda ctx, i: {
+            'path': '/api/auth/resend-verification/', 'data': {'email': 'user1@bench.example.com'},
+        }),
+        Scenario('profile', 'GET', lambda ctx, i: {'path': '/api/auth/profile/', 'headers': ctx.auth_headers}),
+        Scenario('profile_patch', 'PATCH', lambda ctx, i: {
+            'path': '/api/auth/profile/', 'headers': ctx.auth_headers, 'data': {'display_name': f'Bench {i % 2}'},
+        }),
+        Scenario('subscriptions_api_root', 'GET', lambda ctx, i: {
+            'path': '/api/subscriptions/', 'headers': ctx.auth_headers,
+        }),
+        Scenario('plans_list', 'GET', lambda ctx, i: {'path': '/api/subscriptions/plans/'}),
+        Scenario('plans_retrieve', 'GET', lambda ctx, i: {
+            'path': f"/api/subscriptions/plans/{ctx.pools['plan_ids'][i % len(ctx.pools['plan_ids'])]}/",
+        }, prepare=_prepare_plan_ids),
+        Scenario('payment_webhook', 'POST', _webhook_request),
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    scale: int
+    iterations: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    throughput_rps: float
+    queries_max: int
+    queries_mean: float
+    queries_cold: int  # The first request, with every cache empty
+
+    def as_dict(self):
+        return self.__dict__.copy()
+
+
+def _google_mocks():
+    def fake_post(url, *args, **kwargs):
+        return FakeGoogleResponse({'access_token': 'bench-access', 'id_token': 'bench-id'})
+
+    def fake_get(url, *args, **kwargs):
+        return FakeGoogleResponse({'email': 'google@bench.example.com', 'name': 'Google User', 'given_name': 'Google'})
+
+    return [mock.patch('requests.post', fake_post), mock.patch('requests.get', fake_get)]
+
+
+def create_context():
+    user = create_bench_user()
+    refresh = RefreshToken.for_user(user)
+    return BenchContext(user=user, access_token=str(refresh.access_token), refresh_token=str(refresh))
+
+
+def run_scenario(client, scenario, ctx, scale, iterations, warmup):
+    total = iterations + warmup
+    if scenario.prepare:
+        scenario.prepare(ctx, total)
+
+    latencies = []
+    query_counts = []
+    queries_cold = None
+    # Cached routes answer warm requests with no queries: the first request measures what a miss costs
+    two_tier_cache.clear_local()
+    caches['default'].clear()
+    wall_started = time.perf_counter()
+    for i in range(total):
+        request = scenario.build(ctx, i)
+        send = getattr(client, scenario.method.lower())
+        kwargs = {'headers': request.get('headers'), 'secure': True}
+        if request.get('data') is not None:
+            kwargs['data'] = request['data']
+        if scenario.method != 'GET':
+            kwargs['content_type'] = scenario.content_type
+        with QueryCounter() as counter:
+            started = time.perf_counter()
+            response = send(request['path'], **kwargs)
+            elapsed = time.perf_counter() - started
+        if response.status_code != scenario.expected_status:
+            raise AssertionError(
+                f"{scenario.name}: expected {scenario.expected_status}, got {response.status_code}: "
+                f"{response.content[:300]!r}"
+            )
+        if i == 0:
+            queries_cold = math.ceil(counter.count / len(connections.all())) if scenario.per_database else counter.count
+        if i == warmup - 1:
+            wall_started = time.perf_counter()
+        if i >= warmup:
+            latencies.append(elapsed * 1000)
+            if scenario.per_database:
+                query_counts.append(math.ceil(counter.count / len(connections.all())))
+            else:
+                query_counts.append(counter.count)
+    wall = time.perf_counter() - wall_started
+
+    return ScenarioResult(
+        name=scenario.name,
+        scale=scale,
+        iterations=iterations,
+        p50_ms=round(percentile(latencies, 50), 3),
+        p95_ms=round(percentile(latencies, 95), 3),
+        p99_ms=round(percentile(latencies, 99), 3),
+        throughput_rps=round(iterations / wall, 1),
+        queries_max=max(query_counts),
+        queries_mean=round(sum(query_counts) / len(query_counts), 2),
+        queries_cold=queries_cold,
+    )
+
+
+@contextmanager
+def scenario_environment():
+    """Mocked Google endpoints, webhook secret and settings every scenario expects"""
+    with ExitStack() as stack:
+        for patcher in _google_mocks():
+            stack.enter_context(patcher)
+        stack.enter_context(mock.patch.dict(
+            os.environ, {key: os.environ.get(key, value) for key, value in GOOGLE_ENV_DEFAULTS.items()}
+        ))
+        stack.enter_context(override_settings(
+            PAYMENT_WEBHOOK_SECRETS={**settings.PAYMENT_WEBHOOK_SECRETS, 'stripe': WEBHOOK_SECRET},
+            # Measure the app, not the development-only N+1 detector
+            NPLUSONE_ENABLED=False,
+            # Buffers are flushed by run_suite on this thread. A flusher thread's connection to the
+            # in-memory SQLite test database is never closed by Django and would keep it (and the
+            # seeded rows) alive past teardown, into the next scale.
+            ACTIVITY_FLUSH_INTERVAL=24 * 3600,
+            AUDIT_FLUSH_INTERVAL=24 * 3600,
+            AUDIT_BUFFER_MAX=1_000_000,
+        ))
+        yield
+
+
+def run_suite(scale, iterations, warmup, only=None):
+    """Run every (or the selected) scenario against the current, already seeded database"""
+    ctx = create_context()
+    scenarios = [s for s in default_scenarios() if not only or s.name in only]
+    results = []
+    with scenario_environment():
+        client = Client()
+        for scenario in scenarios:
+            results.append(run_scenario(client, scenario, ctx, scale, iterations, warmup))
+    # Buffered activity and audit events belong to this (throwaway) database, not whichever is configured at exit
+    flush_activity()
+    flush_audit_log()
+    return results
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path) as f:
+        return json.load(f)['scenarios']
+
+
+def check_budgets(results, budgets, check_latency=True, latency_tolerance=1.0):
+    """Return a list of human readable budget violations"""
+    violations = []
+    for result in results:
+        budget = budgets.get(result.name)
+        if budget is None:
+            violations.append(f"{result.name}: no budget defined")
+            continue
+        if result.queries_max > budget['max_queries']:
+            violations.append(
+                f"{result.name} @ scale {result.scale}: {result.queries_max} queries > budget {budget['max_queries']}"
+            )
+        if result.queries_cold > budget['max_cold_queries']:
+            violations.append(
+                f"{result.name} @ scale {result.scale}: {result.queries_cold} queries on a cold cache "
+                f"> budget {budget['max_cold_queries']}"
+            )
+        if check_latency and result.p95_ms > budget['p95_ms'] * latency_tolerance:
+            violations.append(
+                f"{result.name} @ scale {result.scale}: p95 {result.p95_ms:.1f}ms > budget {budget['p95_ms']}ms"
+            )
+    return violations
+
+
+def budgets_from_results(results, latency_headroom=3.0, min_p95_ms=10):
+    """
+    Derive budgets from measured results: exact query counts, p95 with
+    headroom and a floor so sub-millisecond routes don't flake on noise.
+    """
+    budgets = {}
+    for result in results:
+        budget = budgets.setdefault(result.name, {'max_queries': 0, 'max_cold_queries': 0, 'p95_ms': min_p95_ms})
+        budget['max_queries'] = max(budget['max_queries'], result.queries_max)
+        budget['max_cold_queries'] = max(budget['max_cold_queries'], result.queries_cold)
+        budget['p95_ms'] = max(budget['p95_ms'], math.ceil(result.p95_ms * latency_headroom))
+    return budgets
@@ -0,0 +1,100 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from api_auth.models import TestModel, Profile, EmailVerification
+from backend.caching import two_tier_cache
+from subscriptions.models import SubscriptionPlan, Feature, PlanFeature
+from subscriptions.signals import CATALOG_CACHE_TAG
+
+User = get_user_model()
+
+BENCH_PASSWORD = 'bench-Passw0rd!'
+FEATURE_COUNT = 20  # The catalog does not grow with the user base
+
+PLANS = [
+    ('free', 'monthly', Decimal('0.00')),
+    ('basic', 'monthly', Decimal('4.99')),
+    ('basic', 'annual', Decimal('49.00')),
+    ('premium', 'monthly', Decimal('9.99')),
+    ('premium', 'annual', Decimal('99.00')),
+]
+
+
+def seed_catalog():
+    features = Feature.objects.bulk_create([
+        Feature(
+            name=f'feature-{n}',
+            display_order=n,
+            feature_type='credit' if n % 5 == 0 else 'standard',
+            credit_cost=3 if n % 5 == 0 else 0,
+        )
+        for n in range(FEATURE_COUNT)
+    ])
+    plans = SubscriptionPlan.objects.bulk_create([
+        SubscriptionPlan(name=f'{tier.title()} {cycle}', tier=tier, billing_cycle=cycle, price=price)
+        for tier, cycle, price in PLANS
+    ])
+    # Higher tiers include more of the catalog
+    feature_share = {'free': 0.25, 'basic': 0.6, 'premium': 1.0}
+    PlanFeature.objects.bulk_create([
+        PlanFeature(plan=plan, feature=feature, is_highlighted=n % 4 == 0)
+        for plan in plans
+        for n, feature in enumerate(features[:int(FEATURE_COUNT * feature_share[plan.tier])])
+    ])
+    # bulk_create sends no post_save
+    two_tier_cache.invalidate_tags(CATALOG_CACHE_TAG)
+    return plans
+
+
+def seed_users(scale, rng, batch_size=2000):
+    """`scale` users with profiles, spread over tiers; hashed once for speed"""
+    password = make_password(BENCH_PASSWORD)
+    tiers = ['free'] * 6 + ['basic'] * 3 + ['premium']
+    for offset in range(0, scale, batch_size):
+        users = User.objects.bulk_create([
+            User(
+                email=f'user{n}@bench.example.com',
+                password=password,
+                tier=rng.choice(tiers),
+                is_email_verified=rng.random() < 0.8,
+                register_method='google' if rng.random() < 0.3 else 'email',
+            )
+            for n in range(offset, min(offset + batch_size, scale))
+        ])
+        Profile.objects.bulk_create([
+            Profile(user=user, display_name=f'User {user.pk}', first_name='Bench', bio='x' * rng.randint(0, 500))
+            for user in users
+        ])
+
+
+def seed_dataset(scale, seed=0):
+    """
+    Seed a benchmark dataset: fixed-size plan catalog, `scale` users with
+    profiles, `scale` TestModel rows and one verification token per ten users.
+    """
+    rng = random.Random(seed)
+    seed_catalog()
+    seed_users(scale, rng)
+    TestModel.objects.bulk_create([
+        TestModel(display_name=f'test-{n}', test_count=n) for n in range(scale)
+    ], batch_size=2000)
+
+    now = timezone.now()
+    unverified = User.objects.filter(is_email_verified=False).values_list('pk', flat=True)[:max(scale // 10, 1)]
+    EmailVerification.objects.bulk_create([
+        EmailVerification(user_id=user_id, expires_at=now + timedelta(days=2)) for user_id in unverified
+    ], batch_size=2000)
+
+
+def create_bench_user(email='bench@bench.example.com', tier='premium'):
+    """A verified user with a known password for authenticated scenarios"""
+    user = User.objects.create_user(email=email, password=BENCH_PASSWORD)
+    User.objects.filter(pk=user.pk).update(tier=tier, is_email_verified=True)
+    Profile.objects.get_or_create(user=user, defaults={'display_name': 'Bench User'})
+    user.refresh_from_db()
+    return user
@@ -0,0 +1,247 @@
+"""
+Deterministic synthetic datasets for scale testing.
+
+`generate(scale, seed)` writes `scale` x USERS_PER_SCALE users with profiles
+spread over tiers and register methods, verification tokens in every state
+(valid, expired, used) and a feature catalog of `scale` x FEATURES_PER_SCALE
+features mapped to the plans. SubscriptionPlan allows one plan per tier and
+billing cycle, so the plans themselves are created once and only the
+catalog behind them grows.
+
+Rows are generated column-wise from per-table random streams and written
+with backend.db_utils.bulk_insert_rows (COPY on PostgreSQL), never through
+save(), so no per-row signals or model instances are involved. The same
+seed and scale always produce the same rows; timestamps are offsets from
+midnight UTC of the day of the run.
+"""
+import random
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from api_auth.models import EmailVerification, Profile
+from backend.caching import two_tier_cache
+from backend.db_utils import bulk_insert_rows, reset_sequences
+from subscriptions.models import Feature, PlanFeature, SubscriptionPlan
+from subscriptions.signals import CATALOG_CACHE_TAG
+
+User = get_user_model()
+
+USERS_PER_SCALE = 10_000
+FEATURES_PER_SCALE = 50
+EMAIL_DOMAIN = 'synthetic.example.com'
+PASSWORD = 'synthetic-Passw0rd!'
+
+TIERS = (('free', 0.6), ('basic', 0.3), ('premium', 0.1))
+REGISTER_METHODS = (('email', 0.7), ('google', 0.3))
+# Token states by user: verified email users used theirs, unverified ones may still have one
+VERIFIED_TOKEN_STATES = (('used', 0.9), (None, 0.1))
+UNVERIFIED_TOKEN_STATES = (('valid', 0.4), ('expired', 0.4), (None, 0.2))
+PLANS = [
+    ('free', 'monthly', Decimal('0.00')),
+    ('basic', 'monthly', Decimal('4.99')),
+    ('basic', 'annual', Decimal('49.00')),
+    ('premium', 'monthly', Decimal('9.99')),
+    ('premium', 'annual', Decimal('99.00')),
+]
+# Share of the catalog each tier includes
+FEATURE_SHARE = {'free': 0.25, 'basic': 0.6, 'premium': 1.0}
+LOREM = (
+    'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut '
+    'labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco. '
+) * 8
+
+
+def _stream(seed, name):
+    """Independent random stream per table, so changing one table's generator leaves the others alone"""
+    return random.Random(f'{seed}:{name}')
+
+
+def _weighted(rng, choices, k):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights, k=k)
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _next_id(model):
+    return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+def _email(seed, n):
+    return f'user{n}-s{seed}@{EMAIL_DOMAIN}'
+
+
+def user_rows(scale, seed, first_id, anchor, batch_size):
+    """(id, email, password, ...) tuples in the column order of USER_FIELDS"""
+    rng = _stream(seed, 'users')
+    password = make_password(PASSWORD, salt=f'synthetic{seed}')
+    total = scale * USERS_PER_SCALE
+    for start in range(0, total, batch_size):
+        k = min(batch_size, total - start)
+        tiers = _weighted(rng, TIERS, k)
+        methods = _weighted(rng, REGISTER_METHODS, k)
+        verified = [value < 0.8 for value in (rng.random() for _ in range(k))]
+        joined_days = [rng.randrange(730) for _ in range(k)]
+        seen_days = [rng.randrange(days + 1) for days in joined_days]
+        for i in range(k):
+            n = start + i
+            joined = anchor - timedelta(days=joined_days[i])
+            seen = anchor - timedelta(days=seen_days[i])
+            yield (
+                first_id + n, _email(seed, n), password, False, False, True,
+                # Google accounts come verified
+                verified[i] or methods[i] == 'google', seen, seen, joined, methods[i], tiers[i],
+            )
+
+
+USER_FIELDS = (
+    'id', 'email', 'password', 'is_staff', 'is_superuser', 'is_active',
+    'is_email_verified', 'last_login', 'last_seen', 'date_joined', 'register_method', 'tier',
+)
+PROFILE_FIELDS = (
+    'id', 'user_id', 'display_name', 'first_name', 'last_name', 'short_intro', 'bio',
+    'link_twitter', 'link_linkedin', 'link_youtube', 'link_facebook', 'link_website', 'created', 'version',
+)
+VERIFICATION_FIELDS = ('id', 'user_id', 'token', 'created_at', 'expires_at', 'is_used')
+
+
+def profile_rows(users, rng, first_id):
+    for n, user in enumerate(users):
+        user_id, joined = user[0], user[9]
+        bio_length = rng.choice((0, 0, 40, 200, 600))
+        yield (
+            first_id + n, user_id, f'User {user_id}', 'Synthetic', f'User{user_id % 1000}', None,
+            LOREM[:bio_length] or None,
+            f'https://twitter.com/user{user_id}' if rng.random() < 0.2 else None, None, None, None, None,
+            joined, 1,
+        )
+
+
+def verification_rows(users, rng, first_id, anchor):
+    verified = _weighted(rng, VERIFIED_TOKEN_STATES, len(users))
+    unverified = _weighted(rng, UNVERIFIED_TOKEN_STATES, len(users))
+    n = 0
+    for user, if_verified, if_unverified in zip(users, verified, unverified):
+        if user[10] == 'google':
+            continue  # Never verified by email
+        state = if_verified if user[6] else if_unverified
+        if state is None:
+            continue
+        # Tokens live two days: valid ones are younger, the others older
+        hours = rng.randrange(1, 47) if state == 'valid' else rng.randrange(49, 24 * 30)
+        created = anchor - timedelta(hours=hours)
+        yield (
+            first_id + n, user[0], uuid.UUID(int=rng.getrandbits(128), version=4), created,
+            created + timedelta(days=2), state == 'used',
+        )
+        n += 1
+
+
+def ensure_plans():
+    plans = []
+    for tier, cycle, price in PLANS:
+        plan, _ = SubscriptionPlan.objects.get_or_create(
+            tier=tier, billing_cycle=cycle, defaults={'name': f'{tier.title()} {cycle}', 'price': price},
+        )
+        plans.append(plan)
+    return plans
+
+
+def generate(scale, seed=0, batch_size=10000, log=None):
+    """Write one synthetic dataset; returns {table: (rows, seconds)}"""
+    log = log or (lambda message: None)
+    using = router.db_for_write(User)
+    anchor = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    stats = {}
+
+    def timed(name, write):
+        started = time.perf_counter()
+        with transaction.atomic(using=using):
+            rows = write()
+        stats[name] = (rows, time.perf_counter() - started)
+        log(f"{name}: {rows} rows in {stats[name][1]:.1f}s ({rows / max(stats[name][1], 1e-9):,.0f} rows/s)")
+
+    plans = ensure_plans()
+    first_feature = _next_id(Feature)
+    feature_count = scale * FEATURES_PER_SCALE
+    rng = _stream(seed, 'features')
+    timed('features', lambda: bulk_insert_rows(
+        Feature, ('id', 'name', 'description', 'display_order', 'feature_type', 'credit_cost', 'is_active',
+                  'created_at'),
+        (
+            (first_feature + n, f'feature{n}-s{seed}', LOREM[:rng.randrange(120)], n,
+             'credit' if n % 5 == 0 else 'standard', 3 if n % 5 == 0 else 0, True, anchor)
+            for n in range(feature_count)
+        ),
+        using=using, batch_size=batch_size,
+    ))
+    first_mapping = _next_id(PlanFeature)
+    mappings = (
+        (plan.pk, first_feature + n, n % 4 == 0)
+        for plan in plans
+        for n in range(int(feature_count * FEATURE_SHARE[plan.tier]))
+    )
+    timed('plan_features', lambda: bulk_insert_rows(
+        PlanFeature, ('id', 'plan_id', 'feature_id', 'is_highlighted'),
+        ((first_mapping + i, *mapping) for i, mapping in enumerate(mappings)),
+        using=using, batch_size=batch_size,
+    ))
+
+    first_user, first_profile, first_token = _next_id(User), _next_id(Profile), _next_id(EmailVerification)
+    totals = {'users': 0, 'profiles': 0, 'verifications': 0}
+    profile_rng, verification_rng = _stream(seed, 'profiles'), _stream(seed, 'verifications')
+    started = time.perf_counter()
+    # Users, then their profiles and tokens, one batch at a time: memory stays flat at any scale
+    with transaction.atomic(using=using):
+        for users in _batched(user_rows(scale, seed, first_user, anchor, batch_size), batch_size):
+            totals['users'] += bulk_insert_rows(User, USER_FIELDS, users, using=using, batch_size=batch_size)
+            totals['profiles'] += bulk_insert_rows(
+                Profile, PROFILE_FIELDS, profile_rows(users, profile_rng, first_profile + totals['profiles']),
+                using=using, batch_size=batch_size,
+            )
+            totals['verifications'] += bulk_insert_rows(
+                EmailVerification, VERIFICATION_FIELDS,
+                verification_rows(users, verification_rng, first_token + totals['verifications'], anchor),
+                using=using, batch_size=batch_size,
+            )
+    seconds = time.perf_counter() - started
+    for name, rows in totals.items():
+        stats[name] = (rows, seconds)
+    rows = sum(totals.values())
+    log(f"users, profiles, verifications: {rows} rows in {seconds:.1f}s ({rows / max(seconds, 1e-9):,.0f} rows/s)")
+
+    reset_sequences([Feature, PlanFeature, User, Profile, EmailVerification], using=using)
+    # Raw inserts send no signals: drop cached catalog responses by hand
+    two_tier_cache.invalidate_tags(CATALOG_CACHE_TAG)
+    if connections[using].vendor == 'postgresql':
+        with connections[using].cursor() as cursor:
+            cursor.execute('ANALYZE')
+    return stats
+
+
+def delete_synthetic(using='default'):
+    """Remove every synthetic user (with profiles and tokens) and feature; returns the number of users"""
+    with transaction.atomic(using=using):
+        users = User.objects.using(using).filter(email__endswith=f'@{EMAIL_DOMAIN}')
+        # Plain DELETEs: the collector would load millions of rows to cascade
+        for model in (EmailVerification, Profile):
+            model.objects.using(using).filter(user__in=users.values('pk'))._raw_delete(using)
+        deleted = users._raw_delete(using)
+        features = Feature.objects.using(using).filter(name__regex=r'^feature[0-9]+-s')
+        PlanFeature.objects.using(using).filter(feature__in=features.values('pk'))._raw_delete(using)
+        features._raw_delete(using)
+    two_tier_cache.invalidate_tags(CATALOG_CACHE_TAG)
+    return deleted
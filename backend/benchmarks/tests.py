@@ -0,0 +1,80 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api_auth.models import EmailVerification, Profile
+
+from .runner import check_budgets, default_scenarios, load_budgets, run_suite
+from .seed import seed_dataset
+from .synthetic import USERS_PER_SCALE, delete_synthetic, generate
+
+User = get_user_model()
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    REPLICA_DATABASES=[],  # Seeded rows only exist on the primary
+)
+class QueryBudgetTests(TestCase):
+    """
+    Run every API scenario once on a small dataset and fail when a route
+    issues more queries than budgets.json allows. Latency budgets are only
+    enforced by `manage.py benchmark_api`, which controls warmup and scale.
+    """
+    databases = '__all__'  # health_db pings every configured database
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(scale=50)
+
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def test_every_scenario_has_a_budget(self):
+        budgets = load_budgets()
+        missing = [scenario.name for scenario in default_scenarios() if scenario.name not in budgets]
+        self.assertEqual(missing, [])
+
+    def test_query_budgets(self):
+        results = run_suite(scale=50, iterations=3, warmup=1)
+        violations = check_budgets(results, load_budgets(), check_latency=False)
+        self.assertEqual(violations, [])
+
+
+class SyntheticDataTests(TestCase):
+
+    def snapshot(self):
+        users = list(User.objects.order_by('email').values_list(
+            'email', 'tier', 'register_method', 'is_email_verified', 'date_joined',
+        ))
+        tokens = list(EmailVerification.objects.order_by('token').values_list(
+            'token', 'user__email', 'is_used', 'expires_at',
+        ))
+        return users, tokens
+
+    def test_same_seed_same_rows(self):
+        generate(scale=1, seed=7)
+        self.assertEqual(User.objects.count(), USERS_PER_SCALE)
+        self.assertEqual(Profile.objects.count(), USERS_PER_SCALE)
+        first = self.snapshot()
+
+        delete_synthetic()
+        self.assertFalse(User.objects.exists())
+        generate(scale=1, seed=7)
+        self.assertEqual(self.snapshot(), first)
+
+        delete_synthetic()
+        generate(scale=1, seed=8)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_tokens_in_every_state(self):
+        generate(scale=1)
+        now = timezone.now()
+        tokens = EmailVerification.objects
+        self.assertTrue(tokens.filter(is_used=True, user__is_email_verified=True).exists())
+        self.assertTrue(tokens.filter(is_used=False, expires_at__gt=now, user__is_email_verified=False).exists())
+        self.assertTrue(tokens.filter(is_used=False, expires_at__lte=now).exists())
+        self.assertFalse(tokens.filter(user__register_method='google').exists())
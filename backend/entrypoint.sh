@@ -20,18 +20,33 @@ while ! nc -z $DATABASE_HOST $DATABASE_PORT; do
 done
 echo "PostgreSQL started"
 
-# Collect static files
-echo "Collecting static files..."
-if ! python manage.py collectstatic --noinput; then
-    echo "Error: Static file collection failed"
-    exit 1
+if [ "$1" = "events" ]; then
+    # The event stream service: the ASGI app under uvicorn workers. The web service prepares static files and the database.
+    echo "Starting the event stream server..."
+    exec gunicorn backend.asgi:application -c gunicorn.events.conf.py
 fi
 
-# Run migrations
-echo "Running migrations..."
-if ! python manage.py migrate; then
-    echo "Error: Database migration failed"
-    exit 1
+if [ "${FAST_BOOT:-1}" = "1" ]; then
+    # collectstatic and migrate in one Django process, each skipped when there is nothing to do
+    echo "Preparing static files and database..."
+    if ! python manage.py fastboot; then
+        echo "Error: Fast boot failed"
+        exit 1
+    fi
+else
+    # Collect static files
+    echo "Collecting static files..."
+    if ! python manage.py collectstatic --noinput; then
+        echo "Error: Static file collection failed"
+        exit 1
+    fi
+
+    # Run migrations
+    echo "Running migrations..."
+    if ! python manage.py migrate; then
+        echo "Error: Database migration failed"
+        exit 1
+    fi
 fi
 
 # Start Gunicorn
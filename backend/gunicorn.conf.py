@@ -1,6 +1,13 @@
+import os
+
 # Number of worker processes
 workers = 3
 
+# Sync workers serve one request at a time
+threads = 1
+# Admission control sizes its per-class limits from the threads each worker really has
+os.environ['ADMISSION_WORKER_THREADS'] = str(max(threads, 1))
+
 # The socket to bind
 bind = "0.0.0.0:8000"
 
@@ -24,3 +31,11 @@ loglevel = 'info'
 
 # Keep-alive connection timeout
 # keepalive = 65
+
+
+def worker_exit(server, worker):
+    # Write the buffered last-login / last-seen timestamps and audit events before the worker goes away
+    from api_auth.activity import flush_activity
+    from api_auth.audit import flush_audit_log
+    flush_activity()
+    flush_audit_log()
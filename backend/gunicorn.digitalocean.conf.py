@@ -1,16 +1,28 @@
-import multiprocessing
+import gc
+import os
+import random
+import sys
 
-# Workers and threads configuration
-cpu_count = multiprocessing.cpu_count()
-workers = cpu_count * 2 + 1
-threads = cpu_count * 2  # 2 threads per core is a good starting point
-
-# The socket to bind
-bind = "0.0.0.0:8000"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from gunicorn_tuning import tune, record_worker_rss  # noqa: E402
 
 # Worker class configuration
 worker_class = "gthread"  # Use threaded worker
 
+# Workers and threads configuration, sized from CPUs, memory, per-worker RSS and DB max_connections
+tuning = tune(worker_class=worker_class)
+workers = tuning.workers
+threads = tuning.threads
+print(tuning.report(), flush=True)
+# Admission control sizes its per-class limits from the threads each worker really has
+os.environ['ADMISSION_WORKER_THREADS'] = str(max(threads, 1))
+
+# Import Django once in the master; workers share its pages copy-on-write
+preload_app = True
+
+# The socket to bind
+bind = "0.0.0.0:8000"
+
 # Performance tuning
 worker_tmp_dir = "/dev/shm"  # Use memory for temp files to improve performance
 
@@ -30,3 +42,34 @@ errorlog = '-'
 loglevel = 'info'
 access_log_format = '%({x-forwarded-for}i)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(L)s'
 
+
+def when_ready(server):
+    server.log.info(
+        f"Capacity: {tuning.concurrency} concurrent requests, up to {tuning.concurrency} DB connections"
+    )
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the GC's reach: collections would
+    # otherwise write to every object header and un-share the pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Nothing opened in the master may be shared by workers
+    from django.db import connections
+    from django.core.cache import caches
+    connections.close_all()
+    caches.close_all()
+    random.seed()
+
+
+def worker_exit(server, worker):
+    # Write the buffered last-login / last-seen timestamps and audit events before the worker goes away
+    from api_auth.activity import flush_activity
+    from api_auth.audit import flush_audit_log
+    flush_activity()
+    flush_audit_log()
+
+    # Remember how much private memory a worker really needs for the next boot's sizing
+    record_worker_rss()
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from gunicorn_tuning import tune  # noqa: E402
+
+# Serves backend.asgi for the server-sent event stream (/api/events/) only; nginx routes everything else to web
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# One event loop per core, shrunk to what memory allows. Idle streams hold no DB connection,
+# so the number of open streams isn't bounded by the DB budget.
+tuning = tune(worker_class=worker_class)
+workers = tuning.workers
+print(tuning.report(), flush=True)
+
+# The socket to bind
+bind = "0.0.0.0:8001"
+
+# Performance tuning
+worker_tmp_dir = "/dev/shm"  # Use memory for temp files to improve performance
+
+# Process management
+timeout = 120  # Timeout for worker processes (the event loop heartbeats, open streams don't count)
+graceful_timeout = 5  # Streams never finish on their own; clients reconnect and resume from a snapshot
+max_requests = 0  # Restarting a worker drops all its streams at once
+
+# Connection settings
+backlog = 2048  # Maximum number of pending connections
+keepalive = 5  # Keep connections open for 5 seconds
+
+# Logging
+accesslog = '-'
+errorlog = '-'
+loglevel = 'info'
+
@@ -0,0 +1,204 @@
+"""
+Derive gunicorn workers/threads from the resources actually available.
+
+`cpu*2+1` workers x `cpu*2` threads ignores memory and the database: on an
+8-core droplet it asks for 272 concurrent requests, each of which may hold
+its own PostgreSQL connection. This module sizes the pool from
+
+- the memory limit of the container (cgroup) or host,
+- the private (non-shared) RSS measured on previous worker exits,
+- the database's `max_connections` (or DB_MAX_CONNECTIONS),
+- the worker class (sync / gthread / async),
+
+and reports the reasoning, so the chosen capacity is visible in the boot log.
+
+Environment overrides: GUNICORN_WORKERS, GUNICORN_THREADS, GUNICORN_WORKER_RSS_MB,
+DB_MAX_CONNECTIONS, GUNICORN_INSTANCES (app containers sharing the database),
+GUNICORN_MEMORY_FRACTION, GUNICORN_RSS_CACHE.
+"""
+import os
+from dataclasses import dataclass, field
+
+MB = 1024 * 1024
+DEFAULT_WORKER_RSS = 120 * MB  # Used until a worker has reported its real footprint
+DB_RESERVED_CONNECTIONS = 5  # superuser_reserved_connections + migrations/cron/psql
+ASYNC_WORKER_CLASSES = ('gevent', 'eventlet', 'uvicorn.workers.UvicornWorker')
+
+
+@dataclass
+class Tuning:
+    workers: int
+    threads: int
+    worker_connections: int
+    reasons: list = field(default_factory=list)
+
+    @property
+    def concurrency(self):
+        if self.worker_connections:
+            return self.workers * self.worker_connections
+        return self.workers * max(self.threads, 1)
+
+    def report(self):
+        lines = ['gunicorn tuning:'] + [f'  - {reason}' for reason in self.reasons]
+        per_worker = f'{self.worker_connections} connections' if self.worker_connections else f'{self.threads} threads'
+        lines.append(f'  => {self.workers} workers x {per_worker} = {self.concurrency} concurrent requests')
+        return '\n'.join(lines)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_count():
+    """CPUs usable by this process, honouring affinity and cgroup v2 quotas"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = _read('/sys/fs/cgroup/cpu.max')
+    if quota and not quota.startswith('max'):
+        limit, period = (int(value) for value in quota.split())
+        cpus = min(cpus, max(1, limit // period))
+    return cpus
+
+
+def memory_limit_bytes():
+    """Smallest of the cgroup memory limit (v2 or v1) and the host's total memory"""
+    limits = []
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        value = _read(path)
+        if value and value.isdigit() and int(value) < 1 << 60:
+            limits.append(int(value))
+
+    meminfo = _read('/proc/meminfo') or ''
+    for line in meminfo.splitlines():
+        if line.startswith('MemTotal:'):
+            limits.append(int(line.split()[1]) * 1024)
+    return min(limits) if limits else None
+
+
+def private_rss_bytes(pid='self'):
+    """Memory that belongs to this process alone (not shared copy-on-write with the master)"""
+    rollup = _read(f'/proc/{pid}/smaps_rollup')
+    if not rollup:
+        return None
+    private = 0
+    for line in rollup.splitlines():
+        if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+            private += int(line.split()[1]) * 1024
+    return private
+
+
+def rss_cache_path():
+    return os.getenv('GUNICORN_RSS_CACHE', '/tmp/gunicorn_worker_rss')
+
+
+def record_worker_rss():
+    """Persist this worker's private RSS (called on worker exit) for the next boot's sizing"""
+    rss = private_rss_bytes()
+    if not rss:
+        return
+    previous = _read(rss_cache_path())
+    if previous and previous.isdigit():
+        # Keep the high-water mark, decaying slowly so a one-off spike doesn't stick forever
+        rss = max(rss, int(int(previous) * 0.9))
+    try:
+        with open(rss_cache_path(), 'w') as f:
+            f.write(str(rss))
+    except OSError:
+        pass
+
+
+def worker_rss_bytes():
+    if os.getenv('GUNICORN_WORKER_RSS_MB'):
+        return int(os.environ['GUNICORN_WORKER_RSS_MB']) * MB, 'GUNICORN_WORKER_RSS_MB'
+    cached = _read(rss_cache_path())
+    if cached and cached.isdigit():
+        return int(cached), f'measured on a previous worker exit ({rss_cache_path()})'
+    return DEFAULT_WORKER_RSS, 'default estimate, no measurement yet'
+
+
+def db_max_connections():
+    """The database's max_connections, from DB_MAX_CONNECTIONS or by asking PostgreSQL"""
+    if os.getenv('DB_MAX_CONNECTIONS'):
+        return int(os.environ['DB_MAX_CONNECTIONS']), 'DB_MAX_CONNECTIONS'
+    if os.getenv('DATABASE_ENGINE', 'postgresql') != 'postgresql':
+        return None, 'not PostgreSQL'
+    try:
+        import psycopg2
+        with psycopg2.connect(
+            dbname=os.getenv('DATABASE_NAME'),
+            user=os.getenv('DATABASE_USER'),
+            password=os.getenv('DATABASE_PASSWORD'),
+            host=os.getenv('DATABASE_HOST', 'localhost'),
+            port=os.getenv('DATABASE_PORT', 5432),
+            connect_timeout=2,
+        ) as conn, conn.cursor() as cursor:
+            cursor.execute('SHOW max_connections')
+            return int(cursor.fetchone()[0]), 'SHOW max_connections'
+    except Exception as e:
+        return None, f'unknown ({e.__class__.__name__})'
+
+
+def tune(worker_class='gthread', default_threads=4):
+    reasons = []
+    cpus = cpu_count()
+    reasons.append(f'{cpus} usable CPUs')
+
+    # Start from the classic CPU-based sizing, then shrink to what memory and the DB allow
+    workers = cpus * 2 + 1
+    if worker_class == 'sync':
+        threads = 1
+    elif worker_class in ASYNC_WORKER_CLASSES:
+        threads = 1
+        workers = cpus  # One event loop per core; concurrency comes from worker_connections
+    else:
+        threads = default_threads
+    worker_connections = 1000 if worker_class in ASYNC_WORKER_CLASSES else 0
+
+    memory = memory_limit_bytes()
+    rss, rss_source = worker_rss_bytes()
+    if memory:
+        fraction = float(os.getenv('GUNICORN_MEMORY_FRACTION', 0.75))
+        # The preloaded master's pages are shared copy-on-write, so each worker only adds its private RSS
+        by_memory = max(1, int(memory * fraction - rss) // rss)
+        reasons.append(
+            f'memory limit {memory // MB} MB, {fraction:.0%} usable, '
+            f'~{rss // MB} MB private per worker ({rss_source}) -> at most {by_memory} workers'
+        )
+        workers = min(workers, by_memory)
+
+    max_connections, connections_source = db_max_connections()
+    if max_connections:
+        instances = int(os.getenv('GUNICORN_INSTANCES', 1))
+        budget = max(1, (max_connections - DB_RESERVED_CONNECTIONS) // instances)
+        reasons.append(
+            f'max_connections={max_connections} ({connections_source}), {instances} instance(s) '
+            f'-> {budget} DB connections for this instance'
+        )
+        # Django holds one connection per thread (or greenlet) that touches the DB
+        if worker_class in ASYNC_WORKER_CLASSES:
+            workers = min(workers, budget)
+            worker_connections = max(1, min(worker_connections, budget // workers))
+        else:
+            workers = min(workers, budget)
+            threads = max(1, min(threads, budget // workers))
+    else:
+        reasons.append(f'DB max_connections {connections_source}, not constraining')
+
+    if os.getenv('GUNICORN_WORKERS'):
+        workers = int(os.environ['GUNICORN_WORKERS'])
+        reasons.append('workers overridden by GUNICORN_WORKERS')
+    if os.getenv('GUNICORN_THREADS'):
+        threads = int(os.environ['GUNICORN_THREADS'])
+        reasons.append('threads overridden by GUNICORN_THREADS')
+
+    workers = max(1, workers)
+    if worker_connections:
+        reasons.append(f'{worker_connections} connections per async worker')
+    return Tuning(workers=workers, threads=threads, worker_connections=worker_connections, reasons=reasons)
@@ -0,0 +1,67 @@
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+
+logger = logging.getLogger(__name__)
+
+STATIC_STAMP_NAME = '.fastboot-static'
+IGNORE_PATTERNS = ['CVS', '.*', '*~']  # Same defaults as collectstatic
+
+
+def static_fingerprint():
+    """
+    Fingerprint of everything collectstatic would copy: relative path, size
+    and mtime of each source file, plus the storage backend in use. Stat
+    calls only, no file contents are read.
+    """
+    digest = hashlib.sha256()
+    digest.update(str(settings.STORAGES.get('staticfiles', {}).get('BACKEND', '')).encode())
+    entries = []
+    for finder in get_finders():
+        for path, storage in finder.list(IGNORE_PATTERNS):
+            stat = os.stat(storage.path(path))
+            prefix = getattr(storage, 'prefix', None) or ''
+            entries.append(f'{os.path.join(prefix, path)}:{stat.st_size}:{stat.st_mtime_ns}')
+    for entry in sorted(entries):
+        digest.update(entry.encode())
+    return digest.hexdigest()
+
+
+def _static_stamp_path():
+    return os.path.join(settings.STATIC_ROOT, STATIC_STAMP_NAME)
+
+
+def static_is_current(fingerprint):
+    try:
+        with open(_static_stamp_path()) as f:
+            return f.read().strip() == fingerprint
+    except OSError:
+        return False
+
+
+def write_static_stamp(fingerprint):
+    os.makedirs(settings.STATIC_ROOT, exist_ok=True)
+    with open(_static_stamp_path(), 'w') as f:
+        f.write(fingerprint)
+
+
+def migration_graph_fingerprint(executor):
+    """Fingerprint of all migrations on disk (the migration graph's nodes)"""
+    nodes = sorted(f'{app}.{name}' for app, name in executor.loader.graph.nodes)
+    return hashlib.sha256('\n'.join(nodes).encode()).hexdigest()
+
+
+def pending_migrations(using='default'):
+    """
+    Return (graph fingerprint, migrations that `migrate` would apply). Costs
+    one query on django_migrations instead of a full `migrate` run.
+    """
+    executor = MigrationExecutor(connections[using])
+    targets = executor.loader.graph.leaf_nodes()
+    plan = executor.migration_plan(targets)
+    return migration_graph_fingerprint(executor), [migration for migration, backwards in plan]
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from health_check.boot import pending_migrations, static_fingerprint, static_is_current, write_static_stamp
+
+
+class Command(BaseCommand):
+    help = (
+        'Container start-up in one process: run collectstatic only when static '
+        'sources changed and migrate only when migrations are pending.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Always run both steps')
+        parser.add_argument('--skip-static', action='store_true')
+        parser.add_argument('--skip-migrate', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['skip_static']:
+            self._collectstatic(options['force'])
+        if not options['skip_migrate']:
+            self._migrate(options['force'])
+
+    def _collectstatic(self, force):
+        started = time.perf_counter()
+        fingerprint = static_fingerprint()
+        if not force and static_is_current(fingerprint):
+            self.stdout.write(f"Static files unchanged, skipping collectstatic ({time.perf_counter() - started:.2f}s)")
+            return
+        call_command('collectstatic', interactive=False, verbosity=0)
+        write_static_stamp(fingerprint)
+        self.stdout.write(f"Collected static files ({time.perf_counter() - started:.2f}s)")
+
+    def _migrate(self, force):
+        started = time.perf_counter()
+        fingerprint, plan = pending_migrations()
+        if not force and not plan:
+            self.stdout.write(
+                f"No pending migrations (graph {fingerprint[:12]}), skipping migrate "
+                f"({time.perf_counter() - started:.2f}s)"
+            )
+            return
+        self.stdout.write(f"Applying {len(plan)} migration(s): {', '.join(str(m) for m in plan)}")
+        call_command('migrate', interactive=False, verbosity=1)
+        self.stdout.write(f"Migrated ({time.perf_counter() - started:.2f}s)")
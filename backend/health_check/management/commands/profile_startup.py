@@ -0,0 +1,137 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so nothing is imported yet. Times each start-up
+# phase, every AppConfig.ready() hook and the first request through the WSGI app.
+PROBE = r'''
+import importlib, json, os, sys, time
+started = time.perf_counter()
+phases = {}
+ready_hooks = {}
+
+from django.apps import config as app_config
+original_create = app_config.AppConfig.create
+
+def create(entry):
+    app = original_create(entry)
+    original_ready = app.ready
+    def timed_ready():
+        t = time.perf_counter()
+        original_ready()
+        ready_hooks[app.label] = (time.perf_counter() - t) * 1000
+    app.ready = timed_ready
+    return app
+
+app_config.AppConfig.create = staticmethod(create)
+
+# The settings module's own work, timed inside its import: reading the env file and the log folder check
+settings_steps = {}
+
+def timed_step(name, function):
+    def timed(*args, **kwargs):
+        t = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            settings_steps[name] = settings_steps.get(name, 0) + (time.perf_counter() - t) * 1000
+    return timed
+
+import environ
+environ.Env.read_env = timed_step('env file', environ.Env.read_env)
+try:
+    server_startup = importlib.import_module(os.environ['DJANGO_SETTINGS_MODULE'].rpartition('.')[0] + '.server_startup')
+    server_startup.init_log_path = timed_step('log path', server_startup.init_log_path)
+except ImportError:
+    pass
+
+t = time.perf_counter()
+from django.conf import settings
+settings.INSTALLED_APPS
+phases['settings'] = (time.perf_counter() - t) * 1000
+for name, ms in settings_steps.items():
+    phases[f'  of which {name}'] = ms
+
+t = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+phases['django.setup + middleware'] = (time.perf_counter() - t) * 1000
+
+host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h not in ('', '*')), 'localhost')
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '',
+    'SERVER_NAME': host, 'SERVER_PORT': '443', 'HTTP_HOST': host, 'SERVER_PROTOCOL': 'HTTP/1.1',
+    'HTTP_X_FORWARDED_PROTO': 'https', 'wsgi.url_scheme': 'https', 'wsgi.input': sys.stdin.buffer,
+    'wsgi.errors': sys.stderr, 'wsgi.version': (1, 0), 'wsgi.multithread': False,
+    'wsgi.multiprocess': True, 'wsgi.run_once': False,
+}
+status = []
+t = time.perf_counter()
+body = b''.join(application(environ, lambda s, h, e=None: status.append(s)))
+phases['first request (urlconf + views)'] = (time.perf_counter() - t) * 1000
+
+t = time.perf_counter()
+b''.join(application(environ, lambda s, h, e=None: None))
+phases['second request'] = (time.perf_counter() - t) * 1000
+
+print(json.dumps({
+    'phases': phases,
+    'ready_hooks': ready_hooks,
+    'status': status[0] if status else None,
+    'total_ms': (time.perf_counter() - started) * 1000,
+}))
+'''
+
+
+def parse_importtime(stderr, top):
+    """Aggregate `-X importtime` output into the slowest top-level imports"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+
+    min_depth = min((depth for depth, *_ in entries), default=0)
+    roots = [entry for entry in entries if entry[0] == min_depth]
+    return sorted(roots, key=lambda entry: entry[3], reverse=True)[:top]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure time to first request for a fresh process, broken down by '
+        'imports, settings, AppConfig.ready() hooks and the first request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/health/', help='Path of the first request')
+        parser.add_argument('--top', type=int, default=15, help='Number of slowest imports to show')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings')}
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE, options['path']],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        probe_output = result.stdout.strip().splitlines()
+        if result.returncode != 0 or not probe_output:
+            raise CommandError(f"Start-up probe failed:\n{result.stderr[-3000:]}")
+        report = json.loads(probe_output[-1])
+
+        self.stdout.write(f"Time to first response: {report['total_ms']:.0f} ms ({report['status']})")
+        self.stdout.write('\nPhases:')
+        for phase, ms in report['phases'].items():
+            self.stdout.write(f"  {phase:<36}{ms:>9.1f} ms")
+
+        self.stdout.write('\nAppConfig.ready() hooks:')
+        for label, ms in sorted(report['ready_hooks'].items(), key=lambda item: item[1], reverse=True):
+            self.stdout.write(f"  {label:<36}{ms:>9.1f} ms")
+
+        self.stdout.write(f"\nSlowest top-level imports (cumulative):")
+        for depth, name, self_us, cumulative_us in parse_importtime(result.stderr, options['top']):
+            self.stdout.write(f"  {name:<36}{cumulative_us / 1000:>9.1f} ms")
@@ -0,0 +1,192 @@
+"""
+On-demand sampling profiler for live workers.
+
+A background thread reads the stacks of the profiled threads every
+PROFILER_INTERVAL seconds (sys._current_frames); the profiled code runs
+unmodified, so the overhead is that of the sampler thread alone. Two
+staff-only triggers:
+
+- a request carrying the PROFILER_HEADER header (`X-Profile: 1`) is
+  profiled on its own by ProfilingMiddleware; the report name comes back in
+  that header,
+- POST /health/profile/?seconds=N samples every thread of the worker for N
+  seconds (at most PROFILER_MAX_SECONDS), see health_check.views.
+
+Each profile writes two files to PROFILER_DIR (under LOG_FILE_FOLDER):
+`<name>.collapsed`, one `frame;frame;frame count` line per stack for
+flamegraph.pl / speedscope, and `<name>.txt`, the top PROFILER_TOP_N
+functions by own and total samples.
+
+Only one profile runs at a time per worker, and a new one may start
+PROFILER_COOLDOWN seconds after the last on any worker: the cooldown lives in
+the default cache, which CACHE_URL points at the shared Redis in production.
+
+Most requests never carry the header, and those that do are checked
+cheapest first: the header value, then the access token's signature and
+staff claim (api_auth.tokens), and only then the user row.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api_auth.tokens import STAFF_CLAIM
+
+logger = logging.getLogger(__name__)
+
+COOLDOWN_CACHE_KEY = 'health_check:profiler:last_started'
+_running = threading.Lock()
+
+
+def _frame_name(frame):
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+class SamplingProfiler:
+    def __init__(self, interval=None, thread_ids=None):
+        self.interval = interval or settings.PROFILER_INTERVAL
+        self.thread_ids = thread_ids  # None: every thread but the sampler and the caller
+        self.stacks = Counter()
+        self.samples = 0
+        self._excluded = set()
+        self._stop = threading.Event()
+        self._thread = None
+        self._switch_interval = None
+
+    def start(self):
+        self._excluded = {threading.get_ident()}
+        # The sampler can't wake up more often than the interpreter hands over the GIL
+        self._switch_interval = sys.getswitchinterval()
+        if self.interval < self._switch_interval:
+            sys.setswitchinterval(self.interval)
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if self.thread_ids is None:
+                    if thread_id == own_id or thread_id in self._excluded:
+                        continue
+                elif thread_id not in self.thread_ids:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Stacks in the collapsed format of flamegraph.pl, outermost frame first"""
+        return [f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()]
+
+    def top(self, n=None):
+        """(function, own samples, total samples) of the `n` functions with the most own samples"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for name in set(stack):
+                total[name] += count
+        return [(name, samples, total[name]) for name, samples in own.most_common(n or settings.PROFILER_TOP_N)]
+
+    def write_report(self, label):
+        """Write the .collapsed and .txt files; returns the report name (file name without extension)"""
+        os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{label}"
+        path = os.path.join(settings.PROFILER_DIR, name)
+        with open(f'{path}.collapsed', 'w') as f:
+            f.write('\n'.join(self.collapsed()) + '\n')
+
+        stacks = sum(self.stacks.values()) or 1
+        lines = [
+            f"{label}: {self.samples} samples every {self.interval * 1000:.1f} ms, {stacks} stacks",
+            f"{'own %':>7}{'total %':>9}  function",
+        ]
+        lines += [
+            f"{own / stacks:>7.1%}{total / stacks:>9.1%}  {function}" for function, own, total in self.top()
+        ]
+        with open(f'{path}.txt', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        logger.info(f"Profile written to {path}.collapsed / .txt")
+        return name
+
+
+def acquire_profiler():
+    """Claim the right to profile now; False while another profile runs or during the cooldown"""
+    if not _running.acquire(blocking=False):
+        return False
+    # Shared by every worker, so the cooldown holds across the deployment
+    if not caches['default'].add(COOLDOWN_CACHE_KEY, time.time(), timeout=settings.PROFILER_COOLDOWN):
+        _running.release()
+        return False
+    return True
+
+
+def release_profiler():
+    _running.release()
+
+
+def is_staff_request(request):
+    """Staff by admin session or by JWT; the API authenticates in DRF views, after the middleware"""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if header.startswith('Bearer '):
+        try:
+            # Signature and expiry only; no query unless the token says staff
+            token = AccessToken(header[len('Bearer '):])
+        except TokenError:
+            return False
+        if not token.get(STAFF_CLAIM):
+            return False
+        try:
+            # The claim may outlive a revoked role, so the row has the final say
+            return JWTAuthentication().get_user(token).is_staff
+        except AuthenticationFailed:
+            return False
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated and user.is_staff
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = f"HTTP_{settings.PROFILER_HEADER.upper().replace('-', '_')}"
+
+    def __call__(self, request):
+        if request.META.get(self.header) != '1' or not is_staff_request(request):
+            return self.get_response(request)
+        if not acquire_profiler():
+            response = self.get_response(request)
+            response[settings.PROFILER_HEADER] = 'rate-limited'
+            return response
+        try:
+            with SamplingProfiler(thread_ids={threading.get_ident()}) as profiler:
+                response = self.get_response(request)
+            label = f"{request.method}{request.path.replace('/', '_')}".rstrip('_')
+            response[settings.PROFILER_HEADER] = profiler.write_report(label)
+            return response
+        finally:
+            release_profiler()
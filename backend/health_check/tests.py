@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api_auth.tokens import TieredRefreshToken
+
+from .profiler import SamplingProfiler
+
+User = get_user_model()
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class SamplingProfilerTests(TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        self.enterContext(override_settings(PROFILER_DIR=self.profile_dir, PROFILER_COOLDOWN=60))
+        cache.clear()
+        self.staff = User.objects.create_superuser(email='staff@example.com', password='pw')
+        self.user = User.objects.create_user(email='user@example.com', password='pw')
+
+    def bearer(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {TieredRefreshToken.for_user(user).access_token}'}
+
+    def test_collapsed_stacks_and_top_functions(self):
+        with SamplingProfiler(interval=0.001, thread_ids={threading.get_ident()}) as profiler:
+            busy_loop(0.1)
+
+        self.assertGreater(profiler.samples, 0)
+        self.assertTrue(any('health_check.tests:busy_loop' in line for line in profiler.collapsed()))
+        self.assertIn('health_check.tests:busy_loop', [function for function, _, _ in profiler.top()])
+
+        name = profiler.write_report('test')
+        self.assertTrue(os.path.exists(os.path.join(self.profile_dir, f'{name}.collapsed')))
+        self.assertTrue(os.path.exists(os.path.join(self.profile_dir, f'{name}.txt')))
+
+    def test_header_profiles_staff_requests_once_per_cooldown(self):
+        response = self.client.get('/health/', HTTP_X_PROFILE='1', **self.bearer(self.user))
+        self.assertNotIn('X-Profile', response)
+
+        response = self.client.get('/health/', HTTP_X_PROFILE='1', **self.bearer(self.staff))
+        self.assertTrue(os.path.exists(os.path.join(self.profile_dir, response['X-Profile'] + '.txt')))
+
+        response = self.client.get('/health/', HTTP_X_PROFILE='1', **self.bearer(self.staff))
+        self.assertEqual(response['X-Profile'], 'rate-limited')
+
+    def test_non_staff_tokens_are_turned_down_without_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/health/', HTTP_X_PROFILE='1', **self.bearer(self.user))
+            self.client.get('/health/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION='Bearer forged')
+            self.client.get('/health/', HTTP_X_PROFILE='yes', **self.bearer(self.staff))
+        self.assertNotIn('X-Profile', response)
+
+        # A staff claim issued before the role was revoked is checked against the user row
+        demoted = self.bearer(self.staff)
+        User.objects.filter(pk=self.staff.pk).update(is_staff=False)
+        response = self.client.get('/health/', HTTP_X_PROFILE='1', **demoted)
+        self.assertNotIn('X-Profile', response)
+
+    def test_worker_profile_endpoint_is_staff_only_and_rate_limited(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.post('/health/profile/?seconds=0.05').status_code, 403)
+
+        client.force_authenticate(self.staff)
+        self.assertEqual(client.post('/health/profile/?seconds=3600').status_code, 400)
+        response = client.post('/health/profile/?seconds=0.05')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(os.path.exists(os.path.join(self.profile_dir, response.json()['report'] + '.collapsed')))
+        self.assertEqual(client.post('/health/profile/?seconds=0.05').status_code, 429)
@@ -4,4 +4,6 @@ from . import views
 urlpatterns = [
     path('', views.health_check_basic, name='health_check_basic'),
     path('db/', views.health_check_db, name='health_check_db'),
+    path('profile/', views.health_check_profile, name='health_check_profile'),
+    path('cache/', views.health_check_cache, name='health_check_cache'),
 ]
\ No newline at end of file
@@ -1,9 +1,16 @@
+from django.conf import settings
 from django.http import JsonResponse
 from django.db import connections
 from django.db.utils import OperationalError
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 import logging
 import time
 
+from backend.caching import two_tier_cache
+from backend.db_router import replica_monitor
+from .profiler import SamplingProfiler, acquire_profiler, release_profiler
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,7 +32,10 @@ def health_check_db(request):
     start_time = time.time()
     try:
         # Try to connect to each database and execute a simple query
+        # (replicas are reported below but never fail the check: reads fall back to the primary)
         for name in connections:
+            if name in settings.REPLICA_DATABASES:
+                continue
             cursor = connections[name].cursor()
             cursor.execute("SELECT 1")
             row = cursor.fetchone()
@@ -39,12 +49,15 @@ def health_check_db(request):
                 }, status=500)
         
         response_time = time.time() - start_time
-        return JsonResponse({
+        data = {
             'status': 'ok',
             'service': 'api',
             'database_response_time': response_time,
             'timestamp': time.time()
-        })
+        }
+        if settings.REPLICA_DATABASES:
+            data['replicas'] = replica_monitor.check()
+        return JsonResponse(data)
     
     except OperationalError as e:
         logger.error(f"Database health check failed: {str(e)}")
@@ -62,3 +75,56 @@ def health_check_db(request):
             'message': f'Unexpected error: {str(e)}',
             'timestamp': time.time()
         }, status=500)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def health_check_profile(request):
+    """
+    Samples every thread of this worker for `seconds` (staff only) and writes
+    the profile to the log folder, see health_check.profiler
+    """
+    try:
+        seconds = float(request.query_params.get('seconds', 10))
+    except ValueError:
+        seconds = 0
+    if not 0 < seconds <= settings.PROFILER_MAX_SECONDS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'seconds must be between 0 and {settings.PROFILER_MAX_SECONDS}',
+        }, status=400)
+
+    if not acquire_profiler():
+        return JsonResponse({
+            'status': 'error',
+            'message': 'A profile is running or was taken recently, retry later',
+        }, status=429, headers={'Retry-After': str(settings.PROFILER_COOLDOWN)})
+    try:
+        with SamplingProfiler() as profiler:
+            time.sleep(seconds)
+        report = profiler.write_report(f'worker-{seconds:g}s')
+    finally:
+        release_profiler()
+
+    return JsonResponse({
+        'status': 'ok',
+        'report': report,
+        'samples': profiler.samples,
+        'top': [
+            {'function': function, 'own': own, 'total': total} for function, own, total in profiler.top(10)
+        ],
+        'timestamp': time.time()
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def health_check_cache(request):
+    """
+    Hit rates of this worker's two-tier cache (staff only), see backend.caching
+    """
+    return JsonResponse({
+        'status': 'ok',
+        'cache': two_tier_cache.stats(),
+        'timestamp': time.time()
+    })
@@ -1,3 +1,54 @@
 from django.contrib import admin
 
-# Register your models here.
+from backend.admin_utils import LargeTableAdmin
+from .models import SubscriptionPlan, Feature, PlanFeature, UserSubscription, PaymentEvent
+
+
+class PlanFeatureInline(admin.TabularInline):
+    model = PlanFeature
+    autocomplete_fields = ('feature',)
+    extra = 0
+
+    def get_queryset(self, request):
+        # Row labels (PlanFeature.__str__) read plan.name and feature.name
+        return super().get_queryset(request).select_related('plan', 'feature')
+
+
+@admin.register(SubscriptionPlan)
+class SubscriptionPlanAdmin(admin.ModelAdmin):
+    list_display = ('name', 'tier', 'billing_cycle', 'price', 'is_active')
+    list_filter = ('tier', 'billing_cycle', 'is_active')
+    inlines = (PlanFeatureInline,)
+
+
+@admin.register(Feature)
+class FeatureAdmin(admin.ModelAdmin):
+    list_display = ('name', 'feature_type', 'credit_cost', 'display_order', 'is_active')
+    list_filter = ('feature_type', 'is_active')
+    search_fields = ('name',)  # Also used by the plan feature autocomplete
+
+
+@admin.register(PlanFeature)
+class PlanFeatureAdmin(LargeTableAdmin):
+    list_display = ('plan', 'feature', 'is_highlighted')
+    list_filter = ('plan', 'is_highlighted')
+    list_select_related = ('plan', 'feature')
+    raw_id_fields = ('feature',)
+
+
+@admin.register(UserSubscription)
+class UserSubscriptionAdmin(LargeTableAdmin):
+    list_display = ('user', 'plan', 'status', 'current_period_end', 'cancel_at_period_end', 'provider')
+    list_filter = ('status', 'plan', 'provider')
+    list_select_related = ('user', 'plan')
+    indexed_search_fields = ('user__email',)
+    raw_id_fields = ('user',)
+    ordering = ('-id',)
+
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(LargeTableAdmin):
+    list_display = ('provider', 'event_id', 'event_type', 'status', 'received_at', 'processed_at')
+    list_filter = ('provider', 'status')
+    ordering = ('-id',)
+    readonly_fields = ('payload', 'received_at')
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TierEntitlements:
+    """Features granted to one tier, resolved from its active plans"""
+    tier: str
+    feature_ids: frozenset = field(default_factory=frozenset)
+    credit_costs: dict = field(default_factory=dict)  # feature id -> credits per use
+
+    def has_feature(self, feature_id):
+        return feature_id in self.feature_ids
+
+    def credit_cost(self, feature_id):
+        return self.credit_costs.get(feature_id, 0)
+
+
+@dataclass(frozen=True)
+class EntitlementIndex:
+    """Immutable snapshot of the catalog: tier -> TierEntitlements"""
+    tiers: dict
+    feature_ids_by_name: dict
+    built_at: float
+
+    def for_tier(self, tier):
+        return self.tiers.get(tier) or TierEntitlements(tier=tier)
+
+    def feature_id(self, feature_name):
+        return self.feature_ids_by_name.get(feature_name)
+
+    def has_feature(self, tier, feature_name):
+        feature_id = self.feature_id(feature_name)
+        return feature_id is not None and self.for_tier(tier).has_feature(feature_id)
+
+    def credit_cost(self, tier, feature_name):
+        feature_id = self.feature_id(feature_name)
+        if feature_id is None:
+            return 0
+        return self.for_tier(tier).credit_cost(feature_id)
+
+
+def build_entitlement_index():
+    """
+    Walk the catalog once (a single joined query) and build a new index.
+    Only active plans and active features grant entitlements.
+    """
+    from .models import Feature
+
+    feature_ids_by_name = {}
+    tier_features = {}
+    tier_costs = {}
+    # Every active feature with each plan it is on (LEFT JOIN: plan columns are None for features on no plan)
+    rows = Feature.objects.filter(is_active=True).values_list(
+        'id', 'name', 'feature_type', 'credit_cost', 'planfeature__plan__tier', 'planfeature__plan__is_active',
+    )
+
+    for feature_id, name, feature_type, credit_cost, tier, plan_is_active in rows:
+        feature_ids_by_name[name] = feature_id
+        if not plan_is_active:
+            continue
+        tier_features.setdefault(tier, set()).add(feature_id)
+        if feature_type == 'credit':
+            tier_costs.setdefault(tier, {})[feature_id] = credit_cost
+
+    tiers = {
+        tier: TierEntitlements(
+            tier=tier,
+            feature_ids=frozenset(feature_ids),
+            credit_costs=tier_costs.get(tier, {}),
+        )
+        for tier, feature_ids in tier_features.items()
+    }
+    return EntitlementIndex(
+        tiers=tiers,
+        feature_ids_by_name=feature_ids_by_name,
+        built_at=time.monotonic(),
+    )
+
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def _is_fresh(index):
+    ttl = getattr(settings, 'ENTITLEMENT_INDEX_TTL', 300)
+    return index is not None and (ttl is None or time.monotonic() - index.built_at < ttl)
+
+
+def get_entitlement_index():
+    """
+    Return the current index, building it on first use.
+
+    The snapshot is swapped in with a single reference assignment, so readers
+    never see a half-built index. Changes made by other worker processes are
+    picked up once the snapshot is older than ENTITLEMENT_INDEX_TTL seconds.
+    """
+    index = _index
+    if _is_fresh(index):
+        return index
+
+    with _build_lock:
+        # Another thread may have rebuilt it while we waited for the lock
+        if not _is_fresh(_index):
+            rebuild_entitlement_index()
+        return _index
+
+
+def rebuild_entitlement_index():
+    global _index
+    _index = build_entitlement_index()
+    logger.info(f"Entitlement index rebuilt for tiers: {sorted(_index.tiers)}")
+    return _index
+
+
+def invalidate_entitlement_index():
+    """Drop the snapshot; the next lookup rebuilds it"""
+    global _index
+    _index = None
+
+
+def user_has_feature(user, feature_name):
+    if not user or not user.is_authenticated:
+        return False
+    return get_entitlement_index().has_feature(user.tier, feature_name)
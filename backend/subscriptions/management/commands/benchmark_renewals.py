@@ -0,0 +1,108 @@
+import multiprocessing
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.utils import timezone
+
+from subscriptions.models import SubscriptionPlan, UserSubscription
+from subscriptions.renewals import process_due_subscriptions
+
+User = get_user_model()
+
+EMAIL_PREFIX = 'bench-renewal-'
+
+
+def _run_worker(args):
+    now, chunk_size = args
+    return process_due_subscriptions(now=now, chunk_size=chunk_size)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed N due subscriptions and time the renewal scheduler over them. '
+        'Run it against a disposable database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1_000_000)
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--seed-batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--cleanup', action='store_true', help='Delete the seeded rows afterwards')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if connection.vendor == 'sqlite' and workers > 1:
+            self.stdout.write('SQLite has no row-level locks, running a single worker')
+            workers = 1
+
+        now = timezone.now()
+        started = time.perf_counter()
+        self._seed(options['count'], options['seed_batch_size'], options['seed'], now)
+        self.stdout.write(f"Seeded {options['count']} due subscriptions in {time.perf_counter() - started:.1f}s")
+
+        # Forked workers must not share the parent's database connection
+        connections.close_all()
+        started = time.perf_counter()
+        jobs = [(now, options['chunk_size'])] * workers
+        if workers == 1:
+            processed = [_run_worker(jobs[0])]
+        else:
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                processed = pool.map(_run_worker, jobs)
+        elapsed = time.perf_counter() - started
+
+        total = sum(processed)
+        remaining = UserSubscription.objects.filter(
+            user__email__startswith=EMAIL_PREFIX, next_billing_at__lte=now
+        ).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {total} subscriptions with {workers} worker(s) in {elapsed:.1f}s "
+            f"({total / elapsed:,.0f}/s), per worker: {processed}, still due: {remaining}"
+        ))
+
+        if options['cleanup']:
+            UserSubscription.objects.filter(user__email__startswith=EMAIL_PREFIX).delete()
+            User.objects.filter(email__startswith=EMAIL_PREFIX).delete()
+
+    def _seed(self, count, batch_size, seed, now):
+        rng = random.Random(seed)
+        plans = [
+            SubscriptionPlan.objects.get_or_create(
+                tier=tier, billing_cycle=cycle,
+                defaults={'name': f'{tier.title()} {cycle}', 'price': price},
+            )[0]
+            for tier, cycle, price in [('basic', 'monthly', Decimal('4.99')), ('premium', 'annual', Decimal('99.00'))]
+        ]
+        password = make_password(None)
+
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            users = User.objects.bulk_create([
+                User(email=f'{EMAIL_PREFIX}{offset + i}@example.invalid', password=password, tier='free')
+                for i in range(size)
+            ])
+
+            subscriptions = []
+            for user in users:
+                plan = rng.choice(plans)
+                period_end = now - timedelta(minutes=rng.randint(1, 60 * 24 * 30))
+                roll = rng.random()
+                subscriptions.append(UserSubscription(
+                    user=user,
+                    plan=plan,
+                    status='trialing' if roll < 0.1 else 'past_due' if roll < 0.15 else 'active',
+                    cancel_at_period_end=0.15 <= roll < 0.25,
+                    started_at=period_end - timedelta(days=30),
+                    current_period_start=period_end - timedelta(days=30),
+                    current_period_end=period_end,
+                    next_billing_at=period_end,
+                ))
+            UserSubscription.objects.bulk_create(subscriptions)
@@ -0,0 +1,132 @@
+import json
+import random
+import secrets
+import statistics
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from subscriptions.models import PaymentEvent
+from subscriptions.webhooks import SIGNATURE_HEADERS, sign_payload
+
+EVENT_PREFIX = 'evt_loadtest_'
+
+
+def build_event(provider, number, subscription_count):
+    subscription_ref = f'sub_loadtest_{number % subscription_count}'
+    if provider == 'stripe':
+        return {
+            'id': f'{EVENT_PREFIX}{number}',
+            'type': random.choice(['invoice.paid', 'invoice.payment_failed']),
+            'data': {'object': {'object': 'invoice', 'subscription': subscription_ref}},
+        }
+    return {
+        'id': f'{EVENT_PREFIX}{number}',
+        'event_type': random.choice(['PAYMENT.SALE.COMPLETED', 'BILLING.SUBSCRIPTION.PAYMENT.FAILED']),
+        'resource_type': 'sale',
+        'resource': {'billing_agreement_id': subscription_ref},
+    }
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire a burst of signed payment webhooks (including provider-style '
+        'redeliveries) and report intake latency and dedup results.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provider', choices=sorted(SIGNATURE_HEADERS), default='stripe')
+        parser.add_argument('--events', type=int, default=2000, help='Unique events to send')
+        parser.add_argument('--duplicate-ratio', type=float, default=0.2,
+                            help='Share of extra deliveries that repeat an already sent event')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--subscriptions', type=int, default=200,
+                            help='Distinct subscription ids the events are spread over')
+        parser.add_argument('--url', help='Base URL of a running server; default is in-process')
+        parser.add_argument('--secret', help='Webhook secret of the target server (required with --url)')
+
+    def handle(self, *args, **options):
+        provider = options['provider']
+        if options['url'] and not options['secret']:
+            raise CommandError('--secret is required with --url')
+        secret = options['secret'] or secrets.token_hex(16)
+
+        events = [build_event(provider, n, options['subscriptions']) for n in range(options['events'])]
+        deliveries = events + random.sample(events, int(len(events) * options['duplicate_ratio']))
+        random.shuffle(deliveries)
+        bodies = [json.dumps(event).encode() for event in deliveries]
+
+        PaymentEvent.objects.filter(event_id__startswith=EVENT_PREFIX).delete()
+        path = reverse('payment_webhook', kwargs={'provider': provider})
+        send = self._remote_sender(options['url'] + path) if options['url'] else self._local_sender(path)
+
+        secrets_override = {**settings.PAYMENT_WEBHOOK_SECRETS, provider: secret}
+        with override_settings(PAYMENT_WEBHOOK_SECRETS=secrets_override):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                results = list(pool.map(
+                    lambda body: send(body, sign_payload(secret, body), provider), bodies
+                ))
+            elapsed = time.perf_counter() - started
+
+        latencies = [latency * 1000 for _, latency in results]
+        statuses = Counter(status for status, _ in results)
+        stored = PaymentEvent.objects.filter(provider=provider, event_id__startswith=EVENT_PREFIX).count()
+
+        self.stdout.write(
+            f"{len(bodies)} deliveries ({len(events)} unique) in {elapsed:.2f}s "
+            f"-> {len(bodies) / elapsed:,.0f} req/s at concurrency {options['concurrency']}\n"
+            f"latency ms: p50={percentile(latencies, 50):.1f} p95={percentile(latencies, 95):.1f} "
+            f"p99={percentile(latencies, 99):.1f} max={max(latencies):.1f} mean={statistics.mean(latencies):.1f}\n"
+            f"status codes: {dict(statuses)}\n"
+            f"stored events: {stored} (expected {len(events)})"
+        )
+        if stored != len(events):
+            raise CommandError('Stored event count does not match unique deliveries')
+
+    def _local_sender(self, path):
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h not in ('', '*')), 'localhost')
+
+        def send(body, signature, provider):
+            client = Client(HTTP_HOST=host)
+            started = time.perf_counter()
+            response = client.post(
+                path, body, content_type='application/json', secure=True,
+                **{SIGNATURE_HEADERS[provider]: signature},
+            )
+            latency = time.perf_counter() - started
+            connection.close()
+            return response.status_code, latency
+
+        return send
+
+    def _remote_sender(self, url):
+        def send(body, signature, provider):
+            header = SIGNATURE_HEADERS[provider][len('HTTP_'):].replace('_', '-').title()
+            request = urllib.request.Request(
+                url, data=body, method='POST',
+                headers={'Content-Type': 'application/json', header: signature},
+            )
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            return status, time.perf_counter() - started
+
+        return send
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from subscriptions.payment_events import DEFAULT_BATCH_SIZE, process_all_pending_events
+
+
+class Command(BaseCommand):
+    help = 'Apply pending payment webhook events to user subscriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Events claimed per transaction')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new events instead of exiting')
+        parser.add_argument('--interval', type=float, default=1,
+                            help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            handled = process_all_pending_events(batch_size=options['batch_size'])
+            if handled or not options['loop']:
+                self.stdout.write(f"Handled {handled} payment events")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
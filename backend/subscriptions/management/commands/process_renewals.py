@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from subscriptions.renewals import DEFAULT_CHUNK_SIZE, process_due_subscriptions
+
+
+class Command(BaseCommand):
+    help = 'Renew, convert trials and expire subscriptions whose billing date has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Subscriptions claimed per transaction')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for due subscriptions instead of exiting')
+        parser.add_argument('--interval', type=float, default=60,
+                            help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_due_subscriptions(chunk_size=options['chunk_size'])
+            self.stdout.write(f"Processed {processed} due subscriptions")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
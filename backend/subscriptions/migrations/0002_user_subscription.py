@@ -0,0 +1,43 @@
+# Generated by Django 5.0 on 2026-10-19 17:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('trialing', 'Trialing'), ('active', 'Active'), ('past_due', 'Past Due'), ('canceled', 'Canceled'), ('expired', 'Expired')], default='active', max_length=20)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('trial_end', models.DateTimeField(blank=True, null=True)),
+                ('current_period_start', models.DateTimeField()),
+                ('current_period_end', models.DateTimeField()),
+                ('next_billing_at', models.DateTimeField(blank=True, null=True)),
+                ('cancel_at_period_end', models.BooleanField(default=False)),
+                ('canceled_at', models.DateTimeField(blank=True, null=True)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='subscriptions', to='subscriptions.subscriptionplan')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'user_subscription',
+                'indexes': [models.Index(fields=['current_period_end'], name='user_sub_period_end_idx'), models.Index(condition=models.Q(('next_billing_at__isnull', False)), fields=['next_billing_at'], name='user_sub_next_billing_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='usersubscription',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['trialing', 'active', 'past_due', 'canceled'])), fields=('user',), name='user_sub_one_live_per_user'),
+        ),
+    ]
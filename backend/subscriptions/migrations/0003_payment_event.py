@@ -0,0 +1,46 @@
+# Generated by Django 5.0 on 2026-10-19 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0002_user_subscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersubscription',
+            name='provider',
+            field=models.CharField(blank=True, choices=[('stripe', 'Stripe'), ('paypal', 'PayPal')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='usersubscription',
+            name='provider_subscription_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('stripe', 'Stripe'), ('paypal', 'PayPal')], max_length=20)),
+                ('event_id', models.CharField(max_length=255)),
+                ('event_type', models.CharField(max_length=100)),
+                ('subscription_ref', models.CharField(blank=True, max_length=100)),
+                ('payload', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('ignored', 'Ignored'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'payment_event',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='payment_event_pending_idx'), models.Index(fields=['subscription_ref', 'id'], name='payment_event_sub_ref_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='paymentevent',
+            constraint=models.UniqueConstraint(fields=('provider', 'event_id'), name='payment_event_provider_event_uniq'),
+        ),
+    ]
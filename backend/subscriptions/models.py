@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 class SubscriptionPlan(models.Model):
     """Defines available subscription plans"""
@@ -69,3 +71,94 @@ class PlanFeature(models.Model):
     
     def __str__(self):
         return f"{self.plan.name} - {self.feature.name}"
+
+
+class UserSubscription(models.Model):
+    """Links a user to a subscription plan over time"""
+    STATUS_CHOICES = [
+        ('trialing', 'Trialing'),
+        ('active', 'Active'),
+        ('past_due', 'Past Due'),
+        ('canceled', 'Canceled'),  # Canceled by the user, access kept until period end
+        ('expired', 'Expired'),
+    ]
+    LIVE_STATUSES = ('trialing', 'active', 'past_due', 'canceled')
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='subscriptions')
+    plan = models.ForeignKey(SubscriptionPlan, on_delete=models.PROTECT, related_name='subscriptions')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    started_at = models.DateTimeField(default=timezone.now)
+    trial_end = models.DateTimeField(null=True, blank=True)
+    current_period_start = models.DateTimeField()
+    current_period_end = models.DateTimeField()
+    next_billing_at = models.DateTimeField(null=True, blank=True)  # None once nothing is due anymore
+    cancel_at_period_end = models.BooleanField(default=False)
+    canceled_at = models.DateTimeField(null=True, blank=True)
+    ended_at = models.DateTimeField(null=True, blank=True)
+    provider = models.CharField(max_length=20, choices=[('stripe', 'Stripe'), ('paypal', 'PayPal')], blank=True)
+    provider_subscription_id = models.CharField(max_length=100, blank=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.plan_id} ({self.status})"
+
+    class Meta:
+        db_table = 'user_subscription'
+        indexes = [
+            models.Index(fields=['current_period_end'], name='user_sub_period_end_idx'),
+            # Only rows the renewal scheduler still has to look at
+            models.Index(
+                fields=['next_billing_at'],
+                name='user_sub_next_billing_idx',
+                condition=models.Q(next_billing_at__isnull=False),
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(status__in=['trialing', 'active', 'past_due', 'canceled']),
+                name='user_sub_one_live_per_user',
+            ),
+        ]
+
+
+class PaymentEvent(models.Model):
+    """Raw payment provider webhook event, appended on intake and processed asynchronously"""
+    PROVIDER_CHOICES = [
+        ('stripe', 'Stripe'),
+        ('paypal', 'PayPal'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),  # Event type we don't act on, or unknown subscription
+        ('failed', 'Failed'),
+    ]
+
+    provider = models.CharField(max_length=20, choices=PROVIDER_CHOICES)
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100)
+    subscription_ref = models.CharField(max_length=100, blank=True)  # Provider subscription id
+    payload = models.TextField()  # Raw request body, exactly as signed
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.provider}:{self.event_id} ({self.event_type})"
+
+    class Meta:
+        db_table = 'payment_event'
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_id'], name='payment_event_provider_event_uniq'),
+        ]
+        indexes = [
+            # Processor queue: pending events in arrival order
+            models.Index(
+                fields=['id'],
+                name='payment_event_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+            models.Index(fields=['subscription_ref', 'id'], name='payment_event_sub_ref_idx'),
+        ]
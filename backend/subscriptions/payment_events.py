@@ -0,0 +1,174 @@
+import json
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from api_auth.utils import publish_tier_changes
+from .models import PaymentEvent, UserSubscription
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+DEFAULT_BATCH_SIZE = 200
+
+# Provider event type -> what it means for our subscription record
+EVENT_ACTIONS = {
+    'stripe': {
+        'invoice.paid': 'payment_succeeded',
+        'invoice.payment_succeeded': 'payment_succeeded',
+        'invoice.payment_failed': 'payment_failed',
+        'customer.subscription.deleted': 'ended',
+    },
+    'paypal': {
+        'BILLING.SUBSCRIPTION.ACTIVATED': 'payment_succeeded',
+        'PAYMENT.SALE.COMPLETED': 'payment_succeeded',
+        'BILLING.SUBSCRIPTION.PAYMENT.FAILED': 'payment_failed',
+        'BILLING.SUBSCRIPTION.SUSPENDED': 'payment_failed',
+        'BILLING.SUBSCRIPTION.CANCELLED': 'canceled',
+        'BILLING.SUBSCRIPTION.EXPIRED': 'ended',
+    },
+}
+
+
+def resolve_action(event):
+    if event.provider == 'stripe' and event.event_type == 'customer.subscription.updated':
+        obj = json.loads(event.payload)['data']['object']
+        return 'canceled' if obj.get('cancel_at_period_end') else None
+    return EVENT_ACTIONS.get(event.provider, {}).get(event.event_type)
+
+
+def apply_action(subscription, action, now):
+    """Apply one event to the subscription. Returns the updated field names."""
+    if action == 'payment_succeeded':
+        if subscription.status == 'expired':
+            return []
+        if subscription.status == 'past_due':
+            subscription.next_billing_at = subscription.current_period_end
+        subscription.status = 'canceled' if subscription.cancel_at_period_end else 'active'
+        return ['status', 'next_billing_at']
+
+    if action == 'payment_failed':
+        if subscription.status == 'expired':
+            return []
+        # The renewal scheduler expires it if no payment arrives within the grace period
+        subscription.status = 'past_due'
+        subscription.next_billing_at = now + timedelta(days=settings.PAYMENT_PAST_DUE_GRACE_DAYS)
+        return ['status', 'next_billing_at']
+
+    if action == 'canceled':
+        if subscription.status == 'expired':
+            return []
+        subscription.status = 'canceled'
+        subscription.cancel_at_period_end = True
+        subscription.canceled_at = subscription.canceled_at or now
+        return ['status', 'cancel_at_period_end', 'canceled_at']
+
+    if action == 'ended':
+        subscription.status = 'expired'
+        subscription.ended_at = subscription.ended_at or now
+        subscription.next_billing_at = None
+        return ['status', 'ended_at', 'next_billing_at']
+
+    return []
+
+
+def claim_batch(batch_size):
+    """
+    Lock a batch of pending events (FOR UPDATE SKIP LOCKED, so workers never
+    block each other) and keep only those that are the oldest pending events
+    for their subscription. If an earlier event for the same subscription is
+    locked by another worker, the later ones are left for the next pass, so
+    each subscription's events are always applied in arrival order.
+    """
+    events = list(
+        PaymentEvent.objects
+        .select_for_update(skip_locked=True)
+        .filter(status='pending')
+        .order_by('id')[:batch_size]
+    )
+    if not events:
+        return []
+
+    claimed_ids = {event.pk for event in events}
+    refs = {event.subscription_ref for event in events if event.subscription_ref}
+    blocked = set(
+        PaymentEvent.objects
+        .filter(status='pending', subscription_ref__in=refs, id__lt=max(claimed_ids))
+        .exclude(pk__in=claimed_ids)
+        .values_list('provider', 'subscription_ref')
+    )
+    return [event for event in events if (event.provider, event.subscription_ref) not in blocked]
+
+
+def process_pending_events(batch_size=DEFAULT_BATCH_SIZE):
+    """Process one batch of pending events. Returns the number of events handled."""
+    now = timezone.now()
+    with transaction.atomic():
+        events = claim_batch(batch_size)
+        if not events:
+            return 0
+
+        grouped = defaultdict(list)
+        for event in events:
+            grouped[(event.provider, event.subscription_ref)].append(event)
+
+        subscriptions = {}
+        for provider in {provider for provider, _ in grouped}:
+            refs = [ref for p, ref in grouped if p == provider and ref]
+            for subscription in (
+                UserSubscription.objects.select_related('plan')
+                .filter(provider=provider, provider_subscription_id__in=refs)
+            ):
+                subscriptions[(provider, subscription.provider_subscription_id)] = subscription
+
+        outcomes = defaultdict(list)  # (status, error) -> event ids
+        for key, subscription_events in grouped.items():
+            subscription = subscriptions.get(key)
+            try:
+                with transaction.atomic():
+                    _apply_events(subscription, subscription_events, now, outcomes)
+            except Exception as e:
+                logger.error(f"Failed to process payment events for {key}: {str(e)}")
+                outcomes[('failed', str(e))].extend(event.pk for event in subscription_events)
+
+        for (event_status, error), event_ids in outcomes.items():
+            PaymentEvent.objects.filter(pk__in=event_ids).update(
+                status=event_status, error=error, processed_at=now
+            )
+
+    return len(events)
+
+
+def _apply_events(subscription, events, now, outcomes):
+    if subscription is None:
+        outcomes[('ignored', 'Unknown subscription')].extend(event.pk for event in events)
+        return
+
+    changed = set()
+    for event in events:  # Already in arrival order
+        action = resolve_action(event)
+        if action is None:
+            outcomes[('ignored', '')].append(event.pk)
+            continue
+        changed.update(apply_action(subscription, action, now))
+        outcomes[('processed', '')].append(event.pk)
+
+    if changed:
+        subscription.save(update_fields=[*changed, 'updated_at'])
+        tier = 'free' if subscription.status == 'expired' else subscription.plan.tier
+        if User.objects.filter(pk=subscription.user_id).exclude(tier=tier).update(tier=tier):
+            publish_tier_changes({subscription.user_id: tier})
+
+
+def process_all_pending_events(batch_size=DEFAULT_BATCH_SIZE):
+    total = 0
+    while True:
+        handled = process_pending_events(batch_size=batch_size)
+        if not handled:
+            return total
+        total += handled
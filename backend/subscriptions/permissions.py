@@ -0,0 +1,24 @@
+from rest_framework.permissions import BasePermission
+from .entitlements import user_has_feature
+
+
+class HasFeature(BasePermission):
+    """
+    Allow access only if the user's tier includes the given feature.
+
+    Usage:
+        permission_classes = [IsAuthenticated, HasFeature('recipe_export')]
+
+    DRF instantiates every entry of `permission_classes`, so an instance
+    returns itself when called.
+    """
+    message = 'Your subscription plan does not include this feature.'
+
+    def __init__(self, feature_name):
+        self.feature_name = feature_name
+
+    def __call__(self):
+        return self
+
+    def has_permission(self, request, view):
+        return user_has_feature(request.user, self.feature_name)
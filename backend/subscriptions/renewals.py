@@ -0,0 +1,145 @@
+import logging
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from api_auth.utils import publish_tier_changes
+from backend.db_utils import bulk_update_from_values
+from .models import UserSubscription
+from .utils import next_period_end, period_containing, trial_end_for
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+DEFAULT_CHUNK_SIZE = 500
+
+RENEWAL_UPDATE_FIELDS = [
+    'status', 'current_period_start', 'current_period_end',
+    'next_billing_at', 'ended_at', 'updated_at',
+]
+
+
+def start_subscription(user, plan, now=None):
+    """Create a live subscription for the user and sync `User.tier`"""
+    now = now or timezone.now()
+    trial_end = trial_end_for(plan, now)
+    period_end = trial_end or next_period_end(now, plan.billing_cycle)
+
+    with transaction.atomic():
+        subscription = UserSubscription.objects.create(
+            user=user,
+            plan=plan,
+            status='trialing' if trial_end else 'active',
+            started_at=now,
+            trial_end=trial_end,
+            current_period_start=now,
+            current_period_end=period_end,
+            next_billing_at=period_end,
+        )
+        User.objects.filter(pk=user.pk).update(tier=plan.tier)
+        publish_tier_changes({user.pk: plan.tier})
+    user.tier = plan.tier
+    return subscription
+
+
+def _expire(subscription):
+    subscription.status = 'expired'
+    subscription.ended_at = subscription.current_period_end
+    subscription.next_billing_at = None
+
+
+def _advance(subscription, now):
+    """Roll the billing period forward until it covers `now` (catches up missed runs)"""
+    anchor = subscription.trial_end or subscription.started_at
+    at = max(now, subscription.current_period_end)
+    start, end = period_containing(anchor, subscription.plan.billing_cycle, at)
+    subscription.status = 'active'
+    subscription.current_period_start = start
+    subscription.current_period_end = end
+    subscription.next_billing_at = end
+
+
+def apply_due_transition(subscription, now):
+    """
+    Move one due subscription to its next state. Returns the tier the user
+    should have afterwards.
+
+    Each transition pushes `next_billing_at` into the future or clears it, so
+    a subscription is never claimed twice for the same period.
+    """
+    if subscription.status in ('canceled', 'past_due', 'expired') or subscription.cancel_at_period_end:
+        _expire(subscription)
+        return 'free'
+
+    # trialing or active: the trial / current period is over, start the next one
+    _advance(subscription, now)
+    return subscription.plan.tier
+
+
+def _sync_user_tiers(user_tiers):
+    users_by_tier = defaultdict(list)
+    for user_id, tier in user_tiers.items():
+        users_by_tier[tier].append(user_id)
+    for tier, user_ids in users_by_tier.items():
+        if User.objects.filter(pk__in=user_ids).exclude(tier=tier).update(tier=tier):
+            # Users already on `tier` get an event too; it is a no-op for their clients
+            publish_tier_changes(dict.fromkeys(user_ids, tier))
+
+
+def process_due_chunk(now=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Claim up to `chunk_size` due subscriptions and process them in one
+    transaction. Returns the number of subscriptions processed.
+
+    Rows are claimed with `SELECT ... FOR UPDATE SKIP LOCKED`, so any number
+    of worker processes can run this concurrently: each one gets a disjoint
+    chunk and nobody waits on another worker's locks. (SQLite has no row
+    locks; there the clause is dropped and a single worker should be used.)
+    """
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        subscriptions = list(
+            UserSubscription.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('plan')
+            .filter(next_billing_at__lte=now)
+            .order_by('next_billing_at')[:chunk_size]
+        )
+        if not subscriptions:
+            return 0
+
+        user_tiers = {}
+        for subscription in subscriptions:
+            user_tiers[subscription.user_id] = apply_due_transition(subscription, now)
+            subscription.updated_at = now
+
+        bulk_update_from_values(
+            UserSubscription,
+            [
+                (subscription.pk, *(getattr(subscription, name) for name in RENEWAL_UPDATE_FIELDS))
+                for subscription in subscriptions
+            ],
+            RENEWAL_UPDATE_FIELDS,
+        )
+        _sync_user_tiers(user_tiers)
+
+    return len(subscriptions)
+
+
+def process_due_subscriptions(now=None, chunk_size=DEFAULT_CHUNK_SIZE, max_chunks=None):
+    """Process due subscriptions chunk by chunk until none are left (or `max_chunks` is hit)"""
+    now = now or timezone.now()
+    total = 0
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        processed = process_due_chunk(now=now, chunk_size=chunk_size)
+        if not processed:
+            break
+        total += processed
+        chunks += 1
+    if total:
+        logger.info(f"Processed {total} due subscriptions in {chunks} chunks")
+    return total
@@ -37,4 +37,5 @@ class SubscriptionPlanSerializer(serializers.ModelSerializer):
         return [pf.feature.name for pf in obj.plan_features.all()]
     
     def get_highlighted_features(self, obj):
-        return [pf.feature.name for pf in obj.plan_features.filter(is_highlighted=True)]
+        # Filtered in Python so a prefetched plan_features (SubscriptionPlanViewSet) is reused
+        return [pf.feature.name for pf in obj.plan_features.all() if pf.is_highlighted]
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from backend.caching import invalidate_on_change
+from backend.events import CATALOG_CHANNEL, publish
+from .models import SubscriptionPlan, Feature, PlanFeature
+from .entitlements import invalidate_entitlement_index
+
+# Invalidation tag of every cached response built from the catalog
+CATALOG_CACHE_TAG = 'catalog'
+
+
+@receiver(post_save, sender=SubscriptionPlan)
+@receiver(post_delete, sender=SubscriptionPlan)
+@receiver(post_save, sender=Feature)
+@receiver(post_delete, sender=Feature)
+@receiver(post_save, sender=PlanFeature)
+@receiver(post_delete, sender=PlanFeature)
+def catalog_changed(sender, **kwargs):
+    # Wait for the commit so a rebuild never reads (or misses) uncommitted rows
+    transaction.on_commit(invalidate_entitlement_index)
+    transaction.on_commit(lambda: publish(CATALOG_CHANNEL, 'catalog'))
+
+
+for model in (SubscriptionPlan, Feature, PlanFeature):
+    invalidate_on_change(model, CATALOG_CACHE_TAG)
@@ -1,3 +1,227 @@
-from django.test import TestCase
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from rest_framework.response import Response
+
+from .models import SubscriptionPlan, Feature, PlanFeature, UserSubscription, PaymentEvent
+from .entitlements import build_entitlement_index, get_entitlement_index, invalidate_entitlement_index
+from .permissions import HasFeature
+from .renewals import start_subscription, process_due_subscriptions
+from .utils import add_months
+from .webhooks import sign_payload
+from .payment_events import process_all_pending_events
+
+User = get_user_model()
+
+
+def create_catalog():
+    """Small catalog: free gets `browse`, premium gets `browse` + credit-based `export`"""
+    browse = Feature.objects.create(name='browse')
+    export = Feature.objects.create(name='export', feature_type='credit', credit_cost=5)
+    free = SubscriptionPlan.objects.create(name='Free', tier='free', billing_cycle='monthly', price=Decimal('0'))
+    premium = SubscriptionPlan.objects.create(name='Premium', tier='premium', billing_cycle='monthly', price=Decimal('9.99'))
+    PlanFeature.objects.create(plan=free, feature=browse)
+    PlanFeature.objects.create(plan=premium, feature=browse)
+    PlanFeature.objects.create(plan=premium, feature=export, is_highlighted=True)
+    return {'browse': browse, 'export': export, 'free': free, 'premium': premium}
+
+
+class ExportView(APIView):
+    permission_classes = [HasFeature('export')]
+
+    def get(self, request):
+        return Response({'ok': True})
+
+
+class EntitlementIndexTests(TestCase):
+
+    def setUp(self):
+        invalidate_entitlement_index()
+        self.catalog = create_catalog()
+
+    def test_index_maps_tiers_to_features_and_credit_costs(self):
+        index = get_entitlement_index()
+        self.assertTrue(index.has_feature('free', 'browse'))
+        self.assertFalse(index.has_feature('free', 'export'))
+        self.assertTrue(index.has_feature('premium', 'export'))
+        self.assertEqual(index.credit_cost('premium', 'export'), 5)
+        self.assertFalse(index.has_feature('basic', 'browse'))
+        self.assertFalse(index.has_feature('premium', 'unknown'))
+
+    def test_lookups_run_no_queries_once_built(self):
+        get_entitlement_index()
+        with self.assertNumQueries(0):
+            for _ in range(100):
+                get_entitlement_index().has_feature('premium', 'export')
+
+    def test_index_is_built_from_one_query(self):
+        archived = SubscriptionPlan.objects.create(
+            name='Archived', tier='basic', billing_cycle='monthly', price=Decimal('4.99'), is_active=False
+        )
+        PlanFeature.objects.create(plan=archived, feature=self.catalog['browse'])
+        Feature.objects.create(name='unassigned')
+
+        with self.assertNumQueries(1):
+            index = build_entitlement_index()
+        self.assertEqual(index.tiers.keys(), {'free', 'premium'})
+        self.assertIsNotNone(index.feature_id('unassigned'))
+        self.assertFalse(index.has_feature('basic', 'browse'))
+        self.assertEqual(index.credit_cost('premium', 'export'), 5)
+
+    def test_catalog_changes_rebuild_index(self):
+        self.assertTrue(get_entitlement_index().has_feature('premium', 'export'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.catalog['export'].is_active = False
+            self.catalog['export'].save()
+        self.assertFalse(get_entitlement_index().has_feature('premium', 'export'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            search = Feature.objects.create(name='search')
+            PlanFeature.objects.create(plan=self.catalog['free'], feature=search)
+        self.assertTrue(get_entitlement_index().has_feature('free', 'search'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.catalog['premium'].delete()
+        self.assertFalse(get_entitlement_index().has_feature('premium', 'browse'))
+
+    def test_has_feature_permission(self):
+        factory = APIRequestFactory()
+        view = ExportView.as_view()
+        free_user = User.objects.create_user(email='free@example.com', password='pass')
+        premium_user = User.objects.create_user(email='premium@example.com', password='pass')
+        premium_user.tier = 'premium'
+
+        request = factory.get('/export/')
+        force_authenticate(request, user=free_user)
+        self.assertEqual(view(request).status_code, 403)
+
+        request = factory.get('/export/')
+        force_authenticate(request, user=premium_user)
+        get_entitlement_index()
+        with self.assertNumQueries(0):
+            response = view(request)
+        self.assertEqual(response.status_code, 200)
+
+
+class RenewalSchedulerTests(TestCase):
+
+    def setUp(self):
+        self.now = datetime(2025, 3, 31, 12, 0, tzinfo=dt_timezone.utc)
+        self.plan = SubscriptionPlan.objects.create(
+            name='Premium', tier='premium', billing_cycle='monthly', price=Decimal('9.99'), trial_days=14
+        )
+        self.user = User.objects.create_user(email='sub@example.com', password='pass')
+
+    def test_add_months_clamps_day(self):
+        self.assertEqual(add_months(self.now, 1).date().isoformat(), '2025-04-30')
+        self.assertEqual(add_months(self.now, 11).date().isoformat(), '2026-02-28')
+
+    def test_trial_converts_then_renews_idempotently(self):
+        subscription = start_subscription(self.user, self.plan, now=self.now)
+        self.assertEqual(subscription.status, 'trialing')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.tier, 'premium')
+
+        later = self.now + timedelta(days=15)
+        self.assertEqual(process_due_subscriptions(now=later), 1)
+        self.assertEqual(process_due_subscriptions(now=later), 0)
+
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.status, 'active')
+        self.assertEqual(subscription.current_period_start, self.now + timedelta(days=14))
+        self.assertEqual(subscription.next_billing_at, add_months(self.now + timedelta(days=14), 1))
+
+    def test_missed_periods_are_caught_up(self):
+        self.plan.trial_days = 0
+        self.plan.save()
+        subscription = start_subscription(self.user, self.plan, now=self.now)
+
+        process_due_subscriptions(now=self.now + timedelta(days=100))
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.current_period_start, add_months(self.now, 3))
+        self.assertEqual(subscription.current_period_end, add_months(self.now, 4))
+
+    def test_cancel_at_period_end_expires_and_downgrades_tier(self):
+        subscription = start_subscription(self.user, self.plan, now=self.now)
+        UserSubscription.objects.filter(pk=subscription.pk).update(cancel_at_period_end=True)
+
+        process_due_subscriptions(now=self.now + timedelta(days=15))
+        subscription.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(subscription.status, 'expired')
+        self.assertIsNone(subscription.next_billing_at)
+        self.assertEqual(self.user.tier, 'free')
+
+
+@override_settings(PAYMENT_WEBHOOK_SECRETS={'stripe': 'whsec_test', 'paypal': 'paypal_test'})
+class PaymentWebhookTests(TestCase):
+
+    def setUp(self):
+        self.url = reverse('payment_webhook', kwargs={'provider': 'stripe'})
+        plan = SubscriptionPlan.objects.create(name='Premium', tier='premium', billing_cycle='monthly', price=Decimal('9.99'))
+        self.user = User.objects.create_user(email='payer@example.com', password='pass')
+        self.subscription = start_subscription(self.user, plan)
+        self.subscription.provider = 'stripe'
+        self.subscription.provider_subscription_id = 'sub_123'
+        self.subscription.save()
+
+    def post_event(self, event_id, event_type, signature=None):
+        body = json.dumps({
+            'id': event_id,
+            'type': event_type,
+            'data': {'object': {'object': 'invoice', 'subscription': 'sub_123'}},
+        }).encode()
+        signature = signature or sign_payload('whsec_test', body)
+        return self.client.post(self.url, body, content_type='application/json', HTTP_STRIPE_SIGNATURE=signature)
+
+    def post_body(self, body):
+        return self.client.post(self.url, body, content_type='application/json',
+                                HTTP_STRIPE_SIGNATURE=sign_payload('whsec_test', body))
+
+    def test_intake_stores_event_once(self):
+        with self.assertNumQueries(1):
+            response = self.post_event('evt_1', 'invoice.paid')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.post_event('evt_1', 'invoice.paid').status_code, 200)
+        self.assertEqual(PaymentEvent.objects.filter(event_id='evt_1').count(), 1)
+
+    def test_bad_signature_is_rejected(self):
+        response = self.post_event('evt_1', 'invoice.paid', signature=sign_payload('wrong', b'{}'))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+    def test_payloads_that_are_not_objects_are_rejected(self):
+        self.assertEqual(self.post_body(b'[]').status_code, 400)
+        self.assertEqual(self.post_body(b'"evt_1"').status_code, 400)
+        # Unexpected nested shapes are stored without a subscription reference
+        self.assertEqual(self.post_body(b'{"id": "evt_1", "type": "invoice.paid", "data": []}').status_code, 200)
+        self.assertEqual(list(PaymentEvent.objects.values_list('subscription_ref', flat=True)), [''])
+
+    def test_events_are_applied_in_order(self):
+        self.post_event('evt_1', 'invoice.payment_failed')
+        self.post_event('evt_2', 'invoice.paid')
+        self.post_event('evt_3', 'unrelated.event')
+
+        self.assertEqual(process_all_pending_events(), 3)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'active')
+        self.assertEqual(self.subscription.next_billing_at, self.subscription.current_period_end)
+        self.assertEqual(
+            dict(PaymentEvent.objects.values_list('event_id', 'status')),
+            {'evt_1': 'processed', 'evt_2': 'processed', 'evt_3': 'ignored'},
+        )
+
+    def test_subscription_deleted_downgrades_user(self):
+        self.post_event('evt_1', 'customer.subscription.deleted')
+        process_all_pending_events()
+        self.subscription.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'expired')
+        self.assertEqual(self.user.tier, 'free')
@@ -7,4 +7,5 @@ router.register(r'plans', views.SubscriptionPlanViewSet, basename='subscription_
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('webhooks/<str:provider>/', views.payment_webhook, name='payment_webhook'),
 ]
\ No newline at end of file
@@ -0,0 +1,40 @@
+import calendar
+from datetime import timedelta
+
+
+def add_months(value, months):
+    """Shift a datetime by whole months, clamping the day (Jan 31 + 1 month -> Feb 28/29)"""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def cycle_months(billing_cycle):
+    return 12 if billing_cycle == 'annual' else 1
+
+
+def next_period_end(period_start, billing_cycle):
+    return add_months(period_start, cycle_months(billing_cycle))
+
+
+def period_containing(anchor, billing_cycle, at):
+    """
+    Return (start, end) of the billing period that contains `at`, counting
+    whole cycles from `anchor` so month-end anchors don't drift
+    (Jan 31 -> Feb 28 -> Mar 31, not Mar 28).
+    """
+    step = cycle_months(billing_cycle)
+    months = max((at.year - anchor.year) * 12 + at.month - anchor.month, 0) // step * step
+    while add_months(anchor, months) > at and months > 0:
+        months -= step
+    while add_months(anchor, months + step) <= at:
+        months += step
+    return add_months(anchor, months), add_months(anchor, months + step)
+
+
+def trial_end_for(plan, start):
+    if not plan.trial_days:
+        return None
+    return start + timedelta(days=plan.trial_days)
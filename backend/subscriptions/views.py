@@ -1,33 +1,114 @@
+import logging
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework import generics, status, viewsets
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from django.db.models import Prefetch
+
 from .models import (
+    PlanFeature,
     SubscriptionPlan
 )
 
 from .serializers import (
     SubscriptionPlanSerializer
 )
+from backend.caching import two_tier_cache
+from .signals import CATALOG_CACHE_TAG
+from .webhooks import SIGNATURE_HEADERS, WebhookSignatureError, verify_signature, record_event
+
+logger = logging.getLogger(__name__)
 
 
 class SubscriptionPlanViewSet(viewsets.ReadOnlyModelViewSet):
     """API endpoint to view subscription plans"""
-    queryset = SubscriptionPlan.objects.filter(is_active=True)
+    # Plan features and their features in two more queries, however many plans there are
+    queryset = SubscriptionPlan.objects.filter(is_active=True).prefetch_related(
+        Prefetch('plan_features', queryset=PlanFeature.objects.select_related('feature')),
+    )
     serializer_class = SubscriptionPlanSerializer
     permission_classes = [AllowAny]
-    
+
+    list_cache_key = 'plans:active'
+
+    def grouped_plans(self):
+        """Active plans serialized and grouped by tier, cached until the catalog changes"""
+        def build():
+            grouped_plans = {}
+            for plan in self.get_queryset():
+                grouped_plans.setdefault(plan.tier, []).append(dict(self.get_serializer(plan).data))
+            return grouped_plans
+
+        return two_tier_cache.get_or_set(
+            self.list_cache_key, build, ttl=settings.CATALOG_CACHE_TTL, stale_ttl=settings.CATALOG_CACHE_STALE_TTL,
+            tags=[CATALOG_CACHE_TAG],
+        )
+
     def list(self, request):
         """List subscription plans, grouped by tier"""
-        plans = self.get_queryset()
-        
-        # Group by tier
-        grouped_plans = {}
-        for plan in plans:
-            if plan.tier not in grouped_plans:
-                grouped_plans[plan.tier] = []
-            grouped_plans[plan.tier].append(self.get_serializer(plan).data)
-        
-        return Response(grouped_plans)
+        return Response(self.grouped_plans())
+
+    def retrieve(self, request, pk=None):
+        """
+        One active plan: from the cached catalog when the list has been built,
+        otherwise cached on its own, so a cold cache doesn't build the whole catalog
+        """
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise Http404
+
+        grouped_plans = two_tier_cache.get(self.list_cache_key, tags=[CATALOG_CACHE_TAG])
+        if grouped_plans is not None:
+            for plans in grouped_plans.values():
+                for plan in plans:
+                    if plan['id'] == pk:
+                        return Response(plan)
+            raise Http404
+
+        def build():
+            plan = self.get_queryset().filter(pk=pk).first()
+            return dict(self.get_serializer(plan).data) if plan is not None else None
+
+        plan = two_tier_cache.get_or_set(
+            f'plans:active:{pk}', build, ttl=settings.CATALOG_CACHE_TTL,
+            stale_ttl=settings.CATALOG_CACHE_STALE_TTL, tags=[CATALOG_CACHE_TAG],
+        )
+        if plan is None:
+            raise Http404
+        return Response(plan)
+
+
+@csrf_exempt
+@require_POST
+def payment_webhook(request, provider):
+    """
+    Payment provider webhook intake.
+
+    Deliberately a plain Django view: verify the signature, append the raw
+    event and return 200 right away. Providers retry slow responses, so all
+    real work is left to the `process_payment_events` command.
+    """
+    if provider not in SIGNATURE_HEADERS:
+        return JsonResponse({'error': 'Unknown provider'}, status=404)
+
+    payload = request.body
+    try:
+        verify_signature(provider, payload, request.META.get(SIGNATURE_HEADERS[provider]))
+    except WebhookSignatureError as e:
+        logger.warning(f"Rejected {provider} webhook: {str(e)}")
+        return JsonResponse({'error': 'Invalid signature'}, status=400)
+
+    try:
+        record_event(provider, payload)
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Malformed {provider} webhook payload: {str(e)}")
+        return JsonResponse({'error': 'Malformed event'}, status=400)
 
+    return JsonResponse({'received': True})
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { API_BASE_URL, ACCESS_TOKEN } from './constants';
+import { API_BASE_URL, ACCESS_TOKEN, DB_PIN } from './constants';
 
 const api = axios.create({
   baseURL: API_BASE_URL,
@@ -11,6 +11,11 @@ api.interceptors.request.use(
     if (token) {
       config.headers['Authorization'] = `Bearer ${token}`;
     }
+    // Until the replicas have caught up with our last write, ask for the primary database
+    const pinnedUntil = Number(localStorage.getItem(DB_PIN));
+    if (pinnedUntil > Date.now() / 1000) {
+      config.headers['X-DB-Pin'] = pinnedUntil;
+    }
     return config;
   },
   error => {
@@ -18,5 +23,19 @@ api.interceptors.request.use(
   }
 );
 
+api.interceptors.response.use(
+  response => {
+    // Set by the backend on responses to writes (backend/db_router.py)
+    const pinnedUntil = response.headers['x-db-pin'];
+    if (pinnedUntil) {
+      localStorage.setItem(DB_PIN, pinnedUntil);
+    }
+    return response;
+  },
+  error => {
+    return Promise.reject(error);
+  }
+);
+
 
 export default api;
\ No newline at end of file
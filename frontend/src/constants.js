@@ -1,3 +1,4 @@
 export const API_BASE_URL = import.meta.env.VITE_API_BASE_URL
 export const ACCESS_TOKEN = "access";
-export const REFRESH_TOKEN = "refresh"
\ No newline at end of file
+export const REFRESH_TOKEN = "refresh"
+export const DB_PIN = "db_pin";
@@ -0,0 +1,48 @@
+import api from '../api';
+import { API_BASE_URL, ACCESS_TOKEN } from '../constants';
+
+const EVENT_TYPES = ['snapshot', 'catalog', 'tier', 'resync'];
+const RETRY_MS = 5000;
+
+// Server-sent change notifications (backend/backend/events.py). EventSource can't send the
+// Authorization header, so signed in users first get a short-lived stream token for the query string.
+// Returns a function that closes the stream.
+export const openEventStream = (onEvent) => {
+  let source = null;
+  let retry = null;
+  let closed = false;
+
+  const connect = async () => {
+    let url = `${API_BASE_URL}/events/`;
+    if (localStorage.getItem(ACCESS_TOKEN)) {
+      try {
+        const response = await api.post('/events-token/');
+        url += `?token=${encodeURIComponent(response.data.token)}`;
+      } catch (error) {
+        // Signed out or expired access token: catalog events only
+      }
+    }
+    if (closed) {
+      return;
+    }
+    source = new EventSource(url);
+    EVENT_TYPES.forEach(type => {
+      source.addEventListener(type, event => onEvent(type, JSON.parse(event.data)));
+    });
+    source.onerror = () => {
+      // The browser reconnects by itself unless the server refused the stream (e.g. an expired token)
+      if (source.readyState === EventSource.CLOSED && !closed) {
+        retry = setTimeout(connect, RETRY_MS);
+      }
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    if (source) {
+      source.close();
+    }
+  };
+};